@@ -0,0 +1,226 @@
+"""Consent PDF rendering (Jinja2 + weasyprint)."""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
+
+from loguru import logger
+
+try:
+    import jinja2
+except ImportError:  # pragma: no cover - depends on the environment
+    jinja2 = None
+
+try:
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+except ImportError:  # pragma: no cover - depends on the environment
+    weasyprint = None
+    FontConfiguration = None
+
+CONSENT_FILENAME = "00_consent.pdf"
+TEMPLATE_PATH = Path(
+    os.environ.get(
+        "ZOOM_DUO_CONSENT_TEMPLATE",
+        Path(__file__).resolve().parents[2] / "templates" / "consent_template.html",
+    )
+)
+
+# Template variables the consent form shows when the request does not override them.
+DEFAULT_CONTEXT: Dict[str, Any] = {
+    "app_version": os.environ.get("ZOOM_DUO_APP_VERSION", "0.1.0"),
+    "purpose": "音声対話データセットの作成および研究開発のために利用します。",
+    "retention_period": "収録日から 5 年間",
+    "third_party_policy": "法令に基づく場合を除き、本人の同意なく第三者へ提供しません。",
+    "revoke_method": "運営窓口へ連絡することで、いつでも同意を撤回できます。",
+}
+
+_STYLE_BLOCK = re.compile(r"<style[^>]*>(.*?)</style>", re.DOTALL | re.IGNORECASE)
+
+
+class ConsentRenderer:
+    """
+    Parses the template, its stylesheet and the font configuration once;
+    each render only evaluates the compiled template and lays out the page.
+    """
+
+    def __init__(self, template_path: Path = TEMPLATE_PATH) -> None:
+        if jinja2 is None or weasyprint is None:
+            raise RuntimeError("Consent PDF rendering requires Jinja2 and weasyprint (pip install -r requirements.txt)")
+        source = template_path.read_text(encoding="utf-8")
+        # The inline <style> is parsed once into a weasyprint stylesheet instead of per document.
+        css = "\n".join(_STYLE_BLOCK.findall(source))
+        self.base_url = str(template_path.parent)
+        self.font_config = FontConfiguration()
+        self.stylesheet = weasyprint.CSS(string=css, base_url=self.base_url, font_config=self.font_config)
+        environment = jinja2.Environment(autoescape=True, undefined=jinja2.ChainableUndefined)
+        self.template = environment.from_string(_STYLE_BLOCK.sub("", source))
+        self.renders = 0
+
+    def render(self, context: Dict[str, Any], target: Path) -> float:
+        """Render ``context`` to ``target`` atomically; returns elapsed milliseconds."""
+        started = time.perf_counter()
+        html = self.template.render({**DEFAULT_CONTEXT, **context})
+        document = weasyprint.HTML(string=html, base_url=self.base_url)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            document.write_pdf(tmp_path, stylesheets=[self.stylesheet], font_config=self.font_config)
+            os.replace(tmp_path, target)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.renders += 1
+        return (time.perf_counter() - started) * 1000
+
+
+_renderer: Optional[ConsentRenderer] = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer() -> ConsentRenderer:
+    """Per-process renderer, built on first use."""
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            started = time.perf_counter()
+            _renderer = ConsentRenderer()
+            logger.info("Consent renderer ready in {:.0f} ms", (time.perf_counter() - started) * 1000)
+        return _renderer
+
+
+def _context_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    context = {key: payload[key] for key in DEFAULT_CONTEXT if payload.get(key)}
+    context.update(
+        participant_name=payload.get("participant_name", ""),
+        meeting_id=payload.get("meeting_id", ""),
+        timestamp=payload.get("timestamp") or datetime.now().isoformat(timespec="seconds"),
+        checks=payload.get("checks") or {},
+    )
+    return context
+
+
+def render_consent(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Render one session's ``00_consent.pdf`` under ``export_root/session_dir``."""
+    export_root = Path(payload.get("export_root", "."))
+    session_dir = Path(payload.get("session_dir", "session"))
+    pdf_path = export_root / session_dir / CONSENT_FILENAME
+
+    renderer = get_renderer()
+    warm = renderer.renders > 0
+    render_ms = renderer.render(_context_from_payload(payload), pdf_path)
+
+    logger.info("Generated consent PDF at {} in {:.0f} ms", pdf_path, render_ms)
+    return {
+        "path": str(pdf_path),
+        "session_dir": str(session_dir),
+        "submitted_at": payload.get("timestamp"),
+        "render_ms": round(render_ms, 1),
+        "warm": warm,
+    }
+
+
+def _warm_renderer() -> None:
+    get_renderer()
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Process pool shared by every batch, so its workers keep their renderer
+    between batches. Children start on demand; the pool is only rebuilt
+    when a batch asks for a different size.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None and _pool_size != processes:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_renderer,
+            )
+            _pool_size = processes
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose child died so the next batch starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_consent_batch(payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, Dict[str, Any]]:
+    """
+    Render consents for a list of sessions on the shared process pool, whose
+    workers build the renderer once and keep it across batches. Yields a
+    progress frame per PDF and returns per-PDF latency (warm renders only)
+    and batch throughput.
+    """
+    sessions: List[Dict[str, Any]] = list(payload.get("sessions") or [])
+    shared = {key: payload[key] for key in ("export_root", *DEFAULT_CONTEXT) if key in payload}
+    processes = int(payload.get("processes") or max(1, (os.cpu_count() or 2) - 1))
+
+    started = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+    if not sessions:
+        return {"count": 0, "results": results, "failed": failed, "elapsed_ms": 0.0}
+
+    pool = get_pool(processes)
+    pending: Dict[Future, Dict[str, Any]] = {}
+    try:
+        for session in sessions:
+            pending[pool.submit(render_consent, {**shared, **session})] = session
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                session = pending.pop(future)
+                exc = future.exception()
+                if isinstance(exc, BrokenProcessPool):
+                    _discard_pool(pool)
+                if exc is None:
+                    results.append(future.result())
+                else:
+                    failed.append({"session_dir": session.get("session_dir"), "error": str(exc)})
+                yield {"done": len(results) + len(failed), "total": len(sessions), "failed": len(failed)}
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    finally:
+        # A cancelled batch leaves the pool running for the next one; only its queued renders are dropped.
+        for future in pending:
+            future.cancel()
+
+    elapsed = time.perf_counter() - started
+    warm_ms = sorted(result["render_ms"] for result in results if result["warm"])
+    logger.info("Rendered {} consent PDFs in {:.1f} s ({} failed)", len(results), elapsed, len(failed))
+    return {
+        "count": len(results),
+        "results": results,
+        "failed": failed,
+        "processes": processes,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "throughput_per_s": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        "warm_render_ms": {
+            "p50": statistics.median(warm_ms) if warm_ms else None,
+            "max": warm_ms[-1] if warm_ms else None,
+        },
+    }
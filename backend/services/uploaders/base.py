@@ -0,0 +1,21 @@
+"""Types shared by the upload providers."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+MiB = 1024 * 1024
+
+# Receives per-file progress dicts (``name``, ``status``, ``bytes_sent``, ...).
+Progress = Callable[[Dict[str, Any]], None]
+
+
+class UploadCancelled(Exception):
+    """Raised when an upload is stopped; its state is kept for resuming."""
+
+
+@dataclass(slots=True)
+class UploadTask:
+    path: Path
+    key: str
@@ -0,0 +1,90 @@
+"""``upload_batch`` worker action: provider-agnostic batch uploads with progress frames."""
+from __future__ import annotations
+
+import importlib
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Generator, List
+
+from zoom_duo.dispatch import Frame
+
+from .base import MiB, UploadTask
+
+# Providers are imported on first use so boto3/paramiko load only when needed.
+PROVIDERS = {
+    "s3": "services.uploaders.s3:S3Uploader",
+    "sftp": "services.uploaders.sftp:SFTPUploader",
+}
+
+
+def _uploader_class(provider: str) -> Any:
+    target = PROVIDERS.get(provider)
+    if target is None:
+        raise ValueError(f"Unsupported upload provider: {provider}")
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def upload_batch(payload: Dict[str, Any]) -> Generator[Frame, None, Dict[str, Any]]:
+    """
+    Upload ``files`` (relative to ``session_dir``) to ``destination``.
+    Objects are named ``<destination>/<session folder>/<relative path>``.
+    Yields ``upload_progress`` frames; cancelling stops between parts and
+    keeps resumable state.
+    """
+    session_dir = Path(payload.get("session_dir", ""))
+    files = [Path(name) for name in payload.get("files") or []]
+    job_id = payload.get("job_id")
+    config = {**(payload.get("config") or {}), "destination": payload.get("destination", "")}
+    uploader = _uploader_class(str(payload.get("provider", "")))(config)
+
+    tasks: List[UploadTask] = []
+    for name in files:
+        path = name if name.is_absolute() else session_dir / name
+        if not path.is_file():
+            raise FileNotFoundError(f"Upload source not found: {path}")
+        try:
+            relative = path.relative_to(session_dir).as_posix()
+        except ValueError:
+            relative = path.name
+        tasks.append(UploadTask(path=path, key=uploader.key_for(f"{session_dir.name}/{relative}")))
+
+    events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+    cancelled = threading.Event()
+    outcome: Dict[str, Any] = {}
+
+    def run() -> None:
+        try:
+            outcome["results"] = uploader.upload(tasks, events.put, cancelled)
+        except BaseException as exc:  # noqa: BLE001 - re-raised on the handler thread
+            outcome["error"] = exc
+
+    started = time.perf_counter()
+    runner = threading.Thread(target=run, name="upload-batch", daemon=True)
+    runner.start()
+    try:
+        while runner.is_alive() or not events.empty():
+            try:
+                event = events.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            yield Frame("upload_progress", {"job_id": job_id, **event})
+    finally:
+        cancelled.set()
+        runner.join()
+
+    if "error" in outcome:
+        raise outcome["error"]
+    results: List[Dict[str, Any]] = outcome["results"]
+    elapsed = time.perf_counter() - started
+    sent = sum(result.get("bytes_sent", 0) - result.get("resumed_bytes", 0) for result in results)
+    return {
+        "job_id": job_id,
+        "files": results,
+        "uploaded": sum(1 for result in results if result["status"] == "success"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "throughput_mb_s": round(sent / MiB / elapsed, 2) if elapsed > 0 else None,
+    }
@@ -0,0 +1,356 @@
+"""Parallel, resumable multipart uploads to S3 or an S3-compatible endpoint."""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .base import MiB, Progress, UploadCancelled, UploadTask
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - depends on the environment
+    boto3 = None
+    BotoConfig = None
+    ClientError = Exception
+
+S3_MIN_PART_SIZE = 5 * MiB
+S3_MAX_PARTS = 10_000
+DEFAULT_PART_SIZE = 8 * MiB
+MAX_PART_SIZE = 512 * MiB
+# Part size adapts so one part takes roughly this long at the measured rate.
+TARGET_PART_SECONDS = 5.0
+STATE_VERSION = 1
+
+
+@dataclass(slots=True)
+class PartSpec:
+    number: int
+    offset: int
+    length: int
+
+
+def parse_destination(destination: str) -> Tuple[str, str]:
+    """Split ``s3://bucket/prefix`` into bucket and prefix (without slashes at the ends)."""
+    if not destination.startswith("s3://"):
+        raise ValueError(f"S3 destination must start with s3://: {destination}")
+    bucket, _, prefix = destination[5:].partition("/")
+    if not bucket:
+        raise ValueError(f"S3 destination has no bucket: {destination}")
+    return bucket, prefix.strip("/")
+
+
+class PartPlanner:
+    """
+    Hands out parts in file order. Parts are planned lazily so the part size
+    can follow the measured throughput; every planned part is persisted, so a
+    resumed upload re-sends exactly the ranges that were not confirmed.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        part_size: int,
+        max_part_size: int,
+        pending: List[PartSpec],
+        next_offset: int,
+        next_number: int,
+    ) -> None:
+        self.size = size
+        self.part_size = part_size
+        self.max_part_size = max_part_size
+        self._pending = sorted(pending, key=lambda part: part.number)
+        self._offset = next_offset
+        self._number = next_number
+        self._lock = threading.Lock()
+
+    def next(self) -> Optional[PartSpec]:
+        with self._lock:
+            if self._pending:
+                return self._pending.pop(0)
+            if self._offset >= self.size:
+                return None
+            remaining = self.size - self._offset
+            parts_left = S3_MAX_PARTS - self._number + 1
+            if parts_left <= 0:
+                raise RuntimeError("S3 part limit exceeded")
+            # Never plan so small that the rest of the file would not fit in the part limit.
+            length = min(remaining, max(self.part_size, math.ceil(remaining / parts_left)))
+            part = PartSpec(self._number, self._offset, length)
+            self._offset += length
+            self._number += 1
+            return part
+
+    def observe(self, length: int, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        desired = int(length / seconds * TARGET_PART_SECONDS)
+        with self._lock:
+            # Move at most 2x per observation so one slow part does not swing the size.
+            bounded = min(max(desired, self.part_size // 2), self.part_size * 2)
+            self.part_size = min(self.max_part_size, max(S3_MIN_PART_SIZE, bounded // MiB * MiB))
+
+
+class UploadState:
+    """JSON sidecar describing one multipart upload, rewritten atomically after each part."""
+
+    def __init__(self, path: Path, data: Dict[str, Any]) -> None:
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["UploadState"]:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+            return None
+        return cls(path, data)
+
+    def record(self, part: PartSpec, etag: Optional[str] = None) -> None:
+        with self._lock:
+            entry = {"offset": part.offset, "length": part.length}
+            if etag is not None:
+                entry["etag"] = etag
+            self.data["parts"][str(part.number)] = entry
+            self.save_locked()
+
+    def save(self) -> None:
+        with self._lock:
+            self.save_locked()
+
+    def save_locked(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.data), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def delete(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class S3Uploader:
+    """
+    Uploads several files at once (``max_concurrent_files``), each with
+    ``max_concurrent_parts`` part transfers in flight. Files below one part
+    are sent with a single PUT.
+    """
+
+    def __init__(self, config: Dict[str, Any], *, client: Any = None) -> None:
+        self.bucket, self.prefix = parse_destination(config["destination"])
+        self.max_files = max(1, int(config.get("max_concurrent_files", 2)))
+        self.max_parts = max(1, int(config.get("max_concurrent_parts", 8)))
+        self.part_size = max(S3_MIN_PART_SIZE, int(config.get("part_size", DEFAULT_PART_SIZE)))
+        # Every in-flight part is held in memory, so the budget caps how far part sizes may grow.
+        memory_budget = int(config.get("memory_budget", 512 * MiB))
+        self.max_part_size = max(self.part_size, min(MAX_PART_SIZE, memory_budget // (self.max_files * self.max_parts)))
+        self.state_dir = Path(config.get("state_dir") or Path.home() / ".zoom-duo" / "upload-state")
+        self.client = client or self._create_client(config)
+
+    def _create_client(self, config: Dict[str, Any]) -> Any:
+        if boto3 is None:
+            raise RuntimeError("S3 uploads require boto3 (pip install -r requirements.txt)")
+        credentials: Dict[str, Any] = {}
+        if config.get("credentials_path"):
+            credentials = json.loads(Path(config["credentials_path"]).expanduser().read_text(encoding="utf-8"))
+        options = {**credentials, **config}
+        session = boto3.session.Session(
+            aws_access_key_id=options.get("aws_access_key_id"),
+            aws_secret_access_key=options.get("aws_secret_access_key"),
+            aws_session_token=options.get("aws_session_token"),
+            region_name=options.get("region"),
+            profile_name=options.get("profile"),
+        )
+        return session.client(
+            "s3",
+            endpoint_url=options.get("endpoint_url"),
+            config=BotoConfig(
+                max_pool_connections=self.max_files * self.max_parts + 2,
+                retries={"max_attempts": 5, "mode": "adaptive"},
+            ),
+        )
+
+    def key_for(self, name: str) -> str:
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def upload(self, tasks: List[UploadTask], progress: Progress, cancelled: threading.Event) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=self.max_files, thread_name_prefix="s3-file") as pool:
+            futures = [pool.submit(self._upload_one, task, progress, cancelled) for task in tasks]
+            return [future.result() for future in futures]
+
+    def _upload_one(self, task: UploadTask, progress: Progress, cancelled: threading.Event) -> Dict[str, Any]:
+        started = time.perf_counter()
+        size = task.path.stat().st_size
+        base = {"name": task.path.name, "key": task.key, "total_bytes": size}
+        try:
+            if cancelled.is_set():
+                raise UploadCancelled()
+            if size <= self.part_size:
+                with task.path.open("rb") as handle:
+                    self.client.put_object(Bucket=self.bucket, Key=task.key, Body=handle.read())
+                resumed = 0
+            else:
+                resumed = self._multipart(task, size, base, progress, cancelled)
+        except UploadCancelled:
+            progress({**base, "status": "cancelled"})
+            return {**base, "status": "cancelled"}
+        except Exception as exc:  # noqa: BLE001 - reported per file; state is kept for a retry
+            logger.opt(exception=exc).error("S3 upload failed for {}", task.path)
+            progress({**base, "status": "failed", "error": str(exc)})
+            return {**base, "status": "failed", "error": str(exc)}
+
+        elapsed = time.perf_counter() - started
+        result = {
+            **base,
+            "status": "success",
+            "bytes_sent": size,
+            "resumed_bytes": resumed,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "throughput_mb_s": round((size - resumed) / MiB / elapsed, 2) if elapsed > 0 else None,
+        }
+        progress(result)
+        return result
+
+    def _state_path(self, key: str) -> Path:
+        digest = hashlib.sha1(f"{self.bucket}/{key}".encode("utf-8")).hexdigest()
+        return self.state_dir / f"{digest}.json"
+
+    def _resume_state(self, task: UploadTask, size: int, mtime_ns: int) -> Tuple[UploadState, Dict[int, str]]:
+        """Reuse a matching in-progress upload, keeping only parts S3 confirms."""
+        state_path = self._state_path(task.key)
+        state = UploadState.load(state_path)
+        if state is not None:
+            data = state.data
+            identity = (data.get("bucket"), data.get("key"), data.get("size"), data.get("mtime_ns"))
+            if identity == (self.bucket, task.key, size, mtime_ns):
+                try:
+                    confirmed = self._list_parts(task.key, data["upload_id"])
+                except ClientError:
+                    confirmed = None  # upload expired or was aborted
+                if confirmed is not None:
+                    completed = {
+                        int(number): entry["etag"]
+                        for number, entry in data["parts"].items()
+                        if "etag" in entry and confirmed.get(int(number)) == (entry["etag"], entry["length"])
+                    }
+                    return state, completed
+            else:
+                try:
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=task.key, UploadId=data["upload_id"])
+                except ClientError:
+                    pass
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=task.key)["UploadId"]
+        state = UploadState(
+            state_path,
+            {
+                "version": STATE_VERSION,
+                "bucket": self.bucket,
+                "key": task.key,
+                "path": str(task.path),
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "upload_id": upload_id,
+                "parts": {},
+            },
+        )
+        state.save()
+        return state, {}
+
+    def _list_parts(self, key: str, upload_id: str) -> Dict[int, Tuple[str, int]]:
+        parts: Dict[int, Tuple[str, int]] = {}
+        marker = 0
+        while True:
+            response = self.client.list_parts(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumberMarker=marker)
+            for part in response.get("Parts", []):
+                parts[part["PartNumber"]] = (part["ETag"], part["Size"])
+            if not response.get("IsTruncated"):
+                return parts
+            marker = response["NextPartNumberMarker"]
+
+    def _multipart(
+        self,
+        task: UploadTask,
+        size: int,
+        base: Dict[str, Any],
+        progress: Progress,
+        cancelled: threading.Event,
+    ) -> int:
+        stat = task.path.stat()
+        state, completed = self._resume_state(task, size, stat.st_mtime_ns)
+        upload_id = state.data["upload_id"]
+        planned = {int(number): entry for number, entry in state.data["parts"].items()}
+        pending = [
+            PartSpec(number, entry["offset"], entry["length"]) for number, entry in planned.items() if number not in completed
+        ]
+        next_offset = max((entry["offset"] + entry["length"] for entry in planned.values()), default=0)
+        planner = PartPlanner(size, self.part_size, self.max_part_size, pending, next_offset, max(planned, default=0) + 1)
+
+        etags: Dict[int, str] = dict(completed)
+        resumed = sum(planned[number]["length"] for number in completed)
+        sent = [resumed]
+        sent_lock = threading.Lock()
+        if resumed:
+            logger.info("Resuming {} at {} of {} bytes", task.key, resumed, size)
+
+        failed = threading.Event()
+
+        def transfer() -> None:
+            try:
+                send_parts()
+            except BaseException:
+                failed.set()  # stop sibling transfers; the state keeps what was confirmed
+                raise
+
+        def send_parts() -> None:
+            with task.path.open("rb") as handle:
+                while not cancelled.is_set() and not failed.is_set():
+                    part = planner.next()
+                    if part is None:
+                        return
+                    state.record(part)  # planned before sending, so a crash re-sends this exact range
+                    handle.seek(part.offset)
+                    body = handle.read(part.length)
+                    started = time.perf_counter()
+                    response = self.client.upload_part(
+                        Bucket=self.bucket,
+                        Key=task.key,
+                        UploadId=upload_id,
+                        PartNumber=part.number,
+                        Body=body,
+                    )
+                    planner.observe(part.length, time.perf_counter() - started)
+                    state.record(part, response["ETag"])
+                    with sent_lock:
+                        etags[part.number] = response["ETag"]
+                        sent[0] += part.length
+                        current = sent[0]
+                    progress({**base, "status": "uploading", "bytes_sent": current, "part_size": planner.part_size})
+
+        with ThreadPoolExecutor(max_workers=self.max_parts, thread_name_prefix="s3-part") as pool:
+            for future in [pool.submit(transfer) for _ in range(self.max_parts)]:
+                future.result()
+        if cancelled.is_set():
+            raise UploadCancelled()
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=task.key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [{"PartNumber": n, "ETag": etags[n]} for n in sorted(etags)]},
+        )
+        state.delete()
+        return resumed
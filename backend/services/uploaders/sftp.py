@@ -0,0 +1,334 @@
+"""SFTP uploads over a pool of authenticated, reused connections."""
+from __future__ import annotations
+
+import json
+import posixpath
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import unquote, urlparse
+
+from loguru import logger
+
+from .base import MiB, Progress, UploadCancelled, UploadTask
+
+try:
+    import paramiko
+except ImportError:  # pragma: no cover - depends on the environment
+    paramiko = None
+
+# Large SSH windows keep pipelined writes flowing on high-latency links; the
+# defaults (2 MiB window, 32 KiB packets) stall long before the NAS does.
+WINDOW_SIZE = 64 * MiB
+MAX_PACKET_SIZE = 256 * 1024
+BLOCK_SIZE = 1 * MiB
+CONNECT_TIMEOUT = 15.0
+
+
+def parse_destination(destination: str) -> Tuple[str, int, Optional[str], str]:
+    """Split ``sftp://user@host:port/base/dir`` into host, port, username and base path."""
+    parsed = urlparse(destination)
+    if parsed.scheme != "sftp" or not parsed.hostname:
+        raise ValueError(f"SFTP destination must look like sftp://user@host/path: {destination}")
+    username = unquote(parsed.username) if parsed.username else None
+    return parsed.hostname, parsed.port or 22, username, parsed.path or "/"
+
+
+class SFTPConnection:
+    """One SSH transport with its SFTP session and the remote dirs already known to exist."""
+
+    def __init__(self, transport: Any, sftp: Any) -> None:
+        self.transport = transport
+        self.sftp = sftp
+        self.known_dirs: Set[str] = set()
+
+    @property
+    def alive(self) -> bool:
+        return self.transport.is_active()
+
+    def close(self) -> None:
+        try:
+            self.sftp.close()
+        except (EOFError, OSError):
+            pass  # the server already dropped the session; closing the transport is all that is left
+        finally:
+            self.transport.close()
+
+
+class SFTPConnectionPool:
+    """
+    Bounded pool of authenticated connections. Connections are opened lazily
+    and returned after each file, so a batch pays the SSH handshake and
+    authentication at most ``size`` times. A retired pool closes idle
+    connections at once and leased ones as they are returned.
+    """
+
+    def __init__(self, settings: Dict[str, Any], size: int) -> None:
+        self.settings = settings
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[SFTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._all: List[SFTPConnection] = []
+        self._retired = False
+
+    def acquire(self) -> SFTPConnection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if connection.alive:
+                    return connection
+                self._forget(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection: SFTPConnection, *, broken: bool = False) -> None:
+        with self._lock:
+            keep = not (broken or self._retired) and connection.alive
+            if keep:
+                self._idle.put(connection)
+        if not keep:
+            self._forget(connection)
+        self._slots.release()
+
+    def retire(self) -> None:
+        """Stop pooling: close idle connections now and leased ones when they come back."""
+        with self._lock:
+            self._retired = True
+            idle = []
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+        for connection in idle:
+            self._forget(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            connections, self._all = self._all, []
+        for connection in connections:
+            connection.close()
+
+    def _forget(self, connection: SFTPConnection) -> None:
+        with self._lock:
+            if connection in self._all:
+                self._all.remove(connection)
+        connection.close()
+
+    def _open(self) -> SFTPConnection:
+        settings = self.settings
+        sock = socket.create_connection((settings["host"], settings["port"]), timeout=CONNECT_TIMEOUT)
+        transport = paramiko.Transport(
+            sock, default_window_size=WINDOW_SIZE, default_max_packet_size=MAX_PACKET_SIZE
+        )
+        try:
+            transport.start_client(timeout=CONNECT_TIMEOUT)
+            self._verify_host_key(transport)
+            self._authenticate(transport)
+            sftp = paramiko.SFTPClient.from_transport(
+                transport, window_size=WINDOW_SIZE, max_packet_size=MAX_PACKET_SIZE
+            )
+        except BaseException:
+            transport.close()
+            raise
+        connection = SFTPConnection(transport, sftp)
+        with self._lock:
+            self._all.append(connection)
+        logger.info("Opened SFTP connection to {}:{} ({} pooled)", settings["host"], settings["port"], len(self._all))
+        return connection
+
+    def _verify_host_key(self, transport: Any) -> None:
+        settings = self.settings
+        key = transport.get_remote_server_key()
+        host = settings["host"] if settings["port"] == 22 else f"[{settings['host']}]:{settings['port']}"
+        host_keys = paramiko.HostKeys()
+        known_hosts = Path(settings.get("known_hosts") or Path.home() / ".ssh" / "known_hosts").expanduser()
+        if known_hosts.exists():
+            host_keys.load(str(known_hosts))
+        if host_keys.check(host, key):
+            return
+        if settings.get("strict_host_key_checking", True):
+            raise RuntimeError(f"Unknown or changed SFTP host key for {host} (add it to {known_hosts})")
+        logger.warning("Accepting unverified SFTP host key for {}", host)
+
+    def _authenticate(self, transport: Any) -> None:
+        settings = self.settings
+        username = settings["username"]
+        if settings.get("key_path"):
+            passphrase = settings.get("key_passphrase")
+            key = paramiko.PKey.from_path(
+                Path(settings["key_path"]).expanduser(), passphrase=passphrase.encode() if passphrase else None
+            )
+            transport.auth_publickey(username, key)
+        elif settings.get("password") is not None:
+            transport.auth_password(username, settings["password"])
+        else:
+            raise RuntimeError("SFTP upload needs key_path or password in config or credentials file")
+
+
+_pools: Dict[Tuple[str, int, str], SFTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings: Dict[str, Any], size: int) -> SFTPConnectionPool:
+    """
+    Pools live for the worker process so later batches reuse authenticated
+    connections. A pool replaced for new settings or a larger size is retired,
+    not closed, so a batch still using it keeps its connections.
+    """
+    key = (settings["host"], settings["port"], settings["username"])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.size < size or pool.settings != settings:
+            if pool is not None:
+                pool.retire()
+            pool = _pools[key] = SFTPConnectionPool(settings, size)
+        return pool
+
+
+class SFTPUploader:
+    """
+    Uploads up to ``max_concurrent_files`` files at once, each over its own
+    pooled connection with pipelined writes. Files land as ``<name>.part``
+    and are renamed once complete, so readers never see partial files.
+    """
+
+    def __init__(self, config: Dict[str, Any], *, pool: Optional[SFTPConnectionPool] = None) -> None:
+        if paramiko is None and pool is None:
+            raise RuntimeError("SFTP uploads require paramiko (pip install -r requirements.txt)")
+        host, port, username, self.base_path = parse_destination(config["destination"])
+        credentials: Dict[str, Any] = {}
+        if config.get("credentials_path"):
+            credentials = json.loads(Path(config["credentials_path"]).expanduser().read_text(encoding="utf-8"))
+        options = {**credentials, **config}
+        settings = {
+            "host": host,
+            "port": port,
+            "username": username or options.get("username"),
+            "password": options.get("password"),
+            "key_path": options.get("key_path"),
+            "key_passphrase": options.get("key_passphrase"),
+            "known_hosts": options.get("known_hosts"),
+            "strict_host_key_checking": options.get("strict_host_key_checking", True),
+        }
+        if not settings["username"]:
+            raise ValueError("SFTP destination needs a username")
+        self.max_files = max(1, int(config.get("max_concurrent_files", 4)))
+        self.pool = pool or get_pool(settings, self.max_files)
+
+    def key_for(self, name: str) -> str:
+        return posixpath.join(self.base_path, name)
+
+    def upload(self, tasks: List[UploadTask], progress: Progress, cancelled: threading.Event) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers=self.max_files, thread_name_prefix="sftp-file") as executor:
+            futures = [executor.submit(self._upload_one, task, progress, cancelled) for task in tasks]
+            return [future.result() for future in futures]
+
+    def _upload_one(self, task: UploadTask, progress: Progress, cancelled: threading.Event) -> Dict[str, Any]:
+        size = task.path.stat().st_size
+        base = {"name": task.path.name, "key": task.key, "total_bytes": size}
+        connection: Optional[SFTPConnection] = None
+        broken = False
+        try:
+            if cancelled.is_set():
+                raise UploadCancelled()
+            connection = self.pool.acquire()
+            started = time.perf_counter()  # throughput excludes waiting for a pooled connection
+            self._send(connection, task, size, base, progress, cancelled)
+        except UploadCancelled:
+            progress({**base, "status": "cancelled"})
+            return {**base, "status": "cancelled"}
+        except Exception as exc:  # noqa: BLE001 - reported per file
+            broken = isinstance(exc, (OSError, EOFError)) or (
+                paramiko is not None and isinstance(exc, paramiko.SSHException)
+            )
+            logger.opt(exception=exc).error("SFTP upload failed for {}", task.path)
+            progress({**base, "status": "failed", "error": str(exc)})
+            return {**base, "status": "failed", "error": str(exc)}
+        finally:
+            if connection is not None:
+                self.pool.release(connection, broken=broken)
+
+        elapsed = time.perf_counter() - started
+        result = {
+            **base,
+            "status": "success",
+            "bytes_sent": size,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "throughput_mb_s": round(size / MiB / elapsed, 2) if elapsed > 0 else None,
+        }
+        progress(result)
+        return result
+
+    def _send(
+        self,
+        connection: SFTPConnection,
+        task: UploadTask,
+        size: int,
+        base: Dict[str, Any],
+        progress: Progress,
+        cancelled: threading.Event,
+    ) -> None:
+        sftp = connection.sftp
+        self._makedirs(connection, posixpath.dirname(task.key))
+        partial = f"{task.key}.part"
+        sent = 0
+        last_report = time.perf_counter()
+        with task.path.open("rb") as source, sftp.open(partial, "wb", bufsize=BLOCK_SIZE) as remote:
+            # Pipelining sends write requests without waiting for each ack;
+            # errors surface when the file is closed.
+            remote.set_pipelined(True)
+            while True:
+                if cancelled.is_set():
+                    raise UploadCancelled()
+                block = source.read(BLOCK_SIZE)
+                if not block:
+                    break
+                remote.write(block)
+                sent += len(block)
+                now = time.perf_counter()
+                if now - last_report >= 0.5:
+                    progress({**base, "status": "uploading", "bytes_sent": sent})
+                    last_report = now
+
+        remote_size = sftp.stat(partial).st_size
+        if remote_size != size:
+            raise OSError(f"SFTP size mismatch for {task.key}: sent {size}, remote has {remote_size}")
+        try:
+            sftp.posix_rename(partial, task.key)
+        except IOError:
+            # Servers without the posix-rename extension refuse to overwrite.
+            try:
+                sftp.remove(task.key)
+            except IOError:
+                pass
+            sftp.rename(partial, task.key)
+
+    def _makedirs(self, connection: SFTPConnection, directory: str) -> None:
+        if not directory or directory in connection.known_dirs:
+            return
+        missing: List[str] = []
+        current = directory
+        while current not in ("", "/") and current not in connection.known_dirs:
+            try:
+                connection.sftp.stat(current)
+                break
+            except IOError:
+                missing.append(current)
+                current = posixpath.dirname(current)
+        for path in reversed(missing):
+            try:
+                connection.sftp.mkdir(path)
+            except IOError:
+                connection.sftp.stat(path)  # created concurrently by another file
+        connection.known_dirs.add(directory)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The worker runs with backend/ as its working directory; tests import the same way.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
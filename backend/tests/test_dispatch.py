@@ -0,0 +1,59 @@
+import json
+import threading
+from pathlib import Path
+
+from zoom_duo.dispatch import ActionSpec, Dispatcher
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def __call__(self, message) -> None:
+        encoded = json.dumps(message)  # like the worker: encoding fails before anything is written
+        with self.lock:
+            self.messages.append(json.loads(encoded))
+
+    def responses(self):
+        return {message["id"]: message for message in self.messages if "status" in message}
+
+
+def test_unencodable_result_is_answered_and_releases_the_slot():
+    emit = Recorder()
+    specs = {
+        "bad": ActionSpec(lambda payload: {"path": Path(payload["path"])}, max_concurrency=1),
+        "good": ActionSpec(lambda payload: {"ok": True}),
+    }
+    dispatcher = Dispatcher(specs, emit, threads=2)
+    dispatcher.submit("1", "bad", {"path": "/tmp/a"})
+    dispatcher.submit("2", "bad", {"path": "/tmp/b"})  # queued behind the first
+    dispatcher.submit("3", "good", {})
+    dispatcher.shutdown()  # hangs if a slot is leaked
+
+    responses = emit.responses()
+    assert responses["1"]["status"] == "error"
+    assert "could not be encoded" in responses["1"]["error"]["message"]
+    assert responses["2"]["status"] == "error"
+    assert responses["3"]["status"] == "ok"
+    assert dispatcher.stats()["actions"]["bad"]["errors"] == 2
+
+
+def test_cancelled_job_gets_exactly_one_response():
+    emit = Recorder()
+    release = threading.Event()
+
+    def slow(payload):
+        release.wait(5)
+        return {"done": True}
+
+    dispatcher = Dispatcher({"slow": ActionSpec(slow)}, emit, threads=2)
+    dispatcher.submit("1", "slow", {})
+    dispatcher.submit("c", "cancel", {"id": "1"})
+    release.set()
+    dispatcher.submit("c2", "cancel", {"id": "1"})
+    dispatcher.shutdown()
+
+    answers = [message for message in emit.messages if message.get("id") == "1"]
+    assert [message["error"]["code"] for message in answers] == ["cancelled"]
+    assert emit.responses()["c2"]["result"]["cancelled"] is False
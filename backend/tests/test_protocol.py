@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from zoom_duo import protocol
+
+msgpack = pytest.importorskip("msgpack")
+
+RESPONSE = {
+    "id": "job-1",
+    "status": "ok",
+    "result": {"items": [1, 2.5, None, True], "blob": b"\x00\x01", "名前": "テスト"},
+}
+PROGRESS = {"event": "progress", "id": "job-1", "data": {"done": 3, "total": 10}}
+
+# The same bytes are decoded by electron/main/python/__tests__/framing.test.ts; keep both in sync.
+RESPONSE_FRAME_HEX = (
+    "0000004983a26964a56a6f622d31a6737461747573a26f6ba6726573756c7483a56974656d739401cb4004000000000000"
+    "c0c3a4626c6f62c4020001a6e5908de5898da9e38386e382b9e38388"
+)
+PROGRESS_FRAME_HEX = "0000002c83a56576656e74a870726f6772657373a26964a56a6f622d31a46461746182a4646f6e6503a5746f74616c0a"
+
+
+def read_frames(stream: bytes):
+    offset = 0
+    while offset < len(stream):
+        (length,) = protocol.FRAME_HEADER.unpack_from(stream, offset)
+        offset += protocol.FRAME_HEADER.size
+        yield msgpack.unpackb(stream[offset : offset + length], raw=False)
+        offset += length
+
+
+def test_msgpack_frame_is_length_prefixed_body():
+    frame = protocol.encode_msgpack(RESPONSE)
+    (length,) = protocol.FRAME_HEADER.unpack_from(frame)
+    assert length == len(frame) - protocol.FRAME_HEADER.size
+    assert msgpack.unpackb(frame[protocol.FRAME_HEADER.size :], raw=False) == RESPONSE
+
+
+def test_concatenated_frames_decode_in_order():
+    stream = protocol.encode_msgpack(RESPONSE) + protocol.encode_msgpack(PROGRESS)
+    assert list(read_frames(stream)) == [RESPONSE, PROGRESS]
+
+
+def test_frames_match_electron_fixture():
+    assert protocol.encode_msgpack(RESPONSE).hex() == RESPONSE_FRAME_HEX
+    assert protocol.encode_msgpack(PROGRESS).hex() == PROGRESS_FRAME_HEX
+
+
+def test_jsonl_degrades_bytes_to_base64():
+    line = protocol.encode_jsonl(RESPONSE)
+    assert line.endswith(b"\n")
+    assert json.loads(line)["result"]["blob"] == "AAE="
+
+
+def test_msgpack_is_offered_first():
+    assert protocol.available_protocols() == [protocol.MSGPACK, protocol.JSONL]
+    assert protocol.encoder_for(protocol.MSGPACK) is protocol.encode_msgpack
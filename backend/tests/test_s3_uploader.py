@@ -0,0 +1,209 @@
+import json
+import os
+import socket
+import threading
+import uuid
+
+import pytest
+
+pytest.importorskip("moto.server")
+boto3 = pytest.importorskip("boto3")
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from services.uploaders.base import MiB, UploadTask  # noqa: E402
+from services.uploaders.s3 import S3_MAX_PARTS, S3_MIN_PART_SIZE, PartPlanner, PartSpec, S3Uploader  # noqa: E402
+
+FILE_SIZE = 12 * MiB  # three 5 MiB parts: 5 + 5 + 2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def endpoint():
+    # moto 5.0.x cannot report the port it bound, so pick a free one up front.
+    port = free_port()
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def client(endpoint):
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        region_name="us-east-1",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+
+
+@pytest.fixture
+def bucket(client):
+    name = f"uploads-{uuid.uuid4().hex[:12]}"
+    client.create_bucket(Bucket=name)
+    return name
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "take1.mp4"
+    path.write_bytes(os.urandom(FILE_SIZE))
+    return path
+
+
+def make_uploader(client, bucket, tmp_path, **overrides):
+    config = {
+        "destination": f"s3://{bucket}/session",
+        "max_concurrent_parts": 1,  # one part at a time keeps the interruption point deterministic
+        "part_size": S3_MIN_PART_SIZE,
+        "memory_budget": S3_MIN_PART_SIZE,  # pins the part size so the plan does not adapt mid-test
+        "state_dir": str(tmp_path / "state"),
+        **overrides,
+    }
+    return S3Uploader(config, client=client)
+
+
+class FailingClient:
+    """Delegates to a real client but fails ``upload_part`` for one part number."""
+
+    def __init__(self, client, fail_part: int) -> None:
+        self._client = client
+        self.fail_part = fail_part
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def upload_part(self, **kwargs):
+        if kwargs["PartNumber"] == self.fail_part:
+            raise ConnectionError("connection reset")
+        return self._client.upload_part(**kwargs)
+
+
+def state_files(tmp_path):
+    return sorted((tmp_path / "state").glob("*.json"))
+
+
+def test_planner_uses_part_size_and_keeps_within_part_limit():
+    planner = PartPlanner(12 * MiB, 5 * MiB, 5 * MiB, [], 0, 1)
+    parts = []
+    while (part := planner.next()) is not None:
+        parts.append(part)
+    assert [(p.number, p.offset, p.length) for p in parts] == [(1, 0, 5 * MiB), (2, 5 * MiB, 5 * MiB), (3, 10 * MiB, 2 * MiB)]
+
+    # A file too large for the part limit at the configured size gets larger parts.
+    planner = PartPlanner(2 * S3_MAX_PARTS, 1, 1, [], 0, 1)
+    assert planner.next().length == 2
+
+
+def test_planner_resends_pending_parts_before_new_ones():
+    pending = [PartSpec(2, 5 * MiB, 5 * MiB), PartSpec(1, 0, 5 * MiB)]
+    planner = PartPlanner(12 * MiB, 5 * MiB, 5 * MiB, pending, 10 * MiB, 3)
+    assert [planner.next().number for _ in range(3)] == [1, 2, 3]
+    assert planner.next() is None
+
+
+def test_planner_adapts_part_size_within_bounds():
+    planner = PartPlanner(1024 * MiB, 8 * MiB, 64 * MiB, [], 0, 1)
+    planner.observe(8 * MiB, 0.01)  # very fast: grows, but at most 2x
+    assert planner.part_size == 16 * MiB
+    planner.observe(16 * MiB, 100.0)  # very slow: shrinks, but at most half
+    assert planner.part_size == 8 * MiB
+    for _ in range(10):
+        planner.observe(planner.part_size, 100.0)
+    assert planner.part_size == S3_MIN_PART_SIZE
+
+
+def test_small_file_uses_single_put(client, bucket, tmp_path):
+    path = tmp_path / "small.json"
+    path.write_bytes(b"{}")
+    uploader = make_uploader(client, bucket, tmp_path)
+    [result] = uploader.upload([UploadTask(path, "session/small.json")], lambda event: None, threading.Event())
+    assert result["status"] == "success"
+    assert client.get_object(Bucket=bucket, Key="session/small.json")["Body"].read() == b"{}"
+    assert state_files(tmp_path) == []
+
+
+def test_interrupted_upload_resumes_from_confirmed_parts(client, bucket, tmp_path, recording):
+    task = UploadTask(recording, "session/take1.mp4")
+
+    failing = make_uploader(FailingClient(client, fail_part=3), bucket, tmp_path)
+    [result] = failing.upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "failed"
+    [sidecar] = state_files(tmp_path)
+    parts = json.loads(sidecar.read_text(encoding="utf-8"))["parts"]
+    assert sorted(parts) == ["1", "2", "3"]
+    assert "etag" not in parts["3"]  # planned, never confirmed
+
+    events = []
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], events.append, threading.Event())
+    assert result["status"] == "success"
+    assert result["resumed_bytes"] == 10 * MiB
+    assert [event["bytes_sent"] for event in events if event["status"] == "uploading"] == [FILE_SIZE]
+    assert client.get_object(Bucket=bucket, Key=task.key)["Body"].read() == recording.read_bytes()
+    assert state_files(tmp_path) == []
+
+
+def test_resume_resends_parts_that_s3_does_not_confirm(client, bucket, tmp_path, recording):
+    task = UploadTask(recording, "session/take1.mp4")
+    make_uploader(FailingClient(client, fail_part=3), bucket, tmp_path).upload([task], lambda event: None, threading.Event())
+
+    # The sidecar claims part 1 with an ETag S3 never issued for it.
+    [sidecar] = state_files(tmp_path)
+    data = json.loads(sidecar.read_text(encoding="utf-8"))
+    data["parts"]["1"]["etag"] = '"0123456789abcdef0123456789abcdef"'
+    sidecar.write_text(json.dumps(data), encoding="utf-8")
+
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "success"
+    assert result["resumed_bytes"] == 5 * MiB
+    assert client.get_object(Bucket=bucket, Key=task.key)["Body"].read() == recording.read_bytes()
+
+
+def test_changed_file_starts_a_new_upload(client, bucket, tmp_path, recording):
+    task = UploadTask(recording, "session/take1.mp4")
+    make_uploader(FailingClient(client, fail_part=3), bucket, tmp_path).upload([task], lambda event: None, threading.Event())
+    old_upload_id = json.loads(state_files(tmp_path)[0].read_text(encoding="utf-8"))["upload_id"]
+
+    recording.write_bytes(os.urandom(FILE_SIZE))
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "success"
+    assert result["resumed_bytes"] == 0
+    assert client.get_object(Bucket=bucket, Key=task.key)["Body"].read() == recording.read_bytes()
+    uploads = client.list_multipart_uploads(Bucket=bucket).get("Uploads", [])
+    assert old_upload_id not in [upload["UploadId"] for upload in uploads]
+
+
+def test_cancel_keeps_state_and_resumes(client, bucket, tmp_path, recording):
+    task = UploadTask(recording, "session/take1.mp4")
+    cancelled = threading.Event()
+
+    def cancel_after_first_part(event):
+        if event["status"] == "uploading":
+            cancelled.set()
+
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], cancel_after_first_part, cancelled)
+    assert result["status"] == "cancelled"
+    assert len(state_files(tmp_path)) == 1
+    with pytest.raises(client.exceptions.NoSuchKey):
+        client.get_object(Bucket=bucket, Key=task.key)
+
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "success"
+    assert result["resumed_bytes"] == 5 * MiB
+    assert client.get_object(Bucket=bucket, Key=task.key)["Body"].read() == recording.read_bytes()
+
+
+def test_cancelled_before_start_sends_nothing(client, bucket, tmp_path, recording):
+    cancelled = threading.Event()
+    cancelled.set()
+    task = UploadTask(recording, "session/take1.mp4")
+    [result] = make_uploader(client, bucket, tmp_path).upload([task], lambda event: None, cancelled)
+    assert result["status"] == "cancelled"
+    assert state_files(tmp_path) == []
+    assert client.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
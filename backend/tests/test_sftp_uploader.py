@@ -0,0 +1,262 @@
+import os
+import socket
+import threading
+
+import pytest
+
+paramiko = pytest.importorskip("paramiko")
+
+from services.uploaders import sftp  # noqa: E402
+from services.uploaders.base import MiB, UploadTask  # noqa: E402
+from services.uploaders.sftp import SFTPUploader  # noqa: E402
+
+USERNAME = "recorder"
+PASSWORD = "secret"
+
+
+class StubServer(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        if (username, password) == (USERNAME, PASSWORD):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class StubHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.writefile.fileno()))
+
+
+class StubSFTP(paramiko.SFTPServerInterface):
+    """Serves a local directory and records each call as ``(operation, *paths)``."""
+
+    def __init__(self, server, *args, root, log, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+        self.log = log
+
+    def _local(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def _errno(self, exc):
+        return paramiko.SFTPServer.convert_errno(exc.errno)
+
+    def open(self, path, flags, attr):
+        self.log.append(("open", path))
+        try:
+            fd = os.open(self._local(path), flags | getattr(os, "O_BINARY", 0), 0o644)
+        except OSError as exc:
+            return self._errno(exc)
+        handle = StubHandle(flags)
+        handle.writefile = handle.readfile = os.fdopen(fd, "wb" if flags & os.O_WRONLY else "rb")
+        return handle
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as exc:
+            return self._errno(exc)
+
+    lstat = stat
+
+    def mkdir(self, path, attr):
+        self.log.append(("mkdir", path))
+        try:
+            os.mkdir(self._local(path))
+        except OSError as exc:
+            return self._errno(exc)
+        return paramiko.SFTP_OK
+
+    def remove(self, path):
+        self.log.append(("remove", path))
+        try:
+            os.remove(self._local(path))
+        except OSError as exc:
+            return self._errno(exc)
+        return paramiko.SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        self.log.append(("rename", oldpath, newpath))
+        if os.path.exists(self._local(newpath)):
+            return paramiko.SFTP_FAILURE
+        os.rename(self._local(oldpath), self._local(newpath))
+        return paramiko.SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        self.log.append(("posix_rename", oldpath, newpath))
+        os.replace(self._local(oldpath), self._local(newpath))
+        return paramiko.SFTP_OK
+
+
+class SFTPTestServer:
+    """Accepts SSH connections on localhost until stopped and counts them."""
+
+    def __init__(self, root, host_key):
+        self.root = root
+        self.host_key = host_key
+        self.log = []
+        self.connections = 0
+        self.transports = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            transport = paramiko.Transport(sock)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, StubSFTP, root=self.root, log=self.log)
+            transport.start_server(server=StubServer())
+            self.transports.append(transport)
+
+    def stop(self):
+        self.listener.close()
+        for transport in self.transports:
+            transport.close()
+
+
+@pytest.fixture(scope="module")
+def host_key():
+    return paramiko.RSAKey.generate(2048)
+
+
+@pytest.fixture
+def server(tmp_path, host_key):
+    root = tmp_path / "remote"
+    root.mkdir()
+    server = SFTPTestServer(str(root), host_key)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def known_hosts(tmp_path, server, host_key):
+    path = tmp_path / "known_hosts"
+    path.write_text(f"[127.0.0.1]:{server.port} {host_key.get_name()} {host_key.get_base64()}\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools(monkeypatch):
+    pools = {}
+    monkeypatch.setattr(sftp, "_pools", pools)
+    yield
+    for pool in pools.values():
+        pool.close()
+
+
+def make_uploader(server, known_hosts, **overrides):
+    config = {
+        "destination": f"sftp://{USERNAME}@127.0.0.1:{server.port}/takes",
+        "password": PASSWORD,
+        "known_hosts": str(known_hosts),
+        **overrides,
+    }
+    return SFTPUploader(config)
+
+
+def make_tasks(tmp_path, uploader, count, size=MiB + 123):
+    tasks = []
+    for index in range(count):
+        path = tmp_path / f"take{index + 1}.mp4"
+        path.write_bytes(os.urandom(size))
+        tasks.append(UploadTask(path, uploader.key_for(path.name)))
+    return tasks
+
+
+def test_files_land_as_part_and_are_renamed(tmp_path, server, known_hosts):
+    uploader = make_uploader(server, known_hosts, max_concurrent_files=1)
+    [task] = make_tasks(tmp_path, uploader, 1)
+    existing = tmp_path / "remote" / "takes"
+    existing.mkdir()
+    (existing / "take1.mp4").write_bytes(b"stale")
+
+    [result] = uploader.upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "success"
+    assert ("open", "/takes/take1.mp4.part") in server.log
+    assert ("posix_rename", "/takes/take1.mp4.part", "/takes/take1.mp4") in server.log
+    assert not any(entry[0] == "open" and entry[1] == "/takes/take1.mp4" for entry in server.log)
+    assert sorted(os.listdir(existing)) == ["take1.mp4"]
+    assert (existing / "take1.mp4").read_bytes() == task.path.read_bytes()
+
+
+def test_creates_missing_directories_once_per_connection(tmp_path, server, known_hosts):
+    destination = f"sftp://{USERNAME}@127.0.0.1:{server.port}/a/b"
+    uploader = make_uploader(server, known_hosts, destination=destination, max_concurrent_files=1)
+    tasks = make_tasks(tmp_path, uploader, 2, size=10)
+    results = uploader.upload(tasks, lambda event: None, threading.Event())
+    assert [result["status"] for result in results] == ["success", "success"]
+    assert [entry for entry in server.log if entry[0] == "mkdir"] == [("mkdir", "/a"), ("mkdir", "/a/b")]
+
+
+def test_unknown_host_key_is_rejected(tmp_path, server):
+    empty = tmp_path / "empty_known_hosts"
+    empty.write_text("", encoding="utf-8")
+    uploader = make_uploader(server, empty)
+    [task] = make_tasks(tmp_path, uploader, 1, size=10)
+
+    [result] = uploader.upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "failed"
+    assert "host key" in result["error"]
+    assert server.log == []  # no SFTP session was opened, so nothing was written
+
+
+def test_changed_host_key_is_rejected(tmp_path, server):
+    other = paramiko.RSAKey.generate(2048)
+    known_hosts = tmp_path / "known_hosts"
+    known_hosts.write_text(f"[127.0.0.1]:{server.port} {other.get_name()} {other.get_base64()}\n", encoding="utf-8")
+    uploader = make_uploader(server, known_hosts)
+    [task] = make_tasks(tmp_path, uploader, 1, size=10)
+
+    [result] = uploader.upload([task], lambda event: None, threading.Event())
+    assert result["status"] == "failed"
+    assert "host key" in result["error"]
+
+
+def test_batches_reuse_pooled_connections(tmp_path, server, known_hosts):
+    first = make_uploader(server, known_hosts, max_concurrent_files=2)
+    results = first.upload(make_tasks(tmp_path, first, 4), lambda event: None, threading.Event())
+    assert {result["status"] for result in results} == {"success"}
+    opened = server.connections
+    assert 1 <= opened <= 2
+
+    second = make_uploader(server, known_hosts, max_concurrent_files=2)
+    assert second.pool is first.pool
+    results = second.upload(make_tasks(tmp_path, second, 3), lambda event: None, threading.Event())
+    assert {result["status"] for result in results} == {"success"}
+    assert server.connections == opened
+
+
+def test_replaced_pool_keeps_leased_connections_until_returned(server, known_hosts):
+    old = make_uploader(server, known_hosts, max_concurrent_files=1).pool
+    leased = old.acquire()
+
+    new = make_uploader(server, known_hosts, max_concurrent_files=2).pool
+    assert new is not old
+    assert leased.alive
+    leased.sftp.stat("/")  # still usable by the batch that holds it
+
+    old.release(leased)
+    assert not leased.alive  # closed on return instead of going back to the retired pool
+    assert new.acquire().alive
+
+
+def test_retire_closes_idle_connections_immediately(server, known_hosts):
+    pool = make_uploader(server, known_hosts, max_concurrent_files=1).pool
+    connection = pool.acquire()
+    pool.release(connection)
+    assert connection.alive
+
+    pool.retire()
+    assert not connection.alive
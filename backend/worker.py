@@ -2,27 +2,72 @@
 
 from __future__ import annotations
 
-import json
-import sys
-from pathlib import Path
-from typing import Any, Callable, Dict
+import time
 
-from loguru import logger
+# Taken before the remaining imports so startup_ms includes them.
+_STARTED = time.perf_counter()
 
-from zoom_duo import themes
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any, Dict, Generator, Iterable, List, Optional, Sequence  # noqa: E402
+
+from loguru import logger  # noqa: E402
+
+from zoom_duo import protocol, themes  # noqa: E402
+from zoom_duo.dispatch import ActionSpec, Dispatcher, Frame, default_process_count, limits_from_env  # noqa: E402
+
+THEME_RECORD_FIELDS = ("theme_id", "category", "title", "role_A_prompt", "role_B_prompt", "hints")
+DEFAULT_CHUNK_SIZE = 200
+MAX_CHUNK_SIZE = 5000
 
 
 class Worker:
     def __init__(self) -> None:
-        self.handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
-            "generate_consent_pdf": self.handle_generate_consent_pdf,
-            "themes/hash-index": self.handle_themes_hash_index,
-            "themes/load-records": self.handle_load_themes,
+        self.handlers: Dict[str, ActionSpec] = {
+            # weasyprint is heavy: imported on first use, rendered on the process pool
+            # so each pool process keeps a warm renderer.
+            "generate_consent_pdf": ActionSpec("services.consent:render_consent", kind="cpu"),
+            "consent/batch": ActionSpec("services.consent:render_consent_batch", max_concurrency=1),
+            # Each batch already transfers files and parts in parallel; further batches queue.
+            "upload_batch": ActionSpec("services.uploaders.batch:upload_batch", max_concurrency=1),
+            "themes/hash-index": ActionSpec(self.handle_themes_hash_index, pure=True, file_fields=("csv_path",)),
+            "themes/load-records": ActionSpec(self.handle_load_themes, pure=True, file_fields=("csv_path",)),
+            "themes/near-duplicates": ActionSpec(
+                handle_themes_near_duplicates, kind="cpu", pure=True, file_fields=("csv_path",)
+            ),
+            "worker/prewarm": ActionSpec(self.handle_prewarm),
+            "worker/stats": ActionSpec(self.handle_stats),
+            "worker/cache-invalidate": ActionSpec(self.handle_cache_invalidate),
         }
+        self._emit_lock = threading.Lock()
+        self._encode = protocol.encode_jsonl
+        self.dispatcher = Dispatcher(
+            self.handlers,
+            self.emit,
+            threads=int(os.environ.get("ZOOM_DUO_WORKER_THREADS", "8")),
+            processes=int(os.environ.get("ZOOM_DUO_WORKER_PROCESSES", default_process_count())),
+            limits=limits_from_env(os.environ.get("ZOOM_DUO_WORKER_LIMITS")),
+            cache_size=int(os.environ.get("ZOOM_DUO_WORKER_CACHE_SIZE", "64")),
+        )
+        self._stats_interval = float(os.environ.get("ZOOM_DUO_WORKER_STATS_INTERVAL", "0"))
+        self._stats_wakeup = threading.Event()
+        self._stats_stopped = False
 
     def run(self) -> None:
-        """Main loop reading JSON lines from stdin."""
-        self.emit({"status": "ready"})
+        """Main loop reading JSON lines from stdin and dispatching them concurrently."""
+        # Pools and service imports are lazy, so ready goes out as soon as the loop is up.
+        self.emit(
+            {
+                "status": "ready",
+                "pid": os.getpid(),
+                "startup_ms": round((time.perf_counter() - _STARTED) * 1000, 1),
+                "protocols": protocol.available_protocols(),
+            }
+        )
+        threading.Thread(target=self._stats_loop, name="worker-stats", daemon=True).start()
         for line in sys.stdin:
             line = line.strip()
             if not line:
@@ -36,57 +81,86 @@ class Worker:
                 logger.error("Invalid JSON from Node: {}", exc)
                 continue
 
-            if action in self.handlers:
-                try:
-                    result = self.handlers[action](payload)
-                    self.emit(
-                        {
-                            "id": request_id,
-                            "action": action,
-                            "status": "ok",
-                            "result": result,
-                        }
-                    )
-                except Exception as exc:  # noqa: BLE001 - top-level error boundary
-                    logger.exception("Handler failed for action={}", action)
-                    self.emit(
-                        {
-                            "id": request_id,
-                            "action": action,
-                            "status": "error",
-                            "error": {"message": str(exc)},
-                        }
-                    )
-            else:
-                logger.warning("Unknown action received: {}", action)
-                self.emit(
+            if action == "worker/protocol":
+                self.switch_protocol(request_id, payload)
+                continue
+            self.dispatcher.submit(request_id, action, payload)
+
+        # stdin closed: let in-flight requests answer before exiting
+        self.dispatcher.shutdown()
+        self._stats_stopped = True
+        self._stats_wakeup.set()
+
+    def emit(self, payload: Dict[str, Any]) -> None:
+        # Handlers finish on pool threads; one lock keeps each frame whole.
+        with self._emit_lock:
+            self._write(self._encode(payload))
+
+    def _write(self, data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    def switch_protocol(self, request_id: Optional[str], payload: Dict[str, Any]) -> None:
+        """
+        Switch worker → Electron framing. Requests stay JSON lines. The
+        acknowledgement is the last message in the old encoding; everything
+        after it uses the new one, so the reader can switch right after it.
+        """
+        requested = str(payload.get("protocol") or protocol.JSONL)
+        if requested not in protocol.available_protocols():
+            self.emit(
+                {
+                    "id": request_id,
+                    "action": "worker/protocol",
+                    "status": "error",
+                    "error": {"message": f"Unsupported protocol: {requested}", "code": "unsupported"},
+                }
+            )
+            return
+        with self._emit_lock:
+            self._write(
+                self._encode(
                     {
                         "id": request_id,
-                        "action": action,
-                        "status": "error",
-                        "error": {"message": f"Unknown action: {action}"},
+                        "action": "worker/protocol",
+                        "status": "ok",
+                        "result": {"protocol": requested},
                     }
                 )
+            )
+            self._encode = protocol.encoder_for(requested)
+        logger.info("Switched output protocol to {}", requested)
 
-    def emit(self, payload: Dict[str, Any]) -> None:
-        sys.stdout.write(json.dumps(payload) + "\n")
-        sys.stdout.flush()
-
-    def handle_generate_consent_pdf(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """Placeholder implementation creating a stub consent PDF."""
-        export_root = Path(payload.get("export_root", "."))
-        session_dir = Path(payload.get("session_dir", "session"))
-        target_dir = export_root / session_dir
-        target_dir.mkdir(parents=True, exist_ok=True)
-        pdf_path = target_dir / "00_consent.pdf"
-        pdf_path.write_text("Consent placeholder", encoding="utf-8")
-
-        logger.info("Generated stub consent PDF at {}", pdf_path)
-        return {
-            "path": str(pdf_path),
-            "session_dir": str(session_dir),
-            "submitted_at": payload.get("timestamp")
-        }
+    def handle_prewarm(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Import service modules (and start CPU pool processes) before first use."""
+        result = self.dispatcher.prewarm(payload.get("actions"))
+        logger.info("Pre-warmed {} actions in {} ms", len(result["actions"]), result["elapsed_ms"])
+        return result
+
+    def handle_stats(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return dispatcher statistics. ``interval`` (seconds, 0 disables)
+        switches the periodic ``stats`` event on or off.
+        """
+        if "interval" in payload:
+            self._stats_interval = max(0.0, float(payload["interval"]))
+            self._stats_wakeup.set()
+        result = self.dispatcher.stats()
+        result["interval"] = self._stats_interval
+        return result
+
+    def handle_cache_invalidate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Drop memoized results by ``action`` and/or ``path``; an empty payload clears all."""
+        removed = self.dispatcher.invalidate_cache(action=payload.get("action"), path=payload.get("path"))
+        return {"removed": removed}
+
+    def _stats_loop(self) -> None:
+        while not self._stats_stopped:
+            interval = self._stats_interval
+            woken = self._stats_wakeup.wait(interval if interval > 0 else None)
+            self._stats_wakeup.clear()
+            if not woken and not self._stats_stopped and self._stats_interval > 0:
+                self.emit({"event": "stats", "data": self.dispatcher.stats()})
 
     def handle_themes_hash_index(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         csv_path = Path(payload.get("csv_path", ""))
@@ -108,25 +182,112 @@ class Worker:
             "duplicates": duplicate_summary,
         }
 
-    def handle_load_themes(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+    def handle_load_themes(self, payload: Dict[str, Any]) -> Any:
+        """
+        Return theme records, optionally projected (``fields``) and paged
+        (``offset``/``limit``). With ``stream: true`` records are sent as
+        ``themes/chunk`` frames while the CSV is parsed and the final result
+        only carries the totals.
+        """
         csv_path = Path(payload.get("csv_path", ""))
         if not csv_path.exists():
             raise FileNotFoundError(f"Theme CSV not found: {csv_path}")
 
+        fields = _theme_fields(payload.get("fields"))
+        offset = max(0, int(payload.get("offset") or 0))
+        limit = payload.get("limit")
+        limit = None if limit is None else max(0, int(limit))
+
+        if payload.get("stream"):
+            chunk_size = min(MAX_CHUNK_SIZE, max(1, int(payload.get("chunk_size") or DEFAULT_CHUNK_SIZE)))
+            return self._stream_load_themes(csv_path, fields, offset, limit, chunk_size)
+
         records, _ = themes.load_themes(csv_path)
-        serialized = [
-            {
-                "theme_id": record.theme_id,
-                "category": record.category,
-                "title": record.title,
-                "role_A_prompt": record.role_a_prompt,
-                "role_B_prompt": record.role_b_prompt,
-                "hints": record.hints,
-            }
-            for record in records
-        ]
+        window = records[offset:] if limit is None else records[offset : offset + limit]
+        return {
+            "items": [serialize_theme_record(record, fields) for record in window],
+            "total": len(records),
+            "offset": offset,
+        }
+
+    def _stream_load_themes(
+        self,
+        csv_path: Path,
+        fields: Sequence[str],
+        offset: int,
+        limit: Optional[int],
+        chunk_size: int,
+    ) -> Generator[Frame, None, Dict[str, Any]]:
+        total = 0
+        sent = 0
+        chunks = 0
+        chunk: List[Dict[str, Any]] = []
+        for record in themes.iter_themes(csv_path):
+            total += 1
+            if total <= offset or (limit is not None and sent >= limit):
+                continue
+            chunk.append(serialize_theme_record(record, fields))
+            sent += 1
+            if len(chunk) >= chunk_size:
+                yield Frame("themes/chunk", {"seq": chunks, "items": chunk})
+                chunks += 1
+                chunk = []
+        if chunk:
+            yield Frame("themes/chunk", {"seq": chunks, "items": chunk})
+            chunks += 1
+
+        logger.info("Streamed {} of {} themes from {} in {} chunks", sent, total, csv_path, chunks)
+        return {"streamed": True, "count": sent, "total": total, "offset": offset, "chunks": chunks}
+
+
+def _theme_fields(value: Optional[Iterable[str]]) -> Sequence[str]:
+    if not value:
+        return THEME_RECORD_FIELDS
+    fields = list(value)
+    unknown = [name for name in fields if name not in THEME_RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown theme fields: {', '.join(unknown)}")
+    return fields
+
+
+def serialize_theme_record(record: themes.ThemeRecord, fields: Sequence[str] = THEME_RECORD_FIELDS) -> Dict[str, Any]:
+    values = {
+        "theme_id": record.theme_id,
+        "category": record.category,
+        "title": record.title,
+        "role_A_prompt": record.role_a_prompt,
+        "role_B_prompt": record.role_b_prompt,
+        "hints": record.hints,
+    }
+    return {name: values[name] for name in fields}
+
+
+def handle_themes_near_duplicates(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """CPU-bound MinHash clustering; runs on the process pool."""
+    csv_path = Path(payload.get("csv_path", ""))
+    if not csv_path.exists():
+        raise FileNotFoundError(f"Theme CSV not found: {csv_path}")
+
+    threshold = float(payload.get("threshold", 0.6))
+    num_perm = int(payload.get("num_perm", 128))
+    ngram = int(payload.get("ngram", 2))
+
+    records, duplicates = themes.load_themes(csv_path)
+    clusters = themes.find_near_duplicates(records, threshold=threshold, num_perm=num_perm, ngram=ngram)
+
+    logger.info(
+        "Found {} near-duplicate clusters in {} themes (threshold={})",
+        len(clusters),
+        len(records),
+        threshold,
+    )
 
-        return {"items": serialized}
+    return {
+        "count": len(records),
+        "threshold": threshold,
+        "duplicates": themes.summarize_duplicates(duplicates),
+        "near_duplicates": clusters,
+    }
 
 
 def main() -> None:
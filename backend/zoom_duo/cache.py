@@ -0,0 +1,87 @@
+"""Memoization of results for worker actions that declare themselves pure."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+CacheKey = Tuple[str, str, Tuple[Tuple[str, Optional[Tuple[int, int, int]]], ...]]
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int, int]]:
+    """(size, mtime_ns, inode) of ``path``, or None when it cannot be stat'ed."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def cache_key(action: str, payload: Dict[str, Any], file_fields: Iterable[str]) -> Optional[CacheKey]:
+    """
+    Key on the action, the canonical JSON of the payload and the identity of
+    every referenced file, so an edited file never hits a stale entry.
+    Returns None for payloads that cannot be canonicalised.
+    """
+    normalized = dict(payload)
+    files = []
+    for name in file_fields:
+        value = normalized.get(name)
+        if isinstance(value, str) and value:
+            path = os.path.realpath(value)
+            normalized[name] = path
+            files.append((path, file_identity(path)))
+    try:
+        canonical = json.dumps(normalized, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return action, canonical, tuple(files)
+
+
+class ResultCache:
+    """Thread-safe LRU of action results bounded by entry count."""
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[CacheKey, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: CacheKey, value: Any) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *, action: Optional[str] = None, path: Optional[str] = None) -> int:
+        """Drop entries for ``action`` and/or referencing ``path``; no filter clears everything."""
+        resolved = os.path.realpath(path) if path else None
+        with self._lock:
+            doomed = [
+                key
+                for key in self._entries
+                if (action is None or key[0] == action)
+                and (resolved is None or any(file_path == resolved for file_path, _ in key[2]))
+            ]
+            for key in doomed:
+                del self._entries[key]
+        return len(doomed)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,397 @@
+"""Concurrent request dispatch for the Python worker."""
+from __future__ import annotations
+
+import functools
+import importlib
+import inspect
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from .cache import CacheKey, ResultCache, cache_key
+from .stats import WorkerStats
+
+# A handler either returns its result, or is a generator that yields progress
+# frames (a dict, or a Frame for a named event) and returns its result.
+Handler = Callable[[Dict[str, Any]], Union[Dict[str, Any], Generator[Any, None, Dict[str, Any]]]]
+
+
+class JobCancelled(Exception):
+    """Raised inside the dispatcher when a running job was cancelled."""
+
+
+@dataclass(slots=True)
+class Frame:
+    """Intermediate frame yielded by a streaming handler."""
+
+    event: str
+    data: Dict[str, Any]
+
+
+@functools.lru_cache(maxsize=None)
+def import_handler(target: str) -> Handler:
+    """Resolve a ``"package.module:function"`` handler reference."""
+    module_name, _, attr = target.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Handler reference must look like 'module:function': {target}")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def run_imported(target: str, payload: Dict[str, Any]) -> Any:
+    """Process-pool entry point for handlers given by import string."""
+    return import_handler(target)(payload)
+
+
+def warm_imports(targets: List[str]) -> int:
+    for target in targets:
+        import_handler(target)
+    return os.getpid()
+
+
+@dataclass(slots=True)
+class ActionSpec:
+    # A callable, or a "module:function" string imported on first use so
+    # heavy service dependencies stay out of worker startup.
+    handler: Union[Handler, str]
+    # "io" handlers run on the thread pool; "cpu" handlers run on the process
+    # pool and must be picklable module-level functions (or import strings).
+    kind: str = "io"
+    max_concurrency: Optional[int] = None
+    # Pure actions depend only on their payload and the files named by
+    # ``file_fields``; their results are memoized. Streamed results never are.
+    pure: bool = False
+    file_fields: Tuple[str, ...] = ()
+
+
+@dataclass(slots=True)
+class Job:
+    request_id: Optional[str]
+    action: str
+    payload: Dict[str, Any]
+    spec: ActionSpec = field(repr=False)
+    cancelled: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+    # Set once the cancellation response was sent, so completion stays silent.
+    answered: bool = False
+    submitted_at: float = field(default_factory=time.perf_counter, repr=False)
+    cache_key: Optional[CacheKey] = field(default=None, repr=False)
+    streamed: bool = False
+
+
+class Dispatcher:
+    """
+    Runs worker actions concurrently and emits each response as soon as it
+    finishes, so responses may arrive out of request order. Actions over
+    their concurrency limit wait in a per-action FIFO queue.
+    """
+
+    def __init__(
+        self,
+        specs: Dict[str, ActionSpec],
+        emit: Callable[[Dict[str, Any]], None],
+        *,
+        threads: int = 8,
+        processes: int = 2,
+        limits: Optional[Dict[str, int]] = None,
+        cache_size: int = 64,
+    ) -> None:
+        self._specs = specs
+        self._emit = emit
+        self._threads = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="worker-io")
+        self._process_count = max(1, processes)
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._limits = dict(limits or {})
+        self._lock = threading.Lock()
+        self._queued: Dict[str, Deque[Job]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._running: Dict[str, Job] = {}
+        self._idle = threading.Condition(self._lock)
+        self._stats = WorkerStats()
+        self._cache = ResultCache(cache_size)
+        self._started_at = time.monotonic()
+
+    def submit(self, request_id: Optional[str], action: str, payload: Dict[str, Any]) -> None:
+        if action == "cancel":
+            # Control action: answered inline so it never waits behind the job it cancels.
+            self._emit_ok(request_id, action, self.cancel(str(payload.get("id") or "")))
+            return
+
+        spec = self._specs.get(action)
+        if spec is None:
+            logger.warning("Unknown action received: {}", action)
+            self._emit_error(request_id, action, f"Unknown action: {action}")
+            return
+
+        job = Job(request_id=request_id, action=action, payload=payload, spec=spec)
+        if spec.pure:
+            job.cache_key = cache_key(action, payload, spec.file_fields)
+            if job.cache_key is not None:
+                hit, result = self._cache.get(job.cache_key)
+                if hit:
+                    self._emit_ok(request_id, action, result)
+                    self._stats.record(action, time.perf_counter() - job.submitted_at, "ok")
+                    return
+        with self._lock:
+            if request_id is not None:
+                self._running[request_id] = job
+            if self._in_flight.get(action, 0) >= self._limit_for(action, spec):
+                self._queued.setdefault(action, deque()).append(job)
+                return
+            self._in_flight[action] = self._in_flight.get(action, 0) + 1
+        self._start(job)
+
+    def cancel(self, request_id: str) -> Dict[str, Any]:
+        """
+        Cancel a queued or running request; the cancelled request is answered
+        right away with an error of code ``cancelled``. Queued jobs are
+        dropped, streaming jobs stop at their next yield and have their
+        generator closed so ``finally`` blocks release resources. A handler
+        that never yields (or a started process-pool job) runs to completion
+        and its result is discarded.
+        """
+        with self._lock:
+            job = self._running.get(request_id)
+            if job is None or job.answered:
+                return {"id": request_id, "cancelled": False, "state": "not_found"}
+            job.cancelled.set()
+            job.answered = True
+            queue = self._queued.get(job.action)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                del self._running[request_id]
+                state = "queued"
+                self._stats.record(job.action, time.perf_counter() - job.submitted_at, "cancelled")
+            else:
+                state = "running"
+        if job.future is not None:
+            job.future.cancel()
+        self._emit_cancelled(job)
+        logger.info("Cancelled request id={} action={} ({})", request_id, job.action, state)
+        return {"id": request_id, "cancelled": True, "state": state}
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-action counts and latency percentiles plus current queue depth."""
+        with self._lock:
+            depths = {
+                action: (self._in_flight.get(action, 0), len(self._queued.get(action, ())))
+                for action in set(self._in_flight) | set(self._queued)
+            }
+        snapshot = self._stats.snapshot(depths)
+        snapshot["uptime_s"] = round(time.monotonic() - self._started_at, 1)
+        snapshot["cache"] = self._cache.snapshot()
+        return snapshot
+
+    def invalidate_cache(self, *, action: Optional[str] = None, path: Optional[str] = None) -> int:
+        return self._cache.invalidate(action=action, path=path)
+
+    def prewarm(self, actions: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Import lazily referenced handlers ahead of their first request. CPU
+        actions also start the process pool and import their modules in
+        every child, so they are only warmed when named explicitly; with no
+        ``actions`` just the I/O handlers are imported.
+        """
+        started = time.perf_counter()
+        if actions is None:
+            names = [name for name, spec in self._specs.items() if spec.kind != "cpu"]
+        else:
+            names = [name for name in actions if name in self._specs]
+        io_targets = [
+            self._specs[name].handler
+            for name in names
+            if self._specs[name].kind != "cpu" and isinstance(self._specs[name].handler, str)
+        ]
+        cpu_targets = [
+            self._specs[name].handler
+            for name in names
+            if self._specs[name].kind == "cpu" and isinstance(self._specs[name].handler, str)
+        ]
+        for target in io_targets:
+            import_handler(target)  # type: ignore[arg-type]
+
+        pids: set[int] = set()
+        if any(self._specs[name].kind == "cpu" for name in names):
+            pool = self._process_pool()
+            futures = [pool.submit(warm_imports, cpu_targets) for _ in range(self._process_count)]
+            wait(futures)
+            pids = {future.result() for future in futures if future.exception() is None}
+
+        return {
+            "actions": names,
+            "imported": io_targets + cpu_targets,
+            "processes": len(pids),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    def wait_idle(self) -> None:
+        """Block until every accepted request has produced its response."""
+        with self._idle:
+            self._idle.wait_for(lambda: not any(self._in_flight.values()))
+
+    def shutdown(self) -> None:
+        self.wait_idle()
+        self._threads.shutdown(wait=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=True)
+
+    def _limit_for(self, action: str, spec: ActionSpec) -> int:
+        limit = self._limits.get(action, spec.max_concurrency)
+        return limit if limit and limit > 0 else 1 << 30
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        # Created on first use so workers that never run CPU actions spawn no children.
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                max_workers=self._process_count,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._processes
+
+    def _start(self, job: Job) -> None:
+        try:
+            if job.spec.kind == "cpu":
+                handler = job.spec.handler
+                if isinstance(handler, str):
+                    future: Future = self._process_pool().submit(run_imported, handler, job.payload)
+                else:
+                    future = self._process_pool().submit(handler, job.payload)
+            else:
+                future = self._threads.submit(self._run_io, job)
+        except Exception as exc:  # noqa: BLE001 - pool shut down or unpicklable payload
+            self._finish(job, None, exc)
+            return
+        job.future = future
+        future.add_done_callback(lambda done: self._on_done(job, done))
+
+    def _run_io(self, job: Job) -> Dict[str, Any]:
+        if job.cancelled.is_set():
+            raise JobCancelled()
+        handler = job.spec.handler
+        outcome = (import_handler(handler) if isinstance(handler, str) else handler)(job.payload)
+        if not inspect.isgenerator(outcome):
+            return outcome
+        job.streamed = True
+        try:
+            while True:
+                try:
+                    frame = next(outcome)
+                except StopIteration as stop:
+                    return stop.value
+                if job.cancelled.is_set():
+                    raise JobCancelled()
+                self._emit_frame(job, frame)
+        finally:
+            outcome.close()
+
+    def _emit_frame(self, job: Job, frame: Any) -> None:
+        event, data = (frame.event, frame.data) if isinstance(frame, Frame) else ("progress", frame)
+        self._emit({"event": event, "data": {"id": job.request_id, "action": job.action, **(data or {})}})
+
+    def _on_done(self, job: Job, future: Future) -> None:
+        if future.cancelled():
+            self._finish(job, None, JobCancelled())
+            return
+        exc = future.exception()
+        self._finish(job, None if exc else future.result(), exc)
+
+    def _finish(self, job: Job, result: Optional[Dict[str, Any]], exc: Optional[BaseException]) -> None:
+        # Runs in a future's done-callback, where exceptions vanish: whatever
+        # happens to the response, the slot must be released or the action's
+        # queue stalls and wait_idle() never returns.
+        outcome = "error"
+        next_job: Optional[Job] = None
+        try:
+            outcome = self._respond(job, result, exc)
+        except Exception as emit_exc:  # noqa: BLE001 - stdout itself failed; keep the queue moving
+            logger.opt(exception=emit_exc).error("Could not send response for action={}", job.action)
+        finally:
+            self._stats.record(job.action, time.perf_counter() - job.submitted_at, outcome)
+            with self._lock:
+                if job.request_id is not None and self._running.get(job.request_id) is job:
+                    del self._running[job.request_id]
+                queue = self._queued.get(job.action)
+                next_job = queue.popleft() if queue else None
+                if next_job is None:
+                    self._in_flight[job.action] -= 1
+                    self._idle.notify_all()
+        if next_job is not None:
+            self._start(next_job)
+
+    def _respond(self, job: Job, result: Optional[Dict[str, Any]], exc: Optional[BaseException]) -> str:
+        """Send the job's response (unless cancel already did) and return its stats outcome."""
+        # cancel() sets both flags under the lock; claiming the answer under the
+        # same lock means exactly one of ok/error/cancelled is ever sent.
+        with self._lock:
+            answered, job.answered = job.answered, True
+            cancelled = job.cancelled.is_set() or isinstance(exc, JobCancelled)
+        if answered:
+            return "cancelled"
+        if cancelled:
+            self._emit_cancelled(job)
+            return "cancelled"
+        if exc is not None:
+            logger.opt(exception=exc).error("Handler failed for action={}", job.action)
+            self._emit_error(job.request_id, job.action, str(exc))
+            return "error"
+        try:
+            self._emit_ok(job.request_id, job.action, result)
+        except Exception as encode_exc:  # noqa: BLE001 - e.g. a handler returned a Path or a set
+            logger.opt(exception=encode_exc).error("Result of action={} could not be encoded", job.action)
+            self._emit_error(job.request_id, job.action, f"Result could not be encoded: {encode_exc}")
+            return "error"
+        if job.cache_key is not None and not job.streamed:
+            self._cache.put(job.cache_key, result)
+        return "ok"
+
+    def _emit_ok(self, request_id: Optional[str], action: Optional[str], result: Optional[Dict[str, Any]]) -> None:
+        self._emit(
+            {
+                "id": request_id,
+                "action": action,
+                "status": "ok",
+                "result": result,
+            }
+        )
+
+    def _emit_error(
+        self,
+        request_id: Optional[str],
+        action: Optional[str],
+        message: str,
+        code: Optional[str] = None,
+    ) -> None:
+        error: Dict[str, Any] = {"message": message}
+        if code is not None:
+            error["code"] = code
+        self._emit(
+            {
+                "id": request_id,
+                "action": action,
+                "status": "error",
+                "error": error,
+            }
+        )
+
+    def _emit_cancelled(self, job: Job) -> None:
+        self._emit_error(job.request_id, job.action, "Request cancelled", code="cancelled")
+
+
+def limits_from_env(value: Optional[str]) -> Dict[str, int]:
+    """Parse ``action=limit`` pairs, e.g. ``generate_consent_pdf=1,themes/near-duplicates=2``."""
+    limits: Dict[str, int] = {}
+    for item in (value or "").split(","):
+        action, _, limit = item.strip().rpartition("=")
+        if action and limit.strip().isdigit():
+            limits[action.strip()] = int(limit)
+    return limits
+
+
+def default_process_count() -> int:
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
@@ -0,0 +1,56 @@
+"""Wire encodings for worker → Electron messages."""
+from __future__ import annotations
+
+import base64
+import json
+import struct
+from typing import Any, Callable, Dict, List
+
+try:  # Binary framing is optional; JSON lines remain the fallback.
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+JSONL = "jsonl"
+MSGPACK = "msgpack"
+
+# msgpack frames are a 4-byte big-endian body length followed by the body.
+FRAME_HEADER = struct.Struct(">I")
+
+Encoder = Callable[[Dict[str, Any]], bytes]
+
+
+def available_protocols() -> List[str]:
+    """Protocols this worker can speak, preferred first."""
+    return ([MSGPACK] if msgpack is not None else []) + [JSONL]
+
+
+def _json_default(value: Any) -> Any:
+    # Text framing has no binary type, so blobs degrade to base64 here only.
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_jsonl(message: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(message, default=_json_default, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(message, default=_json_default) + "\n").encode("utf-8")
+
+
+def encode_msgpack(message: Dict[str, Any]) -> bytes:
+    body = msgpack.packb(message, use_bin_type=True)
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def encoder_for(protocol: str) -> Encoder:
+    if protocol == JSONL:
+        return encode_jsonl
+    if protocol == MSGPACK and msgpack is not None:
+        return encode_msgpack
+    raise ValueError(f"Unsupported protocol: {protocol}")
@@ -0,0 +1,98 @@
+"""Per-action latency and outcome counters for the Python worker."""
+from __future__ import annotations
+
+import math
+import os
+import sys
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+# Percentiles are computed over the most recent samples so a long session
+# reflects current behaviour and memory stays bounded.
+DEFAULT_WINDOW = 1024
+
+
+def percentile(ordered: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident set size of this process; peak RSS where the current value is unavailable."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ActionStats:
+    __slots__ = ("count", "errors", "cancelled", "samples")
+
+    def __init__(self, window: int) -> None:
+        self.count = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def snapshot(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "p50_ms": percentile(ordered, 50),
+            "p95_ms": percentile(ordered, 95),
+            "p99_ms": percentile(ordered, 99),
+            "max_ms": ordered[-1] if ordered else None,
+        }
+
+
+class WorkerStats:
+    """Thread-safe collector fed by the dispatcher as requests complete."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW) -> None:
+        self._window = window
+        self._lock = threading.Lock()
+        self._actions: Dict[str, ActionStats] = {}
+
+    def record(self, action: str, latency_s: float, outcome: str) -> None:
+        """Record one finished request; ``outcome`` is ``ok``, ``error`` or ``cancelled``."""
+        with self._lock:
+            stats = self._actions.get(action)
+            if stats is None:
+                stats = self._actions[action] = ActionStats(self._window)
+            stats.count += 1
+            if outcome == "error":
+                stats.errors += 1
+            elif outcome == "cancelled":
+                stats.cancelled += 1
+            stats.samples.append(round(latency_s * 1000, 3))
+
+    def snapshot(self, depths: Dict[str, Tuple[int, int]]) -> Dict[str, Any]:
+        """Combine latency counters with ``(in_flight, queued)`` depth per action."""
+        with self._lock:
+            actions = {name: stats.snapshot() for name, stats in self._actions.items()}
+        for name, (in_flight, queued) in depths.items():
+            entry = actions.setdefault(name, ActionStats(0).snapshot())
+            entry["in_flight"] = in_flight
+            entry["queued"] = queued
+        for entry in actions.values():
+            entry.setdefault("in_flight", 0)
+            entry.setdefault("queued", 0)
+        return {
+            "actions": actions,
+            "in_flight": sum(entry["in_flight"] for entry in actions.values()),
+            "queued": sum(entry["queued"] for entry in actions.values()),
+            "rss_bytes": current_rss_bytes(),
+        }
@@ -2,10 +2,23 @@ from __future__ import annotations
 
 import csv
 import hashlib
+import io
+import json
+import os
+import random
 import re
-from dataclasses import dataclass
+import threading
+import unicodedata
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".hashindex.json"
+
+# MinHash uses universal hashing modulo a Mersenne prime over 64-bit shingle hashes.
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
 
 
 @dataclass(slots=True)
@@ -32,47 +45,273 @@ def hash_title(title: str) -> str:
     return hashlib.sha1(normalize_title(title).encode("utf-8")).hexdigest()
 
 
-def load_themes(csv_path: Path) -> Tuple[List[ThemeRecord], Dict[str, List[str]]]:
-    """Load themes from CSV and return records plus duplicate mapping."""
+def index_path_for(csv_path: Path) -> Path:
+    """Location of the sidecar hash index kept next to a theme CSV."""
+    return csv_path.with_name(csv_path.name + INDEX_SUFFIX)
+
+
+def row_checksum(row: Dict[str, Optional[str]]) -> str:
+    """Checksum of a raw CSV row, used to reuse index entries for unchanged rows."""
+    digest = hashlib.blake2b(digest_size=16)
+    for key, value in row.items():
+        digest.update(f"{key}\x1f{value}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _build_record(row: Dict[str, Optional[str]]) -> ThemeRecord:
+    hints = [
+        (row.get(f"hint_{i:02d}") or "").strip()
+        for i in range(1, 16)
+        if row.get(f"hint_{i:02d}")
+    ]
+
+    theme_id = (row.get("theme_id") or "").strip()
+    if not theme_id:
+        raise ValueError("theme_id is required")
+
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise ValueError(f"title is required for theme_id={theme_id}")
+
+    return ThemeRecord(
+        theme_id=theme_id,
+        category=(row.get("category") or "").strip(),
+        title=title,
+        role_a_prompt=(row.get("role_A_prompt") or "").strip(),
+        role_b_prompt=(row.get("role_B_prompt") or "").strip(),
+        hints=hints,
+        normalized_hash=hash_title(title),
+    )
+
+
+def _read_index(index_path: Path) -> Optional[Dict[str, object]]:
+    try:
+        index = json.loads(index_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def _write_index(index_path: Path, index: Dict[str, object]) -> None:
+    """Write the sidecar atomically; a read-only theme directory just skips caching."""
+    tmp_path = index_path.with_name(index_path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _records_from_index(index: Dict[str, object]) -> List[ThemeRecord]:
+    return [ThemeRecord(**entry["record"]) for entry in index["rows"]]  # type: ignore[index]
+
+
+def load_themes(csv_path: Path, *, use_index: bool = True) -> Tuple[List[ThemeRecord], Dict[str, List[str]]]:
+    """
+    Load themes from CSV and return records plus duplicate mapping.
+
+    A sidecar index keyed by the file's SHA-256 lets unchanged files load
+    without parsing; edited files only normalize and hash the rows whose
+    checksum is not in the previous index.
+    """
+    raw = csv_path.read_bytes()
+    content_hash = hashlib.sha256(raw).hexdigest()
+    index_path = index_path_for(csv_path)
+    previous = _read_index(index_path) if use_index else None
+
+    if previous is not None and previous.get("content_hash") == content_hash:
+        return _records_from_index(previous), {h: list(ids) for h, ids in previous["duplicates"].items()}  # type: ignore[union-attr]
+
+    known: Dict[str, Dict[str, object]] = {}
+    if previous is not None:
+        known = {entry["checksum"]: entry["record"] for entry in previous["rows"]}  # type: ignore[index]
+
     records: List[ThemeRecord] = []
+    rows: List[Dict[str, object]] = []
     duplicates: Dict[str, List[str]] = {}
 
-    with csv_path.open("r", encoding="utf-8-sig", newline="") as fp:
-        reader = csv.DictReader(fp)
-        if reader.fieldnames is None:
-            raise ValueError("CSV header is missing")
+    reader = csv.DictReader(io.StringIO(raw.decode("utf-8-sig"), newline=""))
+    if reader.fieldnames is None:
+        raise ValueError("CSV header is missing")
 
-        for row in reader:
-            hints = [
-                (row.get(f"hint_{i:02d}") or "").strip()
-                for i in range(1, 16)
-                if row.get(f"hint_{i:02d}")
-            ]
-
-            theme_id = (row.get("theme_id") or "").strip()
-            if not theme_id:
-                raise ValueError("theme_id is required")
-
-            title = (row.get("title") or "").strip()
-            if not title:
-                raise ValueError(f"title is required for theme_id={theme_id}")
-
-            record = ThemeRecord(
-                theme_id=theme_id,
-                category=(row.get("category") or "").strip(),
-                title=title,
-                role_a_prompt=(row.get("role_A_prompt") or "").strip(),
-                role_b_prompt=(row.get("role_B_prompt") or "").strip(),
-                hints=hints,
-                normalized_hash=hash_title(title),
-            )
-            records.append(record)
-            duplicates.setdefault(record.normalized_hash, []).append(theme_id)
+    for row in reader:
+        checksum = row_checksum(row)
+        cached = known.get(checksum)
+        record = ThemeRecord(**cached) if cached is not None else _build_record(row)
+        records.append(record)
+        rows.append({"checksum": checksum, "record": asdict(record)})
+        duplicates.setdefault(record.normalized_hash, []).append(record.theme_id)
 
     duplicates = {h: ids for h, ids in duplicates.items() if len(ids) > 1}
+
+    if use_index:
+        _write_index(
+            index_path,
+            {
+                "version": INDEX_VERSION,
+                "content_hash": content_hash,
+                "rows": rows,
+                "duplicates": duplicates,
+            },
+        )
     return records, duplicates
 
 
+def iter_themes(csv_path: Path) -> Iterator[ThemeRecord]:
+    """
+    Yield records while the CSV is read row by row.
+
+    Memory stays flat regardless of library size; the sidecar index is not
+    consulted since it would have to be loaded whole.
+    """
+    with csv_path.open("r", encoding="utf-8-sig", newline="") as handle:
+        reader = csv.DictReader(handle)
+        if reader.fieldnames is None:
+            raise ValueError("CSV header is missing")
+        for row in reader:
+            yield _build_record(row)
+
+
+def title_shingles(title: str, ngram: int = 2) -> set[str]:
+    """
+    Character n-grams of a normalized title.
+
+    Titles are NFKC-folded and whitespace is dropped, since Japanese text has
+    no word boundaries; a title shorter than ``ngram`` becomes one shingle.
+    """
+    text = normalize_title(unicodedata.normalize("NFKC", title)).replace(" ", "")
+    if len(text) <= ngram:
+        return {text} if text else set()
+    return {text[i : i + ngram] for i in range(len(text) - ngram + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _collision_probability(similarity: float, bands: int, rows: int) -> float:
+    return 1 - (1 - similarity**rows) ** bands
+
+
+def lsh_params(num_perm: int, threshold: float, fn_weight: float = 0.8) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) minimizing the weighted false positive/negative area
+    around ``threshold``. False negatives are weighted higher because every
+    candidate pair is verified with exact Jaccard afterwards.
+    """
+    steps = 100
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        fp = sum(_collision_probability(threshold * i / steps, bands, rows) for i in range(steps)) * threshold / steps
+        fn = sum(
+            1 - _collision_probability(threshold + (1 - threshold) * i / steps, bands, rows) for i in range(steps)
+        ) * (1 - threshold) / steps
+        error = (1 - fn_weight) * fp + fn_weight * fn
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH banding index over title character n-grams.
+
+    Adding a title costs O(num_perm * shingles); only keys that share an LSH
+    bucket are compared, so clustering stays near-linear in library size.
+    """
+
+    def __init__(self, threshold: float = 0.6, num_perm: int = 128, ngram: int = 2, seed: int = 1) -> None:
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+        rng = random.Random(seed)
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+        self._shingles: Dict[str, set[str]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[str]] = {}
+
+    def signature(self, shingles: set[str]) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles
+        ]
+        if not hashes:
+            return [_MAX_HASH] * self.num_perm
+        return [min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes) for a, b in self._perms]
+
+    def add(self, key: str, title: str) -> None:
+        shingles = title_shingles(title, self.ngram)
+        self._shingles[key] = shingles
+        sig = self.signature(shingles)
+        for band in range(self.bands):
+            chunk = tuple(sig[band * self.rows : (band + 1) * self.rows])
+            self._buckets.setdefault((band, chunk), []).append(key)
+
+    def candidate_pairs(self) -> set[Tuple[str, str]]:
+        pairs: set[Tuple[str, str]] = set()
+        for keys in self._buckets.values():
+            if len(keys) < 2:
+                continue
+            for i, left in enumerate(keys):
+                for right in keys[i + 1 :]:
+                    pairs.add((left, right) if left < right else (right, left))
+        return pairs
+
+    def clusters(self) -> List[Dict[str, object]]:
+        """Group keys whose exact n-gram Jaccard similarity meets the threshold."""
+        parent: Dict[str, str] = {}
+
+        def find(key: str) -> str:
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        pairs: List[Tuple[str, str, float]] = []
+        for left, right in self.candidate_pairs():
+            similarity = jaccard(self._shingles[left], self._shingles[right])
+            if similarity >= self.threshold:
+                pairs.append((left, right, similarity))
+                parent[find(left)] = find(right)
+
+        groups: Dict[str, Dict[str, object]] = {}
+        for left, right, similarity in sorted(pairs):
+            group = groups.setdefault(find(left), {"theme_ids": set(), "pairs": []})
+            group["theme_ids"].update((left, right))  # type: ignore[union-attr]
+            group["pairs"].append({"a": left, "b": right, "similarity": round(similarity, 3)})  # type: ignore[union-attr]
+
+        return [
+            {"theme_ids": sorted(group["theme_ids"]), "pairs": group["pairs"]}  # type: ignore[arg-type]
+            for group in groups.values()
+        ]
+
+
+def find_near_duplicates(
+    records: Iterable[ThemeRecord],
+    threshold: float = 0.6,
+    num_perm: int = 128,
+    ngram: int = 2,
+) -> List[Dict[str, object]]:
+    """Cluster reworded variants of the same theme title."""
+    index = NearDuplicateIndex(threshold=threshold, num_perm=num_perm, ngram=ngram)
+    for record in records:
+        index.add(record.theme_id, record.title)
+    return index.clusters()
+
+
 def summarize_duplicates(duplicate_map: Dict[str, Iterable[str]]) -> List[Dict[str, Iterable[str]]]:
     """Transform duplicate mapping into serializable summary."""
     return [{"hash": h, "theme_ids": list(ids)} for h, ids in duplicate_map.items()]
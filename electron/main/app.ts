@@ -33,7 +33,7 @@ import {
     setConfig,
 } from './config/store';
 import { ZoomWatcher } from './watchers/zoomWatcher';
-import { PythonWorkerClient } from './python/client';
+import { PythonWorkerClient, PythonWorkerReady } from './python/client';
 import { registerThemeIpcHandlers } from './ipc/themes';
 
 let mainWindow: BrowserWindow | null = null;
@@ -148,6 +148,17 @@ const registerPythonListeners = (client: PythonWorkerClient): void => {
         sendToRenderer('python/log', `[worker:error] ${error.message}`);
     });
 
+    client.on('ready', (info: PythonWorkerReady) => {
+        sendToRenderer(
+            'python/log',
+            `[worker:ready] pid=${info.pid} startup=${info.startupMs}ms spawn-to-ready=${info.spawnToReadyMs}ms`,
+        );
+    });
+
+    client.on('restarted', ({ pid }: { pid?: number }) => {
+        sendToRenderer('python/log', `[worker:restarted] promoted standby pid=${pid ?? 'unknown'}`);
+    });
+
     client.on('exit', (code: number | null, signal: NodeJS.Signals | null) => {
         sendToRenderer('python/log', `[worker:exit] code=${code ?? 'null'} signal=${signal ?? 'null'}`);
     });
@@ -253,6 +264,8 @@ const bootstrap = async (): Promise<void> => {
     pythonClient = new PythonWorkerClient({
         pythonPath: pythonExecutable,
         scriptPath: pythonScript,
+        standby: getConfig<boolean>('python.standby') ?? false,
+        prewarm: getConfig<boolean>('python.prewarm') ?? false,
     });
 
     registerPythonListeners(pythonClient);
@@ -42,6 +42,8 @@ export interface AppConfigSchema {
   python: {
     executable: string;
     script: string;
+    standby: boolean;
+    prewarm: boolean;
   };
 }
 
@@ -104,6 +106,8 @@ export const configStore = new Store<AppConfigSchema>({
     python: {
       executable: process.platform === 'win32' ? 'python.exe' : 'python3',
       script: resolveDefaultWorkerScript(),
+      standby: false,
+      prewarm: false,
     },
   },
 });
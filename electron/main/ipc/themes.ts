@@ -47,7 +47,11 @@ interface HashIndexResult {
 }
 
 interface LoadRecordsResult {
-  items: ThemeRecord[];
+  streamed: true;
+  count: number;
+  total: number;
+  offset: number;
+  chunks: number;
 }
 
 interface ThemeCacheEntry {
@@ -198,9 +202,22 @@ export function registerThemeIpcHandlers(options: RegisterThemeIpcHandlersOption
   const cache = new ThemeCache(options.cacheStore);
 
   const loadFromWorker = async (): Promise<Omit<ThemeCacheEntry, 'csvPath' | 'mtimeMs' | 'cachedAt'>> => {
-    const [hashIndex, loadResult] = await Promise.all([
+    // Records arrive as bounded `themes/chunk` frames so no single stdout
+    // line has to hold the whole library.
+    const records: ThemeRecord[] = [];
+    const [hashIndex] = await Promise.all([
       options.workerClient.invoke<HashIndexResult>('themes/hash-index', { csv_path: options.csvPath }),
-      options.workerClient.invoke<LoadRecordsResult>('themes/load-records', { csv_path: options.csvPath }),
+      options.workerClient.invoke<LoadRecordsResult>(
+        'themes/load-records',
+        { csv_path: options.csvPath, stream: true },
+        {
+          onProgress: (progress, event) => {
+            if (event === 'themes/chunk') {
+              records.push(...(progress.items as ThemeRecord[]));
+            }
+          },
+        },
+      ),
     ]);
 
     const duplicates = hashIndex.duplicates.map((duplicate) => ({
@@ -209,7 +226,7 @@ export function registerThemeIpcHandlers(options: RegisterThemeIpcHandlersOption
     }));
 
     return {
-      records: loadResult.items,
+      records,
       duplicates,
       totalCount: hashIndex.count,
     };
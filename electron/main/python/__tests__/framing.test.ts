@@ -0,0 +1,64 @@
+import assert from 'node:assert/strict';
+import test from 'node:test';
+
+import { WorkerStreamDecoder, loadMsgpackDecoder } from '../framing';
+
+// Written by backend/zoom_duo/protocol.py encode_msgpack (see backend/tests/test_protocol.py).
+const RESPONSE_FRAME = Buffer.from(
+  '0000004983a26964a56a6f622d31a6737461747573a26f6ba6726573756c7483a56974656d739401cb4004000000000000' +
+    'c0c3a4626c6f62c4020001a6e5908de5898da9e38386e382b9e38388',
+  'hex',
+);
+const PROGRESS_FRAME = Buffer.from(
+  '0000002c83a56576656e74a870726f6772657373a26964a56a6f622d31a46461746182a4646f6e6503a5746f74616c0a',
+  'hex',
+);
+
+const RESPONSE = {
+  id: 'job-1',
+  status: 'ok',
+  result: { items: [1, 2.5, null, true], blob: new Uint8Array([0, 1]), 名前: 'テスト' },
+};
+const PROGRESS = { event: 'progress', id: 'job-1', data: { done: 3, total: 10 } };
+
+const collect = (): { decoder: WorkerStreamDecoder; messages: unknown[]; invalid: string[] } => {
+  const messages: unknown[] = [];
+  const invalid: string[] = [];
+  const decoder = new WorkerStreamDecoder(
+    (message) => messages.push(message),
+    (raw) => invalid.push(raw),
+  );
+  return { decoder, messages, invalid };
+};
+
+test('@msgpack/msgpack is installed', () => {
+  assert.ok(loadMsgpackDecoder());
+});
+
+test('decodes length-prefixed frames from the Python worker', () => {
+  const { decoder, messages, invalid } = collect();
+  decoder.setProtocol('msgpack');
+  decoder.push(Buffer.concat([RESPONSE_FRAME, PROGRESS_FRAME]));
+  assert.deepEqual(invalid, []);
+  assert.deepEqual(messages, [RESPONSE, PROGRESS]);
+});
+
+test('reassembles frames split across chunks', () => {
+  const { decoder, messages } = collect();
+  decoder.setProtocol('msgpack');
+  const stream = Buffer.concat([RESPONSE_FRAME, PROGRESS_FRAME]);
+  for (let i = 0; i < stream.length; i += 1) {
+    decoder.push(stream.subarray(i, i + 1));
+  }
+  assert.deepEqual(messages, [RESPONSE, PROGRESS]);
+});
+
+test('bytes buffered after the protocol switch are read as msgpack', () => {
+  const { decoder, messages } = collect();
+  const ack = Buffer.from('{"id":"n","status":"ok","result":{"protocol":"msgpack"}}\n');
+  decoder.push(Buffer.concat([ack, PROGRESS_FRAME.subarray(0, 10)]));
+  assert.equal(messages.length, 1);
+  decoder.setProtocol('msgpack');
+  decoder.push(PROGRESS_FRAME.subarray(10));
+  assert.deepEqual(messages[1], PROGRESS);
+});
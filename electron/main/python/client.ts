@@ -4,6 +4,8 @@ import { EventEmitter } from 'node:events';
 import * as readline from 'node:readline';
 import * as path from 'node:path';
 
+import { WorkerProtocol, WorkerStreamDecoder, loadMsgpackDecoder } from './framing';
+
 export interface PythonWorkerClientOptions {
   /** Path to the Python executable. Defaults to `python3`. */
   pythonPath?: string;
@@ -13,133 +15,376 @@ export interface PythonWorkerClientOptions {
   timeoutMs?: number;
   /** Additional environment variables to pass to the child process. */
   env?: NodeJS.ProcessEnv;
+  /**
+   * Keep a second, already-ready worker idle so a crashed worker is replaced
+   * without paying interpreter and import start-up again.
+   */
+  standby?: boolean;
+  /**
+   * Send `worker/prewarm` once a worker is ready: `true` imports the lazily
+   * loaded I/O handlers only; a list warms exactly those actions, and is the
+   * only way to start the CPU process pool ahead of time.
+   */
+  prewarm?: boolean | string[];
+  /**
+   * `auto` switches worker output to msgpack frames when both sides support
+   * it; `jsonl` keeps newline-delimited JSON.
+   */
+  protocol?: 'auto' | 'jsonl';
+}
+
+export interface PythonWorkerReady {
+  pid: number;
+  /** Time the worker spent from interpreter start to its dispatch loop. */
+  startupMs: number;
+  /** Wall time from spawn to the `ready` frame, as seen by Electron. */
+  spawnToReadyMs: number;
+  /** Output encodings the worker offered in its ready frame. */
+  protocols: WorkerProtocol[];
+}
+
+interface WorkerChannel {
+  decoder: WorkerStreamDecoder;
+  /** Id of the in-flight `worker/protocol` request, if any. */
+  negotiationId?: string;
+}
+
+export interface PythonWorkerProgress {
+  id: string;
+  action: string;
+  [key: string]: unknown;
+}
+
+export interface InvokeOptions {
+  /** Inactivity timeout; every progress frame for the request restarts it. */
+  timeoutMs?: number;
+  /** Called for each intermediate frame the handler yields. */
+  onProgress?: (progress: PythonWorkerProgress, event: string) => void;
+  /** Aborting sends a `cancel` action to the worker and rejects the call. */
+  signal?: AbortSignal;
+}
+
+export class PythonWorkerError extends Error {
+  constructor(
+    message: string,
+    readonly code?: string,
+  ) {
+    super(message);
+    this.name = 'PythonWorkerError';
+  }
 }
 
 interface PendingRequest<T> {
+  action: string;
   resolve: (value: T) => void;
   reject: (error: Error) => void;
   timeout?: NodeJS.Timeout;
+  timeoutMs: number;
+  onProgress?: InvokeOptions['onProgress'];
+  cleanup?: () => void;
 }
 
 export interface PythonWorkerResponse<T = unknown> {
   id?: string;
   action?: string;
-  status?: 'ok' | 'error';
+  status?: 'ok' | 'error' | 'ready';
   result?: T;
-  error?: { message: string };
+  error?: { message: string; code?: string };
   event?: string;
   data?: unknown;
 }
 
 export class PythonWorkerClient extends EventEmitter {
-  private readonly process: ChildProcessWithoutNullStreams;
+  private process: ChildProcessWithoutNullStreams;
+
+  private standby?: ChildProcessWithoutNullStreams;
+
+  private readonly readyInfo = new Map<ChildProcessWithoutNullStreams, PythonWorkerReady>();
+
+  private readonly channels = new Map<ChildProcessWithoutNullStreams, WorkerChannel>();
 
   private readonly pending = new Map<string, PendingRequest<unknown>>();
 
   private readonly defaultTimeoutMs: number;
 
+  private readonly options: PythonWorkerClientOptions;
+
   private disposed = false;
 
   constructor(options: PythonWorkerClientOptions = {}) {
     super();
 
-    const pythonPath = options.pythonPath ?? 'python3';
-    const scriptPath =
-      options.scriptPath ?? path.resolve(__dirname, '../../../backend/worker.py');
+    this.options = options;
     this.defaultTimeoutMs = options.timeoutMs ?? 60_000;
+    this.process = this.spawnWorker();
+  }
+
+  /** Resolves once the active worker has emitted its `ready` frame. */
+  ready(): Promise<PythonWorkerReady> {
+    const info = this.readyInfo.get(this.process);
+    if (info) {
+      return Promise.resolve(info);
+    }
+    return new Promise((resolve) => {
+      this.once('ready', resolve);
+    });
+  }
+
+  async invoke<T>(
+    action: string,
+    payload: unknown,
+    options?: number | InvokeOptions,
+  ): Promise<T> {
+    if (this.disposed) {
+      throw new Error('Python worker client has been disposed');
+    }
+
+    const { timeoutMs: timeoutOverride, onProgress, signal } =
+      typeof options === 'number' ? { timeoutMs: options } : (options ?? {});
+    if (signal?.aborted) {
+      throw new PythonWorkerError(`Python worker request aborted for action=${action}`, 'cancelled');
+    }
 
-    this.process = spawn(pythonPath, [scriptPath], {
+    const id = randomUUID();
+    const message = JSON.stringify({ id, action, payload });
+
+    const timeoutMs = timeoutOverride ?? this.defaultTimeoutMs;
+
+    return new Promise<T>((resolve, reject) => {
+      const pending: PendingRequest<unknown> = {
+        action,
+        resolve: (value) => resolve(value as T),
+        reject,
+        timeoutMs,
+        onProgress,
+      };
+      this.pending.set(id, pending);
+      this.armTimeout(id, pending);
+
+      if (signal) {
+        const onAbort = () => {
+          this.cancel(id);
+        };
+        signal.addEventListener('abort', onAbort, { once: true });
+        pending.cleanup = () => signal.removeEventListener('abort', onAbort);
+      }
+
+      this.process.stdin.write(`${message}\n`, (error) => {
+        if (error) {
+          this.settle(id)?.reject(error);
+        }
+      });
+    });
+  }
+
+  /**
+   * Cancels an in-flight request. The pending promise rejects immediately
+   * with code `cancelled`; the worker stops the job and frees its resources.
+   */
+  cancel(id: string): void {
+    const pending = this.settle(id);
+    if (!pending) {
+      return;
+    }
+    pending.reject(
+      new PythonWorkerError(`Python worker request cancelled for action=${pending.action}`, 'cancelled'),
+    );
+    this.sendCancel(id);
+  }
+
+  dispose(): void {
+    if (this.disposed) {
+      return;
+    }
+    this.disposed = true;
+
+    this.rejectAll(new Error('Python worker client disposed'));
+
+    for (const child of [this.process, this.standby]) {
+      child?.removeAllListeners();
+      child?.kill();
+    }
+    this.standby = undefined;
+  }
+
+  private spawnWorker(): ChildProcessWithoutNullStreams {
+    const pythonPath = this.options.pythonPath ?? 'python3';
+    const scriptPath =
+      this.options.scriptPath ?? path.resolve(__dirname, '../../../backend/worker.py');
+    const spawnedAt = Date.now();
+
+    const child = spawn(pythonPath, [scriptPath], {
       stdio: ['pipe', 'pipe', 'pipe'],
       env: {
         ...process.env,
-        ...options.env,
+        ...this.options.env,
       },
     });
 
-    this.process.on('error', (error) => {
+    child.on('error', (error) => {
+      if (child !== this.process) {
+        this.dropStandby(child);
+        return;
+      }
       this.emit('error', error);
       this.rejectAll(new Error(`Failed to spawn Python worker: ${error.message}`));
     });
 
-    this.process.on('exit', (code, signal) => {
+    child.on('exit', (code, signal) => {
+      const wasReady = this.readyInfo.delete(child);
+      this.channels.delete(child);
+      if (child !== this.process) {
+        this.dropStandby(child);
+        return;
+      }
       if (!this.disposed) {
         const reason = signal ? `signal ${signal}` : `exit code ${code}`;
         this.rejectAll(new Error(`Python worker exited unexpectedly (${reason})`));
+        // A worker that never got ready points at a broken environment; do not respawn in a loop.
+        if (wasReady) {
+          this.promoteStandby();
+        }
       }
       this.emit('exit', code, signal);
     });
 
-    const stdoutReader = readline.createInterface({
-      input: this.process.stdout,
-    });
-
-    stdoutReader.on('line', (line) => {
-      this.handleMessage(line);
-    });
+    const decoder = new WorkerStreamDecoder(
+      (message) => {
+        const parsed = message as PythonWorkerResponse;
+        if (this.handleNegotiation(child, parsed)) {
+          return;
+        }
+        if (child === this.process) {
+          this.handleMessage(parsed, child, spawnedAt);
+        } else {
+          this.handleStandbyMessage(parsed, child, spawnedAt);
+        }
+      },
+      (raw) => {
+        this.emit('stderr', `Invalid message from worker: ${raw}`);
+      },
+    );
+    this.channels.set(child, { decoder });
+    child.stdout.on('data', (chunk: Buffer) => decoder.push(chunk));
 
     const stderrReader = readline.createInterface({
-      input: this.process.stderr,
+      input: child.stderr,
     });
 
     stderrReader.on('line', (line) => {
-      this.emit('stderr', line);
+      this.emit('stderr', child === this.process ? line : `[standby] ${line}`);
     });
+
+    return child;
   }
 
-  async invoke<T>(action: string, payload: unknown, timeoutOverride?: number): Promise<T> {
-    if (this.disposed) {
-      throw new Error('Python worker client has been disposed');
+  private markReady(
+    child: ChildProcessWithoutNullStreams,
+    parsed: PythonWorkerResponse,
+    spawnedAt: number,
+  ): PythonWorkerReady {
+    const frame = parsed as PythonWorkerResponse & {
+      pid?: number;
+      startup_ms?: number;
+      protocols?: WorkerProtocol[];
+    };
+    const info: PythonWorkerReady = {
+      pid: frame.pid ?? child.pid ?? -1,
+      startupMs: frame.startup_ms ?? 0,
+      spawnToReadyMs: Date.now() - spawnedAt,
+      protocols: frame.protocols ?? ['jsonl'],
+    };
+    this.readyInfo.set(child, info);
+
+    // Negotiate before anything else is sent so every later response can use the binary framing.
+    const channel = this.channels.get(child);
+    if (
+      channel &&
+      this.options.protocol !== 'jsonl' &&
+      info.protocols.includes('msgpack') &&
+      loadMsgpackDecoder()
+    ) {
+      channel.negotiationId = randomUUID();
+      const request = { id: channel.negotiationId, action: 'worker/protocol', payload: { protocol: 'msgpack' } };
+      child.stdin.write(`${JSON.stringify(request)}\n`);
     }
 
-    const id = randomUUID();
-    const message = JSON.stringify({ id, action, payload });
+    const { prewarm } = this.options;
+    if (prewarm) {
+      const payload = Array.isArray(prewarm) ? { actions: prewarm } : {};
+      child.stdin.write(`${JSON.stringify({ id: randomUUID(), action: 'worker/prewarm', payload })}\n`);
+    }
+    return info;
+  }
 
-    const timeoutMs = timeoutOverride ?? this.defaultTimeoutMs;
+  private handleStandbyMessage(
+    parsed: PythonWorkerResponse,
+    child: ChildProcessWithoutNullStreams,
+    spawnedAt: number,
+  ): void {
+    if (parsed.status === 'ready' && !parsed.id) {
+      this.markReady(child, parsed, spawnedAt);
+      this.emit('standby-ready', this.readyInfo.get(child));
+    }
+  }
 
-    return new Promise<T>((resolve, reject) => {
-      const timeout = setTimeout(() => {
-        this.pending.delete(id);
-        reject(new Error(`Python worker request timed out for action=${action}`));
-      }, timeoutMs);
+  /**
+   * Handles the `worker/protocol` acknowledgement. It must switch the decoder
+   * synchronously: the bytes right after it are already in the new framing.
+   */
+  private handleNegotiation(child: ChildProcessWithoutNullStreams, parsed: PythonWorkerResponse): boolean {
+    const channel = this.channels.get(child);
+    if (!channel?.negotiationId || parsed.id !== channel.negotiationId) {
+      return false;
+    }
+    channel.negotiationId = undefined;
+    if (parsed.status === 'ok') {
+      const { protocol } = parsed.result as { protocol: WorkerProtocol };
+      channel.decoder.setProtocol(protocol);
+      this.emit('protocol', { pid: child.pid, protocol });
+    }
+    return true;
+  }
 
-      this.pending.set(id, {
-        resolve: (value) => resolve(value as T),
-        reject,
-        timeout,
-      });
+  private ensureStandby(): void {
+    if (this.options.standby && !this.standby && !this.disposed) {
+      this.standby = this.spawnWorker();
+    }
+  }
 
-      this.process.stdin.write(`${message}\n`, (error) => {
-        if (error) {
-          clearTimeout(timeout);
-          this.pending.delete(id);
-          reject(error);
-        }
-      });
-    });
+  private dropStandby(child: ChildProcessWithoutNullStreams): void {
+    if (child === this.standby) {
+      this.standby = undefined;
+      this.readyInfo.delete(child);
+    }
   }
 
-  dispose(): void {
-    if (this.disposed) {
+  private promoteStandby(): void {
+    const next = this.standby ?? (this.options.standby ? this.spawnWorker() : undefined);
+    if (!next) {
       return;
     }
-    this.disposed = true;
-
-    this.rejectAll(new Error('Python worker client disposed'));
-
-    this.process.removeAllListeners();
-    this.process.kill();
+    this.standby = undefined;
+    this.process = next;
+    this.emit('restarted', { pid: next.pid });
+
+    const info = this.readyInfo.get(next);
+    if (info) {
+      this.emit('ready', info);
+      this.ensureStandby();
+    }
   }
 
-  private handleMessage(rawLine: string): void {
-    let parsed: PythonWorkerResponse;
-    try {
-      parsed = JSON.parse(rawLine) as PythonWorkerResponse;
-    } catch (error) {
-      this.emit('stderr', `Invalid JSON from worker: ${rawLine}`);
+  private handleMessage(parsed: PythonWorkerResponse, child: ChildProcessWithoutNullStreams, spawnedAt: number): void {
+    if (parsed.status === 'ready' && !parsed.id) {
+      this.emit('ready', this.markReady(child, parsed, spawnedAt));
+      // The standby is spawned only after the active worker is up so both do not compete for CPU at launch.
+      this.ensureStandby();
       return;
     }
 
     if (parsed.event) {
+      this.handleProgress(parsed.event, parsed.data);
       this.emit(parsed.event, parsed.data);
       this.emit('event', { event: parsed.event, data: parsed.data });
       return;
@@ -150,27 +395,64 @@ export class PythonWorkerClient extends EventEmitter {
       return;
     }
 
-    const pending = this.pending.get(id);
+    const pending = this.settle(id);
     if (!pending) {
       return;
     }
 
-    clearTimeout(pending.timeout);
-    this.pending.delete(id);
-
     if (parsed.status === 'ok') {
       pending.resolve(parsed.result);
     } else {
       const errorMessage = parsed.error?.message ?? 'Unknown worker error';
-      pending.reject(new Error(errorMessage));
+      pending.reject(new PythonWorkerError(errorMessage, parsed.error?.code));
+    }
+  }
+
+  private handleProgress(event: string, data: unknown): void {
+    const progress = data as PythonWorkerProgress | undefined;
+    const pending = progress?.id ? this.pending.get(progress.id) : undefined;
+    if (!pending || !progress) {
+      return;
+    }
+    // Long jobs that keep reporting progress are alive; only silence times out.
+    this.armTimeout(progress.id, pending);
+    pending.onProgress?.(progress, event);
+  }
+
+  private armTimeout(id: string, pending: PendingRequest<unknown>): void {
+    clearTimeout(pending.timeout);
+    pending.timeout = setTimeout(() => {
+      if (!this.settle(id)) {
+        return;
+      }
+      pending.reject(
+        new PythonWorkerError(`Python worker request timed out for action=${pending.action}`, 'timeout'),
+      );
+      // Nobody is waiting for the result any more; stop the worker from finishing the job.
+      this.sendCancel(id);
+    }, pending.timeoutMs);
+  }
+
+  private sendCancel(id: string): void {
+    if (!this.disposed) {
+      this.process.stdin.write(`${JSON.stringify({ id: randomUUID(), action: 'cancel', payload: { id } })}\n`);
+    }
+  }
+
+  private settle(id: string): PendingRequest<unknown> | undefined {
+    const pending = this.pending.get(id);
+    if (!pending) {
+      return undefined;
     }
+    clearTimeout(pending.timeout);
+    pending.cleanup?.();
+    this.pending.delete(id);
+    return pending;
   }
 
   private rejectAll(error: Error): void {
-    for (const [id, pending] of this.pending.entries()) {
-      clearTimeout(pending.timeout);
-      pending.reject(error);
-      this.pending.delete(id);
+    for (const id of [...this.pending.keys()]) {
+      this.settle(id)?.reject(error);
     }
   }
 }
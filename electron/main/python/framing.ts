@@ -0,0 +1,118 @@
+export type WorkerProtocol = 'jsonl' | 'msgpack';
+
+type MsgpackDecode = (data: Uint8Array) => unknown;
+
+let msgpackDecode: MsgpackDecode | null | undefined;
+
+/**
+ * `@msgpack/msgpack` is optional: without it the client never offers binary
+ * framing and the worker keeps speaking JSON lines.
+ */
+export const loadMsgpackDecoder = (): MsgpackDecode | null => {
+  if (msgpackDecode === undefined) {
+    try {
+      // eslint-disable-next-line @typescript-eslint/no-var-requires
+      msgpackDecode = (require('@msgpack/msgpack') as { decode: MsgpackDecode }).decode;
+    } catch {
+      msgpackDecode = null;
+    }
+  }
+  return msgpackDecode;
+};
+
+const FRAME_HEADER_BYTES = 4;
+
+/**
+ * Splits worker stdout into messages. Starts in JSON-lines mode; after the
+ * protocol acknowledgement the caller switches to length-prefixed msgpack
+ * frames and any bytes already buffered are re-read in the new mode.
+ */
+export class WorkerStreamDecoder {
+  private mode: WorkerProtocol = 'jsonl';
+
+  private chunks: Buffer[] = [];
+
+  private buffered = 0;
+
+  /** Bytes required before the next message can be decoded. */
+  private needed = 1;
+
+  constructor(
+    private readonly onMessage: (message: unknown) => void,
+    private readonly onInvalid: (raw: string) => void,
+  ) {}
+
+  get protocol(): WorkerProtocol {
+    return this.mode;
+  }
+
+  setProtocol(protocol: WorkerProtocol): void {
+    this.mode = protocol;
+    this.needed = protocol === 'msgpack' ? FRAME_HEADER_BYTES : 1;
+  }
+
+  push(chunk: Buffer): void {
+    this.chunks.push(chunk);
+    this.buffered += chunk.length;
+    // Large frames arrive in many chunks; only concatenate once the whole frame is here.
+    if (this.buffered < this.needed) {
+      return;
+    }
+
+    let buffer = this.chunks.length === 1 ? this.chunks[0] : Buffer.concat(this.chunks, this.buffered);
+    let offset = 0;
+
+    for (;;) {
+      if (this.mode === 'jsonl') {
+        const newline = buffer.indexOf(0x0a, offset);
+        if (newline === -1) {
+          this.needed = buffer.length - offset + 1;
+          break;
+        }
+        const line = buffer.toString('utf8', offset, newline).trim();
+        offset = newline + 1;
+        if (!line) {
+          continue;
+        }
+        let parsed: unknown;
+        try {
+          parsed = JSON.parse(line);
+        } catch {
+          this.onInvalid(line);
+          continue;
+        }
+        this.onMessage(parsed);
+      } else {
+        const available = buffer.length - offset;
+        if (available < FRAME_HEADER_BYTES) {
+          this.needed = FRAME_HEADER_BYTES;
+          break;
+        }
+        const length = buffer.readUInt32BE(offset);
+        if (available < FRAME_HEADER_BYTES + length) {
+          this.needed = FRAME_HEADER_BYTES + length;
+          break;
+        }
+        const body = buffer.subarray(offset + FRAME_HEADER_BYTES, offset + FRAME_HEADER_BYTES + length);
+        offset += FRAME_HEADER_BYTES + length;
+        const decode = loadMsgpackDecoder();
+        if (!decode) {
+          this.onInvalid('msgpack frame received without @msgpack/msgpack installed');
+          continue;
+        }
+        let parsed: unknown;
+        try {
+          parsed = decode(body);
+        } catch {
+          this.onInvalid(`undecodable msgpack frame (${length} bytes)`);
+          continue;
+        }
+        this.onMessage(parsed);
+      }
+    }
+
+    buffer = buffer.subarray(offset);
+    this.chunks = buffer.length ? [buffer] : [];
+    this.buffered = buffer.length;
+  }
+}
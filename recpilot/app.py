@@ -1,29 +1,51 @@
 from __future__ import annotations
 
-import base64
 import csv
+import gzip
+import hashlib
 import io
 import json
 import logging
 import os
+import queue
 import re
+import secrets
 import shutil
+import sqlite3
 import threading
+import time
+import unicodedata
+import zipfile
+from collections import OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
 from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, abort, jsonify, render_template, request, send_file, stream_with_context
 from flask_socketio import SocketIO, emit, join_room
 
 try:
     from watchdog.events import FileSystemEventHandler  # type: ignore
     from watchdog.observers import Observer  # type: ignore
+
+    WATCHDOG_AVAILABLE = True
 except ImportError:  # pragma: no cover - optional in cloud
     FileSystemEventHandler = None  # type: ignore
     Observer = None  # type: ignore
+    WATCHDOG_AVAILABLE = False
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover - optional, gzip is always available
+    brotli = None  # type: ignore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore
 
 load_dotenv()
 
@@ -58,6 +80,22 @@ try:  # Prefer eventlet if available (Render/Gunicorn), fallback to threading lo
 except Exception:  # pragma: no cover - optional dependency
     ASYNC_MODE = "threading"
 
+if ASYNC_MODE == "eventlet":
+    # monkey_patch 後の threading は green スレッドで、CPU やディスクを使う処理はハブごと止める。
+    # 重い処理は元の threading の OS スレッドで動かし、ハブとその OS スレッドの両方が取るロックにも
+    # 元の Lock を使う（green な Lock を OS スレッドと取り合うと、起こす側のハブが違って固まる）
+    from eventlet import patcher, tpool  # type: ignore
+
+    native_threading = patcher.original("threading")
+    native_queue = patcher.original("queue")
+    wait_native = tpool.execute
+else:
+    native_threading = threading
+    native_queue = queue
+
+    def wait_native(func: Callable[[], object]) -> object:
+        return func()
+
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 logger = logging.getLogger(__name__)
 
@@ -78,8 +116,17 @@ CONFIG: Dict[str, object] = load_config()
 
 TALK_THEMES_CSV = DATA_DIR / "talk_themes.csv"
 REPORT_CSV = DATA_DIR / "report.csv"
+REPORT_DB = DATA_DIR / "report.sqlite3"
+# off / normal / full: SQLite の synchronous 設定。full はコミットごとに fsync する
+REPORT_FSYNC = os.environ.get("RECPILOT_REPORT_FSYNC", "full").strip().lower()
+REPORT_COMMIT_WINDOW_MS = float(os.environ.get("RECPILOT_REPORT_COMMIT_WINDOW_MS", "5"))
+REPORT_MAX_BATCH = int(os.environ.get("RECPILOT_REPORT_MAX_BATCH", "256"))
 EXPORTS_DIR = DATA_DIR / "exports"
 EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+EXPORT_WORKERS = int(os.environ.get("RECPILOT_EXPORT_WORKERS", "2"))
+EXPORT_MAX_PENDING = int(os.environ.get("RECPILOT_EXPORT_MAX_PENDING", "32"))
+EXPORT_RETENTION_SEC = float(os.environ.get("RECPILOT_EXPORT_RETENTION_SEC", "3600"))
+EXPORT_CACHE_MB = float(os.environ.get("RECPILOT_EXPORT_CACHE_MB", "256"))
 
 DEFAULT_DURATION_SEC = 60 * 60  # 1 hour
 
@@ -142,12 +189,17 @@ def _apply_basic_auth():
         return auth_response
 
 
-def load_talk_themes() -> List[Dict[str, str]]:
-    if not TALK_THEMES_CSV.exists():
+def load_talk_themes() -> List[Dict[str, object]]:
+    """キャッシュ済みのテーマ一覧を返す。共有スナップショットなので呼び出し側で変更しないこと。"""
+    return theme_cache.get().themes
+
+
+def parse_talk_themes_csv(csv_path: Path) -> List[Dict[str, object]]:
+    if not csv_path.exists():
         return []
 
-    themes: List[Dict[str, str]] = []
-    with TALK_THEMES_CSV.open("r", encoding="utf-8-sig", newline="") as csvfile:
+    themes: List[Dict[str, object]] = []
+    with csv_path.open("r", encoding="utf-8-sig", newline="") as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             themes.append(
@@ -266,6 +318,10 @@ def sanitize_component(value: str) -> str:
     return cleaned or "NA"
 
 
+# テイク CSV の列構成・書式の版。generate_session_csv の出力を変えたら上げる（古いキャッシュは使われなくなる）
+SESSION_CSV_FORMAT = 1
+
+
 def generate_session_csv(
     group_id: str,
     session_label: str,
@@ -277,8 +333,15 @@ def generate_session_csv(
     offset_source: str,
     start_time_str: str,
     recording_time_str: str,
+    report_rows: Optional[List[Dict[str, object]]] = None,
+    include_summary: bool = True,
 ) -> tuple[bytes, int]:
-    report_rows = filter_report_rows(group_id, session_label, take_label)
+    """
+    report_rows を渡した場合はそれを使い、省略時はストアからテイクの行を読む。
+    include_summary=False なら先頭の Session Summary 行を省く（差分エクスポート用）。
+    """
+    if report_rows is None:
+        report_rows = filter_report_rows(group_id, session_label, take_label)
 
     participants_str = ", ".join([str(p).strip() for p in participants if str(p).strip()])
     offset_str = f"{offset_seconds:+.3f}" if offset_seconds else "0.000"
@@ -305,26 +368,27 @@ def generate_session_csv(
     writer = csv.writer(buffer, lineterminator="\r\n")
     writer.writerow(headers)
 
-    summary_text = build_summary_comment(summary, offset_seconds, offset_source)
-    writer.writerow(
-        [
-            "Session Summary",
-            summary_text,
-            start_time_str,
-            "",
-            "",
-            "SUMMARY",
-            datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
-            director,
-            participants_str,
-            take_label,
-            group_id,
-            session_label,
-            start_time_str,
-            recording_time_str,
-            offset_str,
-        ]
-    )
+    if include_summary:
+        summary_text = build_summary_comment(summary, offset_seconds, offset_source)
+        writer.writerow(
+            [
+                "Session Summary",
+                summary_text,
+                start_time_str,
+                "",
+                "",
+                "SUMMARY",
+                datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"),
+                director,
+                participants_str,
+                take_label,
+                group_id,
+                session_label,
+                start_time_str,
+                recording_time_str,
+                offset_str,
+            ]
+        )
 
     for row in report_rows:
         marker = (row.get("カテゴリ") or "Marker").strip() or "Marker"
@@ -360,6 +424,69 @@ def generate_session_csv(
     return csv_content.encode("utf-8-sig"), len(report_rows)
 
 
+def export_session_csv(
+    target: Path,
+    group_id: str,
+    session_label: str,
+    take_label: str,
+    summary: str,
+    director: str,
+    participants: List[str],
+    offset_seconds: float,
+    offset_source: str,
+    start_time_str: str,
+    recording_time_str: str,
+    *,
+    version: Optional[Tuple[int, int]] = None,
+    load_rows: Optional[Callable[[], List[Dict[str, object]]]] = None,
+) -> Tuple[int, bool]:
+    """
+    テイクの CSV を target に書き出し、(行数, キャッシュから返したか) を返す。
+    マーカー集合の版と入力が前回と同じなら、生成も書き込みもせずキャッシュ済みの内容を置く。
+    Session Summary 行の Created At は生成時刻なのでキーに含めない。キャッシュから返した CSV では
+    最初に生成したときの時刻のままになる。
+    """
+    # 版は行を読む前に取る。間に追記があってもキャッシュの中身は版より新しくなるだけで、古くはならない
+    if version is None:
+        version = report_store.version(group_id, session_label, take_label)
+    key = ExportCache.key_for(
+        {
+            "kind": "session",
+            "format": SESSION_CSV_FORMAT,
+            "group": group_id,
+            "session": session_label,
+            "take": take_label,
+            "version": list(version),
+            "summary": summary,
+            "director": director,
+            "participants": [str(p) for p in participants],
+            "offsetSeconds": offset_seconds,
+            "offsetSource": offset_source,
+            "recpilotStart": start_time_str,
+            "zoomRecording": recording_time_str,
+        }
+    )
+    if export_cache.materialize(key, target):
+        return version[0], True
+
+    csv_bytes, rows_count = generate_session_csv(
+        group_id,
+        session_label,
+        take_label,
+        summary,
+        director,
+        participants,
+        offset_seconds,
+        offset_source,
+        start_time_str,
+        recording_time_str,
+        report_rows=load_rows() if load_rows is not None else None,
+    )
+    export_cache.put(key, csv_bytes)
+    write_bytes_atomic(target, csv_bytes)
+    return rows_count, False
+
+
 def infer_zoom_sessions(saved_files: List[Tuple[Path, Path]]) -> List[Dict[str, object]]:
     sessions: Dict[str, Dict[str, object]] = {}
     for rel_path, dest_path in saved_files:
@@ -592,295 +719,1537 @@ class ZoomRecordingMonitor:
         self._observer = None
 
 
-session_manager = SessionOffsetManager()
-zoom_monitor = ZoomRecordingMonitor(CONFIG.get("zoom_recording_dir"), session_manager)
-try:
-    zoom_monitor.start()
-except Exception as exc:  # pragma: no cover - defensive startup guard
-    logger.warning("Failed to start Zoom recording monitor: %s", exc)
+class PreparedPayload:
+    """一度だけシリアライズ・圧縮しておく JSON レスポンス本体と、その強い ETag。"""
 
+    def __init__(self, body: bytes) -> None:
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = digest
+        self.variants: Dict[str, Tuple[bytes, str]] = {
+            "identity": (body, digest),
+            "gzip": (gzip.compress(body, compresslevel=9, mtime=0), f"{digest}-gzip"),
+        }
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, quality=11), f"{digest}-br")
 
-def ensure_report_headers() -> None:
-    headers = ["日時", "組番号", "セッション", "テイク", "タイムコード", "内容", "カテゴリ"]
-    if not REPORT_CSV.exists():
-        with REPORT_CSV.open("w", encoding="utf-8", newline="") as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(headers)
-        return
+    @classmethod
+    def from_json(cls, payload: object) -> "PreparedPayload":
+        return cls(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
 
-    # ヘッダーが古い場合（テイク列なし）は追記前にアップグレードする
-    with REPORT_CSV.open("r", encoding="utf-8", newline="") as csvfile:
-        reader = csv.reader(csvfile)
-        existing_headers = next(reader, [])
-        if "テイク" in existing_headers:
-            return
-        rows = list(reader)
 
-    # 既存データを保持したままヘッダーを更新
-    upgraded_rows = []
-    for row in rows:
-        if len(row) >= 6:
-            upgraded_rows.append([row[0], row[1], row[2], "", row[3], row[4], row[5]])
-        else:
-            upgraded_rows.append((row + [""] * (7 - len(row)))[:7])
+def send_prepared_payload(prepared: PreparedPayload) -> Response:
+    """Accept-Encoding に合う事前圧縮済みの本体を返す。If-None-Match が一致すれば 304。"""
+    encoding = "identity"
+    for candidate in ("br", "gzip"):
+        if candidate in prepared.variants and request.accept_encodings[candidate] > 0:
+            encoding = candidate
+            break
+    body, etag = prepared.variants[encoding]
 
-    with REPORT_CSV.open("w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(headers)
-        writer.writerows(upgraded_rows)
+    if any(request.if_none_match.contains_weak(tag) for _, tag in prepared.variants.values()):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="application/json")
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
 
 
-def load_report_rows() -> List[Dict[str, str]]:
-    ensure_report_headers()
-    rows: List[Dict[str, str]] = []
-    if not REPORT_CSV.exists():
-        return rows
-    with REPORT_CSV.open("r", encoding="utf-8", newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            rows.append(row)
-    return rows
+# 既に圧縮済みのメディアは deflate しても縮まないので格納のみにする
+STORED_SUFFIXES = {".mp4", ".m4a", ".mp3", ".aac", ".wav", ".mov", ".zip", ".png", ".jpg", ".jpeg", ".pdf"}
+ZIP_STREAM_CHUNK_BYTES = 1024 * 1024
 
 
-def update_report_entry(group_id: str, session_label: str, take_label: str, timecode: str, *, content: Optional[str] = None, category: Optional[str] = None) -> Optional[Dict[str, str]]:
+class _ZipStreamSink(io.RawIOBase):
+    """ZipFile の書き込み先。シークできないので ZipFile はデータディスクリプタ付きで書き出す。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip_directory(root: Path, chunk_size: int = ZIP_STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    """root 以下のファイルを zip にしながら少しずつ返す。一時ファイルも全体のバッファも持たない。"""
+    sink = _ZipStreamSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for path in sorted(item for item in root.rglob("*") if item.is_file()):
+            info = zipfile.ZipInfo.from_file(path, path.relative_to(root).as_posix())
+            info.compress_type = zipfile.ZIP_STORED if path.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            with path.open("rb") as source, archive.open(info, "w", force_zip64=True) as target:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+
+class ExportJob:
     """
-    指定された行を上書きする（group/session/take/timecode で最初に一致する1行）。
-    content/category のいずれかを更新し、その他の列は保持する。
-    見つからなければ None を返す。
+    バックグラウンドで実行するエクスポート1件。結果ファイル（またはディレクトリ）を artifact として持つ。
+    成果物はジョブ専用の workdir に書くので、同じテイクを同時にエクスポートしても互いに上書きしない。
     """
-    ensure_report_headers()
-    updated_row_dict: Optional[Dict[str, str]] = None
-    rows: List[List[str]] = []
-    updated = False
-
-    if REPORT_CSV.exists():
-        with REPORT_CSV.open("r", encoding="utf-8", newline="") as csvfile:
-            reader = csv.reader(csvfile)
-            header = next(reader, [])
-            for row in reader:
-                if len(row) < 7:
-                    rows.append(row)
-                    continue
-                match = (
-                    row[1].strip() == group_id
-                    and row[2].strip() == session_label
-                    and row[3].strip() == take_label
-                    and normalize_timecode(row[4]) == normalize_timecode(timecode)
-                )
-                if match and not updated:
-                    current = {
-                        "日時": row[0],
-                        "組番号": row[1],
-                        "セッション": row[2],
-                        "テイク": row[3],
-                        "タイムコード": row[4],
-                        "内容": row[5],
-                        "カテゴリ": row[6],
-                    }
-                    if content is not None:
-                        row[5] = content
-                    if category is not None:
-                        row[6] = category
-                    updated_row_dict = {
-                        "timestamp": row[0],
-                        "groupId": row[1],
-                        "session": row[2],
-                        "take": row[3],
-                        "timecode": row[4],
-                        "content": row[5],
-                        "category": row[6],
-                    }
-                    updated = True
-                rows.append(row)
 
-    if not updated:
-        return None
-
-    with REPORT_CSV.open("w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["日時", "組番号", "セッション", "テイク", "タイムコード", "内容", "カテゴリ"])
-        writer.writerows(rows)
+    PROGRESS_INTERVAL_SEC = 0.25
+
+    def __init__(
+        self,
+        kind: str,
+        room_id: Optional[str],
+        run: Callable[["ExportJob"], Dict[str, object]],
+        notify: Callable[["ExportJob"], None],
+        root: Path,
+    ) -> None:
+        self.id = secrets.token_urlsafe(16)
+        self.workdir = root / self.id
+        self.kind = kind
+        self.room_id = room_id
+        self.status = "queued"
+        self.done = 0
+        self.total = 0
+        self.result: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.artifact: Optional[Tuple[Path, str]] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._on_downloaded: Optional[Callable[[], None]] = None
+        self.downloads = 0  # 送信中のダウンロード数。0 でない間は期限切れでも workdir を消さない
+        self._run = run
+        self._notify = notify
+        self._last_progress = 0.0
+
+    def progress(self, done: int, total: int) -> None:
+        """進捗を更新する。通知は間引き、最後の1件だけは必ず送る。"""
+        self.done, self.total = done, total
+        now = time.monotonic()
+        if done >= total or now - self._last_progress >= self.PROGRESS_INTERVAL_SEC:
+            self._last_progress = now
+            self._notify(self)
+
+    def output_path(self, name: str) -> Path:
+        """workdir 内のパスを返す。workdir はここで作る。"""
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        return self.workdir / name
+
+    def attach(self, path: Path, download_name: str, *, on_downloaded: Optional[Callable[[], None]] = None) -> None:
+        """成果物を登録する。on_downloaded は最初に最後まで送り切ったダウンロードの後で1回だけ呼ばれる。"""
+        self.artifact = (path, download_name)
+        self._on_downloaded = on_downloaded
+
+    @property
+    def awaits_download(self) -> bool:
+        return self._on_downloaded is not None
+
+    def downloaded(self) -> None:
+        callback, self._on_downloaded = self._on_downloaded, None
+        if callback is not None:
+            callback()
+
+    def discard(self) -> None:
+        """保持期間を過ぎたジョブの成果物を workdir ごと消す。"""
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def execute(self) -> None:
+        self.status = "running"
+        self._notify(self)
+        try:
+            self.result = self._run(self)
+            self.status = "done"
+        except Exception as exc:  # noqa: BLE001 - ジョブの失敗としてクライアントへ返す
+            # ログは通知と一緒にハブ側で出す（logging のロックも green なので OS スレッドから取らない）
+            self.exception = exc
+            self.error = str(exc) or exc.__class__.__name__
+            self.status = "failed"
+        self.finished_at = time.time()
+        self._notify(self)
+
+    def snapshot(self) -> Dict[str, object]:
+        payload: Dict[str, object] = {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "statusUrl": f"/api/export-jobs/{self.id}",
+            "createdAt": datetime.fromtimestamp(self.created_at, timezone.utc).isoformat(),
+        }
+        if self.finished_at is not None:
+            payload["finishedAt"] = datetime.fromtimestamp(self.finished_at, timezone.utc).isoformat()
+        if self.status == "done":
+            payload["result"] = self.result
+            if self.artifact is not None:
+                payload["downloadUrl"] = f"/api/export-jobs/{self.id}/download"
+        if self.error:
+            payload["error"] = self.error
+        return payload
+
+
+class ExportJobManager:
+    """
+    上限付きのワーカースレッドでエクスポートを実行する。待ち行列が一杯なら受け付けない。
+    完了したジョブは retention_seconds の間だけ保持し、その後は状態と成果物（root/<jobId>）を消す。
+    ワーカーは OS スレッドなので、eventlet 下でも CSV 生成やファイル書き込みの間ハブは止まらない。
+    socketio.emit は OS スレッドから呼べないため、状態通知はキューに積み、ハブ側の relay が送る。
+    ジョブの状態と通知先の接続はこのプロセスにしか無いので、root を使えるのは1プロセスだけ。
+    2つ目のプロセスは起動時に RuntimeError で止める（gunicorn は -w 1 で動かす）。
+    """
 
-    return updated_row_dict
+    def __init__(
+        self,
+        notify: Callable[[ExportJob, Dict[str, object]], None],
+        root: Path,
+        *,
+        workers: int = 2,
+        max_pending: int = 32,
+        retention_seconds: float = 3600.0,
+        max_finished: int = 200,
+    ) -> None:
+        self._notify = notify
+        self.root = root
+        self.retention_seconds = retention_seconds
+        self.max_finished = max(1, max_finished)
+        self._claim_root()
+        self._sweep_stale()
+        self._queue: "queue.Queue[ExportJob]" = native_queue.Queue(maxsize=max(1, max_pending))
+        self._notices: "queue.SimpleQueue[Tuple[ExportJob, Dict[str, object]]]" = native_queue.SimpleQueue()
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._workers = [
+            native_threading.Thread(target=self._worker_loop, name=f"export-worker-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._relay = threading.Thread(target=self._relay_loop, name="export-notify", daemon=True)
+        self._relay.start()
+
+    def submit(self, kind: str, room_id: Optional[str], run: Callable[[ExportJob], Dict[str, object]]) -> Optional[ExportJob]:
+        """ジョブを登録して待ち行列に入れる。混雑していれば None。"""
+        self._expire()
+        job = ExportJob(kind, room_id, run, self._post, self.root)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            return None
+        self._post(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        self._expire()
+        with self._lock:
+            return self._jobs.get(job_id)
 
+    def lease(self, job_id: str) -> Optional[ExportJob]:
+        """ダウンロードの間ジョブを押さえる。release するまで workdir は期限切れでも消えない。"""
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.downloads += 1
+            return job
 
-def filter_report_rows(group_id: str, session_label: str, take_label: Optional[str] = None) -> List[Dict[str, str]]:
-    """
-    収録の絞り込み: グループ/セッションで絞り、テイク列が存在する場合はテイクも一致させる。
-    既存データにテイク列がない場合は従来通り全件を返す。
-    """
-    take_label = (take_label or "").strip()
-    rows = [
-        row
-        for row in load_report_rows()
-        if row.get("組番号", "").strip() == group_id and row.get("セッション", "").strip() == session_label
-    ]
-    has_take_column = any("テイク" in row.keys() for row in rows)
-    if has_take_column and take_label:
-        rows = [row for row in rows if (row.get("テイク") or "").strip() == take_label]
-    return rows
+    def release(self, job: ExportJob) -> None:
+        with self._lock:
+            job.downloads -= 1
 
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.execute()
 
-def normalize_timecode(value: str) -> str:
-    if not value:
-        return "00:00:00"
-    value = value.strip()
-    parts = value.split(":")
-    if len(parts) == 3 and all(part.isdigit() for part in parts):
-        return f"{parts[0].zfill(2)}:{parts[1].zfill(2)}:{parts[2].zfill(2)}"
-    try:
-        total_seconds = int(float(value))
-    except (ValueError, TypeError):
-        return "00:00:00"
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    def _post(self, job: ExportJob) -> None:
+        # 状態は積んだ時点のものを送る。relay が取り出すころにはジョブが先へ進んでいることがある
+        self._notices.put((job, job.snapshot()))
 
+    def _relay_loop(self) -> None:
+        while True:
+            try:
+                # eventlet 下では tpool のスレッドで待つ。終了時に tpool が join できるよう待ちは区切る
+                job, payload = wait_native(lambda: self._notices.get(timeout=1.0))
+            except native_queue.Empty:
+                continue
+            exc, job.exception = job.exception, None
+            if exc is not None:
+                logger.error("Export job %s (%s) failed", job.id, job.kind, exc_info=exc)
+            try:
+                self._notify(job, payload)
+            except Exception:  # noqa: BLE001 - 状態 API では引けるので relay は止めない
+                logger.exception("Failed to send export job %s", job.id)
 
-@app.route("/")
-def index():
-    return render_template("landing.html", current_year=datetime.now().year)
+    def _expire(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        expired: List[ExportJob] = []
+        with self._lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.finished_at is not None),
+                key=lambda job: job.finished_at or 0.0,
+            )
+            overflow = len(finished) - self.max_finished
+            for index, job in enumerate(finished):
+                if job.downloads:
+                    continue  # 送信中。release の後の _expire で消す
+                if index < overflow or (job.finished_at or 0.0) < cutoff:
+                    del self._jobs[job.id]
+                    expired.append(job)
+        for job in expired:
+            job.discard()
+
+    def _claim_root(self) -> None:
+        """root の隣のロックファイルを排他で取り、プロセスが終わるまで持ち続ける。"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            return
+        self._owner = (self.root.parent / f"{self.root.name}.lock").open("a")
+        try:
+            fcntl.flock(self._owner.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._owner.close()
+            raise RuntimeError(
+                f"Export jobs in {self.root} are owned by another process. "
+                "Export job state lives in one process; run a single worker (gunicorn -w 1)."
+            ) from None
+
+    def _sweep_stale(self) -> None:
+        """前回の起動で作られ、保持期間を過ぎた workdir を消す（そのジョブの状態はもう残っていない）。"""
+        cutoff = time.time() - self.retention_seconds
+        for entry in self.root.iterdir():
+            try:
+                stale = entry.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if stale:
+                shutil.rmtree(entry, ignore_errors=True)
 
 
-@app.route("/control")
-def control():
-    themes = load_talk_themes()
-    return render_template(
-        "control.html",
-        duration_seconds=DEFAULT_DURATION_SEC,
-        canned_prompts=CANNED_PROMPTS,
-        total_themes=len(themes),
-        categories=CATEGORY_OPTIONS,
-    )
+def send_zip_stream(root: Path, archive_name: str) -> Response:
+    """chunked transfer で zip を組み立てながら送る。サイズは事前に分からないので Content-Length は付けない。"""
+    resp = Response(stream_with_context(iter_zip_directory(root)), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(archive_name)}"
+    resp.headers["Cache-Control"] = "no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 
-@app.route("/prompt")
-def prompt():
-    return render_template("prompt.html")
+def _temp_sibling(target: Path) -> Path:
+    return target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
 
 
-@app.route("/api/session/start", methods=["POST"])
-def api_session_start():
-    data = request.get_json(silent=True) or {}
-    start_ts = data.get("startTimestamp")
-    group_id = (data.get("groupId") or "").strip()
-    session_label = (data.get("session") or "").strip()
-    if not group_id or not session_label:
-        return jsonify({"error": "groupId and session are required"}), 400
-    if start_ts is None:
-        return jsonify({"error": "startTimestamp is required"}), 400
+def write_bytes_atomic(target: Path, data: bytes) -> None:
+    """一時ファイルに書いてから置き換える。読み手が書きかけのファイルを見ることはない。"""
+    tmp_path = _temp_sibling(target)
     try:
-        start_time = datetime.fromtimestamp(float(start_ts) / 1000.0)
-    except (TypeError, ValueError):
-        return jsonify({"error": "invalid startTimestamp"}), 400
-    session_manager.start_session(group_id, session_label, start_time)
-    return jsonify({"success": True, "status": session_manager.get_status()})
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
 
-@app.route("/api/session/status", methods=["GET"])
-def api_session_status():
-    status = session_manager.get_status()
-    status["monitoringPath"] = CONFIG.get("zoom_recording_dir")
-    return jsonify(status)
+class ExportCache:
+    """
+    生成済みエクスポートの内容アドレス型キャッシュ。キーは入力一式とマーカー集合の版のハッシュ。
+    ディスク上の合計が max_bytes を超えたら、最も長く使われていないものから消す。
+    """
 
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max(0, max_bytes)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = native_threading.Lock()  # エクスポートの OS スレッドとハブの両方から取る
+        if self.max_bytes:
+            directory.mkdir(parents=True, exist_ok=True)
+            # 再起動後も残っているエントリは最終利用時刻（mtime）順に引き継ぐ
+            existing = sorted(
+                (entry.stat().st_mtime, entry.name[: -len(".bin")], entry.stat().st_size)
+                for entry in directory.glob("*.bin")
+            )
+            for _, key, size in existing:
+                self._entries[key] = size
+                self._total += size
+
+    @staticmethod
+    def key_for(payload: Dict[str, object]) -> str:
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def materialize(self, key: str, target: Path) -> bool:
+        """
+        キャッシュにあれば target に置いて True。ハードリンクで置くのでデータはコピーしない。
+        エクスポートは必ず置き換えで書くため、リンク先が後から書き換わることはない。
+        """
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+        source = self._path(key)
+        tmp_path = _temp_sibling(target)
+        try:
+            os.utime(source)
+            try:
+                os.link(source, tmp_path)
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, target)
+        except FileNotFoundError:
+            # 別プロセスが追い出した
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return False
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return True
+
+    def put(self, key: str, data: bytes) -> None:
+        if not self.max_bytes or len(data) > self.max_bytes:
+            return
+        write_bytes_atomic(self._path(key), data)
+        evicted: List[str] = []
+        with self._lock:
+            self._total += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total > self.max_bytes and self._entries:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+
+
+export_cache = ExportCache(EXPORTS_DIR / ".cache", int(EXPORT_CACHE_MB * 1024 * 1024))
+
+
+def serialize_theme(theme: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "no": theme["no"],
+        "category": theme["category"],
+        "title": theme["title"],
+        "baseHints": theme.get("base_hints") or [],
+        "extraHint1": theme.get("extra_hint_1") or [],
+        "extraHint2": theme.get("extra_hint_2") or [],
+        "marks": theme.get("marks") or [],
+    }
 
-@app.route("/api/session/offset", methods=["POST"])
-def api_session_offset():
-    data = request.get_json(silent=True) or {}
-    if data.get("clear"):
-        session_manager.set_manual_offset(None)
-        return jsonify({"success": True, "status": session_manager.get_status()})
-    if "manualOffsetSeconds" not in data:
-        return jsonify({"error": "manualOffsetSeconds is required unless clearing"}), 400
-    try:
-        value = float(data["manualOffsetSeconds"])
-    except (TypeError, ValueError):
-        return jsonify({"error": "manualOffsetSeconds must be a number"}), 400
-    session_manager.set_manual_offset(value)
-    return jsonify({"success": True, "status": session_manager.get_status()})
 
+THEME_FIELDS = ("no", "category", "title", "baseHints", "extraHint1", "extraHint2", "marks")
+THEME_SEARCH_FIELDS = ("title", "hints", "category")
 
-@app.route("/api/themes", methods=["GET"])
-def api_themes():
-    themes = load_talk_themes()
-    payload = []
-    for theme in themes:
-        base_hints = theme.get("base_hints") or []
-        extra_hint_1 = theme.get("extra_hint_1") or []
-        extra_hint_2 = theme.get("extra_hint_2") or []
-        marks = theme.get("marks") or []
-        payload.append(
-            {
-                "no": theme["no"],
-                "category": theme["category"],
-                "title": theme["title"],
-                "baseHints": base_hints,
-                "extraHint1": extra_hint_1,
-                "extraHint2": extra_hint_2,
-                "marks": marks,
-            },
-        )
-    return jsonify({"themes": payload})
 
+def normalize_search_text(text: str) -> str:
+    """全角/半角・大文字小文字をそろえ、空白を除いた検索用テキスト。"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", text or "").lower())
 
-@app.route("/api/report", methods=["POST"])
-def api_report():
-    ensure_report_headers()
-    data = request.get_json(silent=True) or {}
-    content = (data.get("content") or "").strip()
 
-    group_id = (data.get("groupId") or "").strip()
-    session_label = (data.get("session") or "").strip()
-    take_label = (str(data.get("take") or "").strip())
-    category = (data.get("category") or "").strip()
-    timecode = (data.get("timecode") or "").strip() or "--:--:--"
+def search_tokens(text: str) -> List[str]:
+    """日本語向けの文字 bigram（1文字の場合は unigram）。"""
+    normalized = normalize_search_text(text)
+    if len(normalized) <= 1:
+        return [normalized] if normalized else []
+    return [normalized[i : i + 2] for i in range(len(normalized) - 1)]
 
-    timestamp = datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S")
 
-    row = [timestamp, group_id, session_label, take_label, timecode, content, category]
-    with REPORT_CSV.open("a", encoding="utf-8", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(row)
+class ThemeSearchIndex:
+    """
+    テーマの転置インデックス。カテゴリ・マークは完全一致、タイトル・ヒントは
+    文字 bigram で引き、候補だけを部分一致で確認する。
+    ヒントは1つずつ別のテキストとして扱い、ヒントの境目をまたいで一致させない。
+    """
 
-    return jsonify(
-        {
-            "success": True,
-            "row": {
-                "timestamp": timestamp,
-                "groupId": group_id,
-                "session": session_label,
-                "take": take_label,
-                "timecode": timecode,
-                "content": content,
-                "category": category,
-            },
-        },
-    )
+    def __init__(self, themes: List[Dict[str, object]]) -> None:
+        self._themes = themes
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._texts: List[Dict[str, List[str]]] = []
+        for position, theme in enumerate(themes):
+            hints = [
+                *(theme.get("base_hints") or []),
+                *(theme.get("extra_hint_1") or []),
+                *(theme.get("extra_hint_2") or []),
+            ]
+            category = str(theme.get("category") or "")
+            texts = {
+                "title": [str(theme.get("title") or "")],
+                "hints": [str(hint) for hint in hints],
+                "category": [category],
+            }
+            self._texts.append({field: [normalize_search_text(value) for value in values] for field, values in texts.items()})
+            for field, values in texts.items():
+                tokens: set = set()
+                for value in values:
+                    tokens.update(search_tokens(value))
+                    # 1文字クエリ用に unigram も載せる
+                    tokens.update(normalize_search_text(value))
+                for token in tokens:
+                    self._postings.setdefault((field, token), []).append(position)
+            self._postings.setdefault(("category=", normalize_search_text(category)), []).append(position)
+            for mark in theme.get("marks") or []:
+                self._postings.setdefault(("mark", str(mark)), []).append(position)
+
+    def _lookup(self, key: Tuple[str, str]) -> set:
+        return set(self._postings.get(key, ()))
+
+    def search(
+        self,
+        query: str = "",
+        *,
+        fields: Tuple[str, ...] = THEME_SEARCH_FIELDS,
+        category: Optional[str] = None,
+        marks: Tuple[str, ...] = (),
+    ) -> List[int]:
+        """条件に一致するテーマの位置を元の並び順で返す。"""
+        candidates: Optional[set] = None
+
+        def narrow(matches: set) -> None:
+            nonlocal candidates
+            candidates = matches if candidates is None else candidates & matches
+
+        if category:
+            narrow(self._lookup(("category=", normalize_search_text(category))))
+        for mark in marks:
+            narrow(self._lookup(("mark", mark)))
+
+        normalized_query = normalize_search_text(query)
+        if normalized_query:
+            for token in search_tokens(query):
+                matches: set = set()
+                for field in fields:
+                    matches |= self._lookup((field, token))
+                narrow(matches)
+                if not candidates:
+                    break
+            candidates = {
+                position
+                for position in candidates or ()
+                if any(normalized_query in text for field in fields for text in self._texts[position][field])
+            }
 
+        if candidates is None:
+            return list(range(len(self._themes)))
+        return sorted(candidates)
 
-@app.route("/api/report/update", methods=["POST"])
-def api_report_update():
-    ensure_report_headers()
-    data = request.get_json(silent=True) or {}
-    group_id = (data.get("groupId") or "").strip()
-    session_label = (data.get("session") or "").strip()
-    take_label = (str(data.get("take") or "").strip())
-    timecode = (data.get("timecode") or "").strip()
-    content = data.get("content")
-    category = data.get("category")
 
-    if not group_id or not session_label or not take_label or not timecode:
-        return jsonify({"error": "groupId, session, take, timecode は必須です。"}), 400
+class ThemeSnapshot:
+    """talk_themes.csv を一度パースした結果。差し替えはスナップショット単位で行う。"""
 
-    updated = update_report_entry(
-        group_id,
-        session_label,
-        take_label,
-        timecode,
-        content=content if content is not None else None,
-        category=category if category is not None else None,
-    )
+    def __init__(self, themes: List[Dict[str, object]], signature: Optional[Tuple[int, int, int]], version: int) -> None:
+        self.themes = themes
+        self.signature = signature
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc)
+        self._api_payload: Optional[PreparedPayload] = None
+        self._search_index: Optional[ThemeSearchIndex] = None
+        self._serialized: Optional[List[Dict[str, object]]] = None
+
+    def api_payload(self) -> PreparedPayload:
+        """/api/themes の本体。スナップショットごとに一度だけ作る（競合しても結果は同じ）。"""
+        if self._api_payload is None:
+            self._api_payload = PreparedPayload.from_json({"themes": self.serialized()})
+        return self._api_payload
+
+    def serialized(self) -> List[Dict[str, object]]:
+        if self._serialized is None:
+            self._serialized = [serialize_theme(theme) for theme in self.themes]
+        return self._serialized
+
+    def search_index(self) -> ThemeSearchIndex:
+        """/api/themes/search 用の転置インデックス。スナップショットごとに一度だけ作る。"""
+        if self._search_index is None:
+            self._search_index = ThemeSearchIndex(self.themes)
+        return self._search_index
+
+
+class ThemeFileHandler(FileSystemEventHandler):
+    def __init__(self, target: Path, callback) -> None:
+        super().__init__()
+        self._target = target
+        self._callback = callback
+
+    def _matches(self, path: Optional[str]) -> bool:
+        return bool(path) and Path(path).name == self._target.name
+
+    def on_any_event(self, event) -> None:  # type: ignore[override]
+        if getattr(event, "is_directory", False):
+            return
+        if self._matches(getattr(event, "src_path", None)) or self._matches(getattr(event, "dest_path", None)):
+            self._callback()
+
+
+class ThemeCache:
+    """
+    プロセス共通のテーマキャッシュ。ファイルが変わったときだけ再パースする。
+    watchdog が使える環境では変更イベントで無効化し、使えない環境や eventlet 下では
+    mtime/サイズ/inode の比較にフォールバックする。
+    """
+
+    def __init__(self, csv_path: Path) -> None:
+        self._csv_path = csv_path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[ThemeSnapshot] = None
+        self._dirty = True
+        self._observer: Optional[Observer] = None
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self._csv_path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _is_watching(self) -> bool:
+        return WATCHDOG_AVAILABLE and self._observer is not None and self._observer.is_alive()
+
+    def get(self) -> ThemeSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and not self._dirty:
+            if self._is_watching() or snapshot.signature == self._signature():
+                return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            signature = self._signature()
+            if snapshot is not None and snapshot.signature == signature:
+                self._dirty = False
+                return snapshot
+            return self._load_locked(signature)
+
+    def reload(self) -> ThemeSnapshot:
+        """ファイルの状態に関係なく再パースし、新しいスナップショットに差し替える。"""
+        with self._lock:
+            return self._load_locked(self._signature())
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def _load_locked(self, signature: Optional[Tuple[int, int, int]]) -> ThemeSnapshot:
+        # 読み込み中は旧スナップショットを返し続け、完成してから参照を一度に差し替える
+        self._dirty = False
+        themes = parse_talk_themes_csv(self._csv_path)
+        version = (self._snapshot.version + 1) if self._snapshot else 1
+        snapshot = ThemeSnapshot(themes, signature, version)
+        self._snapshot = snapshot
+        logger.info("Loaded %d talk themes (snapshot v%d)", len(themes), version)
+        return snapshot
+
+    def start_watching(self) -> None:
+        if not WATCHDOG_AVAILABLE:
+            logger.info("watchdog is not installed; theme cache falls back to mtime checks")
+            return
+        if ASYNC_MODE == "eventlet":
+            # monkey_patch 後は Observer の inotify 読み取りが green になり、import 中にハブごと止まる
+            logger.info("eventlet is active; theme cache falls back to mtime checks")
+            return
+        if self._observer and self._observer.is_alive():
+            return
+        handler = ThemeFileHandler(self._csv_path, self.invalidate)
+        observer = Observer()
+        observer.schedule(handler, str(self._csv_path.parent), recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        logger.info("Watching %s for theme changes", self._csv_path)
+
+    def stop_watching(self) -> None:
+        if self._observer and self._observer.is_alive():
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        self._observer = None
+
+
+session_manager = SessionOffsetManager()
+zoom_monitor = ZoomRecordingMonitor(CONFIG.get("zoom_recording_dir"), session_manager)
+try:
+    zoom_monitor.start()
+except Exception as exc:  # pragma: no cover - defensive startup guard
+    logger.warning("Failed to start Zoom recording monitor: %s", exc)
+
+theme_cache = ThemeCache(TALK_THEMES_CSV)
+try:
+    theme_cache.start_watching()
+except Exception as exc:  # pragma: no cover - defensive startup guard
+    logger.warning("Failed to start theme file watcher: %s", exc)
+
+
+REPORT_HEADERS = ["日時", "組番号", "セッション", "テイク", "タイムコード", "内容", "カテゴリ"]
+LEGACY_REPORT_IMPORT_KEY = "legacy_report_csv"
+
+# 検証済みの report.csv の (st_dev, st_ino, st_size, st_mtime_ns)。一致する間はファイルを読まない
+_report_headers_lock = threading.Lock()
+_report_headers_checked: Optional[Tuple[int, int, int, int]] = None
+
+
+def _report_csv_identity() -> Optional[Tuple[int, int, int, int]]:
+    try:
+        stat = REPORT_CSV.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def ensure_report_headers() -> None:
+    """旧形式の report.csv（テイク列なし）をインポート前にアップグレードする。"""
+    global _report_headers_checked
+    with _report_headers_lock:
+        identity = _report_csv_identity()
+        if identity is None or identity == _report_headers_checked:
+            return
+        _upgrade_report_headers()
+        _report_headers_checked = _report_csv_identity()
+
+
+def _upgrade_report_headers() -> None:
+    # ヘッダーが古い場合（テイク列なし）は取り込み前にアップグレードする
+    with REPORT_CSV.open("r", encoding="utf-8", newline="") as csvfile:
+        reader = csv.reader(csvfile)
+        existing_headers = next(reader, [])
+        if "テイク" in existing_headers:
+            return
+        rows = list(reader)
+
+    # 既存データを保持したままヘッダーを更新
+    upgraded_rows = []
+    for row in rows:
+        if len(row) >= 6:
+            upgraded_rows.append([row[0], row[1], row[2], "", row[3], row[4], row[5]])
+        else:
+            upgraded_rows.append((row + [""] * (7 - len(row)))[:7])
+
+    with REPORT_CSV.open("w", encoding="utf-8", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(REPORT_HEADERS)
+        writer.writerows(upgraded_rows)
+
+
+class _PendingAppend:
+    __slots__ = ("entries", "done", "results", "error")
+
+    def __init__(self, entries: List[Tuple[List[str], Optional[str]]]) -> None:
+        self.entries = entries
+        self.done = threading.Event()
+        self.results: List[Tuple[int, bool]] = []
+        self.error: Optional[BaseException] = None
+
+
+class ReportStore:
+    """SQLite (WAL) backed marker log indexed on (組番号, セッション, テイク)."""
+
+    SCHEMA_VERSION = 4
+    FSYNC_POLICIES = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        fsync: str = "full",
+        commit_window_ms: float = 5.0,
+        max_batch: int = 256,
+    ) -> None:
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self._db_path = db_path
+        self._fsync = fsync
+        self._commit_window = max(0.0, commit_window_ms) / 1000.0
+        self._max_batch = max(1, max_batch)
+        self._lock = native_threading.RLock()  # エクスポートの OS スレッドとハブの両方から取る
+        self._conn = self._connect()
+        self._migrate()
+        # 追記は専用の writer スレッドに集約し、まとめて1トランザクションでコミットする
+        self._queue: "queue.Queue[Optional[_PendingAppend]]" = queue.Queue()
+        self._writer_conn = self._connect()
+        self._writer = threading.Thread(target=self._writer_loop, name="report-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self._db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.FSYNC_POLICIES[self._fsync]}")
+        return conn
+
+    @property
+    def path(self) -> Path:
+        return self._db_path
+
+    def _migrate(self) -> None:
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= self.SCHEMA_VERSION:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 別ワーカーが先に移行している場合があるのでロック取得後に読み直す
+                version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < 1:
+                    self._migrate_v1()
+                if version < 2:
+                    self._migrate_v2()
+                if version < 3:
+                    self._migrate_v3()
+                if version < 4:
+                    self._migrate_v4()
+                self._conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _migrate_v1(self) -> None:
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS markers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                group_id TEXT NOT NULL,
+                session TEXT NOT NULL,
+                take TEXT NOT NULL,
+                timecode TEXT NOT NULL,
+                content TEXT NOT NULL,
+                category TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_markers_group_session_take "
+            "ON markers (group_id, session, take, id)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    def _migrate_v2(self) -> None:
+        # クライアント生成 ID。再送された行を重複登録しないための一意キー
+        self._conn.execute("ALTER TABLE markers ADD COLUMN client_id TEXT")
+        self._conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_markers_client_id "
+            "ON markers (client_id) WHERE client_id IS NOT NULL"
+        )
+
+    def _migrate_v3(self) -> None:
+        # 改訂番号: 追記・編集のたびに全体で単調増加する値を振る。マーカー集合の版の判定に使う。
+        # 書き込み経路（writer スレッド・update・CSV 取り込み）に依らず振られるようトリガーで管理する
+        self._conn.execute("ALTER TABLE markers ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("UPDATE markers SET revision = id")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_markers_revision ON markers (revision)")
+        self._conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS markers_revision_on_insert AFTER INSERT ON markers
+            BEGIN
+                UPDATE markers SET revision = (SELECT MAX(revision) FROM markers) + 1 WHERE id = NEW.id;
+            END
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS markers_revision_on_update AFTER UPDATE OF content, category ON markers
+            WHEN OLD.content IS NOT NEW.content OR OLD.category IS NOT NEW.category
+            BEGIN
+                UPDATE markers SET revision = (SELECT MAX(revision) FROM markers) + 1 WHERE id = NEW.id;
+            END
+            """
+        )
+
+    def _migrate_v4(self) -> None:
+        # 差分エクスポート: 取得側（consumer）ごとに、どの改訂番号まで渡したかを記録する
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS export_checkpoints (
+                consumer TEXT NOT NULL,
+                group_id TEXT NOT NULL,
+                session TEXT NOT NULL,
+                take TEXT NOT NULL,
+                revision INTEGER NOT NULL,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (consumer, group_id, session, take)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_markers_group_session_revision "
+            "ON markers (group_id, session, revision)"
+        )
+
+    @staticmethod
+    def _to_report_row(record: Tuple[object, ...]) -> Dict[str, object]:
+        return {
+            "id": record[0],
+            "日時": record[1],
+            "組番号": record[2],
+            "セッション": record[3],
+            "テイク": record[4],
+            "タイムコード": record[5],
+            "内容": record[6],
+            "カテゴリ": record[7],
+        }
+
+    def append(self, row: List[str], client_id: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        1行追記し、(行 ID, 新規に書き込んだか) を返す。
+        client_id が既に登録済みなら書き込まずに既存の行 ID を返す。
+        """
+        return self.append_many([(row, client_id)])[0]
+
+    def append_many(self, entries: List[Tuple[List[str], Optional[str]]]) -> List[Tuple[int, bool]]:
+        """
+        複数行をまとめて追記する。writer スレッドがバッチをコミットし終えるまで待つので、
+        戻った時点で行は永続化済み。
+        """
+        if not entries:
+            return []
+        pending = _PendingAppend(entries)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def get(self, row_id: int) -> Optional[Dict[str, object]]:
+        with self._lock:
+            record = self._conn.execute(
+                "SELECT id, created_at, group_id, session, take, timecode, content, category FROM markers WHERE id = ?",
+                (row_id,),
+            ).fetchone()
+        return self._to_report_row(record) if record else None
+
+    def close(self) -> None:
+        """キューに残った行を書き切ってから writer スレッドを止める。"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def _writer_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self._commit_window
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[_PendingAppend]) -> None:
+        conn = self._writer_conn
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for pending in batch:
+                    pending.results = []
+                    for row, client_id in pending.entries:
+                        cursor = conn.execute(
+                            "INSERT OR IGNORE INTO markers "
+                            "(created_at, group_id, session, take, timecode, content, category, client_id) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (*row, client_id),
+                        )
+                        if cursor.rowcount:
+                            pending.results.append((int(cursor.lastrowid), True))
+                            continue
+                        existing = conn.execute(
+                            "SELECT id FROM markers WHERE client_id = ?", (client_id,)
+                        ).fetchone()
+                        pending.results.append((int(existing[0]), False))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except Exception as exc:  # noqa: BLE001 - surfaced to every waiting request
+            logger.exception("Failed to commit %d report rows", len(batch))
+            for pending in batch:
+                pending.results = []
+                pending.error = exc
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def fetch(self, group_id: str, session_label: str, take_label: Optional[str] = None) -> List[Dict[str, object]]:
+        """インデックスを使って組/セッション（/テイク）に一致する行だけを読む。"""
+        query = (
+            "SELECT id, created_at, group_id, session, take, timecode, content, category "
+            "FROM markers WHERE group_id = ? AND session = ?"
+        )
+        params: List[str] = [group_id, session_label]
+        if take_label:
+            query += " AND take = ?"
+            params.append(take_label)
+        query += " ORDER BY id"
+        with self._lock:
+            records = self._conn.execute(query, params).fetchall()
+        return [self._to_report_row(record) for record in records]
+
+    def version(self, group_id: str, session_label: str, take_label: Optional[str] = None) -> Tuple[int, int]:
+        """
+        組/セッション（/テイク）のマーカー集合の版 (行数, 最大改訂番号)。
+        行は削除されないので、追記・編集があれば必ず変わる。
+        """
+        query = "SELECT COUNT(*), COALESCE(MAX(revision), 0) FROM markers WHERE group_id = ? AND session = ?"
+        params: List[str] = [group_id, session_label]
+        if take_label:
+            query += " AND take = ?"
+            params.append(take_label)
+        with self._lock:
+            count, revision = self._conn.execute(query, params).fetchone()
+        return int(count), int(revision)
+
+    def fetch_since(
+        self,
+        group_id: str,
+        session_label: str,
+        take_label: Optional[str],
+        revision: int,
+    ) -> Tuple[List[Dict[str, object]], int]:
+        """
+        改訂番号が revision より新しい行（その後に追記・編集された行）を id 順で返す。
+        戻り値の2つ目は次回の基準にする改訂番号（該当行が無ければ revision のまま）。
+        改訂番号はコミット順に振られるので、読んだ時点より前の行を取りこぼすことはない。
+        """
+        query = (
+            "SELECT id, created_at, group_id, session, take, timecode, content, category, revision "
+            "FROM markers WHERE group_id = ? AND session = ? AND revision > ?"
+        )
+        params: List[object] = [group_id, session_label, revision]
+        if take_label:
+            query += " AND take = ?"
+            params.append(take_label)
+        query += " ORDER BY id"
+        with self._lock:
+            records = self._conn.execute(query, params).fetchall()
+        watermark = max((int(record[8]) for record in records), default=revision)
+        return [self._to_report_row(record) for record in records], watermark
+
+    def get_checkpoint(self, consumer: str, group_id: str, session_label: str, take_label: str = "") -> int:
+        with self._lock:
+            record = self._conn.execute(
+                "SELECT revision FROM export_checkpoints WHERE consumer = ? AND group_id = ? AND session = ? AND take = ?",
+                (consumer, group_id, session_label, take_label),
+            ).fetchone()
+        return int(record[0]) if record else 0
+
+    def set_checkpoint(self, consumer: str, group_id: str, session_label: str, take_label: str, revision: int) -> None:
+        """チェックポイントを進める。並行した取得が古い値で巻き戻すことはない。"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO export_checkpoints (consumer, group_id, session, take, revision, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (consumer, group_id, session, take) DO UPDATE SET "
+                "revision = MAX(revision, excluded.revision), updated_at = excluded.updated_at",
+                (consumer, group_id, session_label, take_label, revision, datetime.now(JST).isoformat()),
+            )
+
+    def take_versions(self, group_id: str, session_label: str) -> Dict[str, Tuple[int, int]]:
+        """セッション内の全テイクの版を1回のクエリで返す。"""
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT take, COUNT(*), COALESCE(MAX(revision), 0) FROM markers "
+                "WHERE group_id = ? AND session = ? GROUP BY take",
+                (group_id, session_label),
+            ).fetchall()
+        return {str(take): (int(count), int(revision)) for take, count, revision in records}
+
+    def fetch_all(self) -> List[Dict[str, object]]:
+        with self._lock:
+            records = self._conn.execute(
+                "SELECT id, created_at, group_id, session, take, timecode, content, category FROM markers ORDER BY id"
+            ).fetchall()
+        return [self._to_report_row(record) for record in records]
+
+    def update(
+        self,
+        row_id: int,
+        *,
+        content: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> Optional[Dict[str, object]]:
+        """行 ID を指定して1行だけを更新する。単一トランザクションなので途中で落ちても壊れない。"""
+        assignments: List[str] = []
+        params: List[object] = []
+        if content is not None:
+            assignments.append("content = ?")
+            params.append(content)
+        if category is not None:
+            assignments.append("category = ?")
+            params.append(category)
+        with self._lock:
+            if assignments:
+                self._conn.execute(f"UPDATE markers SET {', '.join(assignments)} WHERE id = ?", (*params, row_id))
+            return self.get(row_id)
+
+    def find_id(self, group_id: str, session_label: str, take_label: str, timecode: str) -> Optional[int]:
+        """group/session/take/timecode で最初に一致する行の ID を返す。"""
+        target = normalize_timecode(timecode)
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT id, timecode FROM markers WHERE group_id = ? AND session = ? AND take = ? ORDER BY id",
+                (group_id, session_label, take_label),
+            ).fetchall()
+        return next((int(rid) for rid, tc in candidates if normalize_timecode(tc) == target), None)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            record = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return record[0] if record else None
+
+    def import_csv(
+        self,
+        csv_path: Path,
+        *,
+        once_key: Optional[str] = None,
+        prepare: Optional[Callable[[], None]] = None,
+    ) -> int:
+        """
+        report.csv 形式の CSV を取り込む。once_key を指定した場合は
+        meta テーブルに記録し、同じキーでの二重取り込みを防ぐ。
+        prepare は書き込みロック取得後・読み込み前に一度だけ呼ばれる（ヘッダー移行用）。
+        """
+        if not csv_path.exists():
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if once_key is not None:
+                    done = self._conn.execute("SELECT value FROM meta WHERE key = ?", (once_key,)).fetchone()
+                    if done:
+                        self._conn.execute("COMMIT")
+                        return 0
+                if prepare is not None:
+                    prepare()
+                imported = 0
+                with csv_path.open("r", encoding="utf-8", newline="") as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    for row in reader:
+                        self._conn.execute(
+                            "INSERT INTO markers (created_at, group_id, session, take, timecode, content, category) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (
+                                row.get("日時") or "",
+                                (row.get("組番号") or "").strip(),
+                                (row.get("セッション") or "").strip(),
+                                (row.get("テイク") or "").strip(),
+                                row.get("タイムコード") or "",
+                                row.get("内容") or "",
+                                row.get("カテゴリ") or "",
+                            ),
+                        )
+                        imported += 1
+                if once_key is not None:
+                    marker = {
+                        "importedAt": datetime.now(JST).isoformat(),
+                        "rows": imported,
+                        "schemaVersion": self.SCHEMA_VERSION,
+                    }
+                    self._conn.execute(
+                        "INSERT INTO meta (key, value) VALUES (?, ?)",
+                        (once_key, json.dumps(marker)),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if imported:
+            logger.info("Imported %d report rows from %s", imported, csv_path)
+        return imported
+
+
+def open_report_store() -> ReportStore:
+    store = ReportStore(
+        REPORT_DB,
+        fsync=REPORT_FSYNC,
+        commit_window_ms=REPORT_COMMIT_WINDOW_MS,
+        max_batch=REPORT_MAX_BATCH,
+    )
+    # ヘッダー移行と取り込みは起動時に一度だけ。済んでいれば meta の記録を見るだけで CSV は開かない。
+    # 複数ワーカーが同時に CSV を書き換えないよう、移行は SQLite の書き込みロック内で行う。
+    if store.get_meta(LEGACY_REPORT_IMPORT_KEY) is None:
+        store.import_csv(REPORT_CSV, once_key=LEGACY_REPORT_IMPORT_KEY, prepare=ensure_report_headers)
+    return store
+
+
+report_store = open_report_store()
+
+
+def load_report_rows() -> List[Dict[str, object]]:
+    return report_store.fetch_all()
+
+
+def report_row_payload(row: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "id": row["id"],
+        "timestamp": row["日時"],
+        "groupId": row["組番号"],
+        "session": row["セッション"],
+        "take": row["テイク"],
+        "timecode": row["タイムコード"],
+        "content": row["内容"],
+        "category": row["カテゴリ"],
+    }
+
+
+def update_report_entry(group_id: str, session_label: str, take_label: str, timecode: str, *, content: Optional[str] = None, category: Optional[str] = None) -> Optional[Dict[str, object]]:
+    """
+    指定された行を上書きする（group/session/take/timecode で最初に一致する1行）。
+    content/category のいずれかを更新し、その他の列は保持する。
+    見つからなければ None を返す。
+    """
+    row_id = report_store.find_id(group_id, session_label, take_label, timecode)
+    if row_id is None:
+        return None
+    return update_report_entry_by_id(row_id, content=content, category=category)
+
+
+def update_report_entry_by_id(row_id: int, *, content: Optional[str] = None, category: Optional[str] = None) -> Optional[Dict[str, object]]:
+    """行 ID で1行だけを更新する。見つからなければ None を返す。"""
+    row = report_store.update(row_id, content=content, category=category)
+    if row is None:
+        return None
+    return report_row_payload(row)
+
+
+def filter_report_rows(group_id: str, session_label: str, take_label: Optional[str] = None) -> List[Dict[str, object]]:
+    """
+    収録の絞り込み: グループ/セッションで絞り、テイクが指定された場合はテイクも一致させる。
+    (組番号, セッション, テイク) のインデックスを引くため、履歴全体は走査しない。
+    """
+    take_label = (take_label or "").strip()
+    return report_store.fetch(group_id, session_label, take_label or None)
+
+
+def group_report_rows_by_take(rows: List[Dict[str, object]]) -> Dict[str, List[Dict[str, object]]]:
+    """セッションの行を1回の走査でテイクごとに振り分ける。各テイク内の順序（id 順）は保つ。"""
+    grouped: Dict[str, List[Dict[str, object]]] = {}
+    for row in rows:
+        grouped.setdefault(str(row.get("テイク") or ""), []).append(row)
+    return grouped
+
+
+def normalize_timecode(value: str) -> str:
+    if not value:
+        return "00:00:00"
+    value = value.strip()
+    parts = value.split(":")
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        return f"{parts[0].zfill(2)}:{parts[1].zfill(2)}:{parts[2].zfill(2)}"
+    try:
+        total_seconds = int(float(value))
+    except (ValueError, TypeError):
+        return "00:00:00"
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+@app.route("/")
+def index():
+    return render_template("landing.html", current_year=datetime.now().year)
+
+
+@app.route("/control")
+def control():
+    themes = load_talk_themes()
+    return render_template(
+        "control.html",
+        duration_seconds=DEFAULT_DURATION_SEC,
+        canned_prompts=CANNED_PROMPTS,
+        total_themes=len(themes),
+        categories=CATEGORY_OPTIONS,
+    )
+
+
+@app.route("/prompt")
+def prompt():
+    return render_template("prompt.html")
+
+
+@app.route("/api/session/start", methods=["POST"])
+def api_session_start():
+    data = request.get_json(silent=True) or {}
+    start_ts = data.get("startTimestamp")
+    group_id = (data.get("groupId") or "").strip()
+    session_label = (data.get("session") or "").strip()
+    if not group_id or not session_label:
+        return jsonify({"error": "groupId and session are required"}), 400
+    if start_ts is None:
+        return jsonify({"error": "startTimestamp is required"}), 400
+    try:
+        start_time = datetime.fromtimestamp(float(start_ts) / 1000.0)
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid startTimestamp"}), 400
+    session_manager.start_session(group_id, session_label, start_time)
+    return jsonify({"success": True, "status": session_manager.get_status()})
+
+
+@app.route("/api/session/status", methods=["GET"])
+def api_session_status():
+    status = session_manager.get_status()
+    status["monitoringPath"] = CONFIG.get("zoom_recording_dir")
+    return jsonify(status)
+
+
+@app.route("/api/session/offset", methods=["POST"])
+def api_session_offset():
+    data = request.get_json(silent=True) or {}
+    if data.get("clear"):
+        session_manager.set_manual_offset(None)
+        return jsonify({"success": True, "status": session_manager.get_status()})
+    if "manualOffsetSeconds" not in data:
+        return jsonify({"error": "manualOffsetSeconds is required unless clearing"}), 400
+    try:
+        value = float(data["manualOffsetSeconds"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "manualOffsetSeconds must be a number"}), 400
+    session_manager.set_manual_offset(value)
+    return jsonify({"success": True, "status": session_manager.get_status()})
+
+
+@app.route("/api/themes", methods=["GET"])
+def api_themes():
+    return send_prepared_payload(theme_cache.get().api_payload())
+
+
+THEME_SEARCH_MAX_LIMIT = 500
+
+
+@app.route("/api/themes/search", methods=["GET"])
+def api_themes_search():
+    """
+    テーマ検索。q（タイトル・ヒント・カテゴリの部分一致）、category（完全一致）、
+    marks（カンマ区切り、すべて一致）で絞り込み、offset/limit でページング、
+    fields で返す列を指定する。
+    """
+    query = request.args.get("q", "")
+    category = request.args.get("category", "").strip() or None
+    marks = tuple(mark.strip() for mark in request.args.get("marks", "").split(",") if mark.strip())
+    search_fields = tuple(
+        field.strip() for field in request.args.get("in", ",".join(THEME_SEARCH_FIELDS)).split(",") if field.strip()
+    )
+    if any(field not in THEME_SEARCH_FIELDS for field in search_fields):
+        return jsonify({"error": f"in は {', '.join(THEME_SEARCH_FIELDS)} から指定してください。"}), 400
+    fields_raw = request.args.get("fields", "")
+    projection = tuple(field.strip() for field in fields_raw.split(",") if field.strip()) or THEME_FIELDS
+    if any(field not in THEME_FIELDS for field in projection):
+        return jsonify({"error": f"fields は {', '.join(THEME_FIELDS)} から指定してください。"}), 400
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(THEME_SEARCH_MAX_LIMIT, max(0, int(request.args.get("limit", 50))))
+    except ValueError:
+        return jsonify({"error": "offset と limit は整数で指定してください。"}), 400
+
+    snapshot = theme_cache.get()
+    positions = snapshot.search_index().search(query, fields=search_fields, category=category, marks=marks)
+    serialized = snapshot.serialized()
+    page = [
+        {field: serialized[position][field] for field in projection}
+        for position in positions[offset : offset + limit]
+    ]
+    return jsonify(
+        {
+            "total": len(positions),
+            "offset": offset,
+            "limit": limit,
+            "version": snapshot.version,
+            "themes": page,
+        }
+    )
+
+
+REPORT_BATCH_LIMIT = 1000
+# オフラインで溜めたマーカーは後から届くので、端末で記録した時刻（createdAt）を受け付ける。
+# 端末の時計ずれと、あり得ないほど古い時刻はここで弾く
+CLIENT_CREATED_AT_MAX_SKEW_SEC = 5 * 60
+CLIENT_CREATED_AT_MAX_AGE_SEC = 7 * 24 * 60 * 60
+
+
+def parse_client_created_at(value: object, now: datetime) -> Optional[str]:
+    """
+    createdAt（タイムゾーン付き ISO 8601 か UNIX ミリ秒）を report の日時表記に変換する。
+    省略時は None。解釈できない値や範囲外の時刻は ValueError。
+    """
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool):
+        raise ValueError("createdAt は ISO 8601 か UNIX ミリ秒で指定してください。")
+    try:
+        if isinstance(value, (int, float)):
+            created = datetime.fromtimestamp(value / 1000.0, timezone.utc)
+        else:
+            text = str(value).strip()
+            # Python 3.10 以前の fromisoformat は末尾の Z を読めない
+            created = datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise ValueError("createdAt は ISO 8601 か UNIX ミリ秒で指定してください。") from None
+    if created.tzinfo is None:
+        raise ValueError("createdAt にはタイムゾーンを含めてください。")
+    age = (now - created).total_seconds()
+    if age < -CLIENT_CREATED_AT_MAX_SKEW_SEC or age > CLIENT_CREATED_AT_MAX_AGE_SEC:
+        raise ValueError("createdAt が現在時刻から離れすぎています。")
+    return created.astimezone(JST).strftime("%Y/%m/%d %H:%M:%S")
+
+
+def parse_report_marker(data: Dict[str, object], now: datetime) -> Tuple[List[str], Optional[str]]:
+    """リクエストの1マーカーを (report 行, clientId) に変換する。createdAt が不正なら ValueError。"""
+    timestamp = parse_client_created_at(data.get("createdAt"), now) or now.strftime("%Y/%m/%d %H:%M:%S")
+    content = (data.get("content") or "").strip()
+    group_id = (data.get("groupId") or "").strip()
+    session_label = (data.get("session") or "").strip()
+    take_label = (str(data.get("take") or "").strip())
+    category = (data.get("category") or "").strip()
+    timecode = (data.get("timecode") or "").strip() or "--:--:--"
+    client_id = str(data.get("clientId") or "").strip() or None
+    return [timestamp, group_id, session_label, take_label, timecode, content, category], client_id
+
+
+@app.route("/api/report", methods=["POST"])
+def api_report():
+    data = request.get_json(silent=True) or {}
+    try:
+        row, client_id = parse_report_marker(data, datetime.now(JST))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    row_id, inserted = report_store.append(row, client_id)
+    stored = report_store.get(row_id) if not inserted else None
+
+    return jsonify(
+        {
+            "success": True,
+            "duplicate": not inserted,
+            "row": report_row_payload(stored) if stored else {
+                "id": row_id,
+                "timestamp": row[0],
+                "groupId": row[1],
+                "session": row[2],
+                "take": row[3],
+                "timecode": row[4],
+                "content": row[5],
+                "category": row[6],
+            },
+        },
+    )
+
+
+@app.route("/api/report/batch", methods=["POST"])
+def api_report_batch():
+    """
+    複数マーカーをまとめて登録する。各マーカーは clientId 必須で、
+    登録済みの clientId はスキップされるため再送しても重複しない。
+    createdAt があれば受信時刻ではなくその時刻で記録する（オフライン中に溜めたマーカーの再送用）。
+    """
+    data = request.get_json(silent=True) or {}
+    markers = data.get("markers")
+    if not isinstance(markers, list):
+        return jsonify({"error": "markers は配列で指定してください。"}), 400
+    if len(markers) > REPORT_BATCH_LIMIT:
+        return jsonify({"error": f"markers は最大 {REPORT_BATCH_LIMIT} 件までです。"}), 400
+
+    now = datetime.now(JST)
+    entries: List[Tuple[List[str], Optional[str]]] = []
+    for index, marker in enumerate(markers):
+        if not isinstance(marker, dict):
+            return jsonify({"error": "markers の各要素はオブジェクトで指定してください。"}), 400
+        try:
+            row, client_id = parse_report_marker(marker, now)
+        except ValueError as exc:
+            return jsonify({"error": f"markers[{index}]: {exc}"}), 400
+        if not client_id:
+            return jsonify({"error": "各マーカーに clientId が必要です。"}), 400
+        entries.append((row, client_id))
+
+    results = report_store.append_many(entries)
+    inserted = sum(1 for _, created in results if created)
+    return jsonify(
+        {
+            "success": True,
+            "inserted": inserted,
+            "skipped": len(results) - inserted,
+            "results": [
+                {"clientId": client_id, "id": row_id, "duplicate": not created}
+                for (_, client_id), (row_id, created) in zip(entries, results)
+            ],
+        },
+    )
+
+
+@app.route("/api/report/download", methods=["GET"])
+def api_report_download():
+    """記録ログ全体を従来の report.csv と同じ列構成でダウンロードする。"""
+    buffer = io.StringIO(newline="")
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_HEADERS)
+    for row in load_report_rows():
+        writer.writerow([row[header] for header in REPORT_HEADERS])
+    csv_bytes = buffer.getvalue().encode("utf-8-sig")
+    buffer.close()
+    return Response(
+        csv_bytes,
+        mimetype="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="report.csv"'},
+    )
+
+
+@app.route("/api/report/update", methods=["POST"])
+def api_report_update():
+    data = request.get_json(silent=True) or {}
+    content = data.get("content")
+    category = data.get("category")
+
+    if data.get("id") is not None:
+        try:
+            row_id = int(data["id"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "id は整数で指定してください。"}), 400
+        updated = update_report_entry_by_id(row_id, content=content, category=category)
+        if not updated:
+            return jsonify({"error": "対象の記録が見つかりませんでした。"}), 404
+        return jsonify({"success": True, "row": updated})
+
+    group_id = (data.get("groupId") or "").strip()
+    session_label = (data.get("session") or "").strip()
+    take_label = (str(data.get("take") or "").strip())
+    timecode = (data.get("timecode") or "").strip()
+
+    if not group_id or not session_label or not take_label or not timecode:
+        return jsonify({"error": "groupId, session, take, timecode は必須です。"}), 400
+
+    updated = update_report_entry(
+        group_id,
+        session_label,
+        take_label,
+        timecode,
+        content=content if content is not None else None,
+        category=category if category is not None else None,
+    )
     if not updated:
         return jsonify({"error": "対象の記録が見つかりませんでした。"}), 404
 
@@ -990,9 +2359,164 @@ def handle_screen_attention(data: Optional[Dict[str, object]] = None) -> None:
     emit("screen_attention", room=room_id)
 
 
+def parse_delta_request(data: Dict[str, object]) -> Optional[Tuple[str, Optional[int]]]:
+    """
+    差分エクスポートの指定を読む。delta でなければ None、delta なら (consumer, since)。
+    since 省略時は consumer のチェックポイントから続ける。不正な指定は ValueError。
+    """
+    if not data.get("delta"):
+        return None
+    consumer = str(data.get("consumer") or "").strip()
+    if not consumer or len(consumer) > 128:
+        raise ValueError("差分エクスポートには consumer（128 文字以内）を指定してください。")
+    since_raw = data.get("since")
+    if since_raw in (None, ""):
+        return consumer, None
+    try:
+        since = int(since_raw)
+    except (TypeError, ValueError):
+        since = -1
+    if since < 0:
+        raise ValueError("since には 0 以上の改訂番号を指定してください。")
+    return consumer, since
+
+
+_delta_locks: Dict[Tuple[str, str, str, str], "threading.Lock"] = {}
+_delta_locks_guard = native_threading.Lock()
+
+
+def delta_lock(consumer: str, group_id: str, session_label: str, take_label: str) -> "threading.Lock":
+    """
+    同じ consumer・範囲の差分エクスポートを1件ずつ実行するためのロック（ワーカーの OS スレッドで取る）。
+    プロセス内のロックで足りるのは、ExportJobManager がエクスポートを1プロセスに限っているため。
+    """
+    key = (consumer, group_id, session_label, take_label)
+    with _delta_locks_guard:
+        lock = _delta_locks.get(key)
+        if lock is None:
+            lock = _delta_locks[key] = native_threading.Lock()
+        return lock
+
+
+def emit_export_job(job: ExportJob, payload: Dict[str, object]) -> None:
+    """ジョブの状態を依頼元の room へ送る。room が無い依頼は状態 API のポーリングで追う。"""
+    if job.room_id:
+        socketio.emit("export_job", payload, room=job.room_id)
+
+
+export_jobs = ExportJobManager(
+    emit_export_job,
+    EXPORTS_DIR / "jobs",
+    workers=EXPORT_WORKERS,
+    max_pending=EXPORT_MAX_PENDING,
+    retention_seconds=EXPORT_RETENTION_SEC,
+)
+
+
+def submit_export_job(kind: str, room_id: Optional[str], run: Callable[[ExportJob], Dict[str, object]]) -> Tuple[Response, int]:
+    job = export_jobs.submit(kind, room_id, run)
+    if job is None:
+        return jsonify({"error": "エクスポートが混み合っています。しばらくしてから再度お試しください。"}), 503
+    return jsonify({"success": True, **job.snapshot()}), 202
+
+
+@app.route("/api/export-jobs/<job_id>", methods=["GET"])
+def api_export_job_status(job_id: str):
+    job = export_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "ジョブが見つからないか、保持期間を過ぎています。"}), 404
+    return jsonify(job.snapshot())
+
+
+@app.route("/api/export-jobs/<job_id>/download", methods=["GET"])
+def api_export_job_download(job_id: str):
+    job = export_jobs.lease(job_id)
+    if job is None:
+        abort(404)
+    try:
+        resp = _send_export_artifact(job)
+    except BaseException:
+        export_jobs.release(job)
+        raise
+    call_when_closed(resp, lambda: export_jobs.release(job))
+    return resp
+
+
+def _send_export_artifact(job: ExportJob) -> Response:
+    if job.status != "done" or job.artifact is None:
+        abort(404)
+    path, download_name = job.artifact
+    if path.is_dir():
+        resp = send_zip_stream(path, download_name)
+    elif path.is_file():
+        # 受け取り確認を待つ成果物は Range/条件付きリクエストに応じず、毎回全体を 200 で返す
+        resp = send_file(
+            path,
+            mimetype="text/csv",
+            as_attachment=True,
+            download_name=download_name,
+            max_age=0,
+            conditional=not job.awaits_download,
+        )
+    else:
+        abort(404)
+    if job.awaits_download:
+        call_when_sent(resp, job.downloaded)
+    return resp
+
+
+def call_when_sent(resp: Response, callback: Callable[[], None]) -> None:
+    """
+    本文を最後まで送り切ったときだけ callback を呼ぶ。途中で切断されたダウンロードや、
+    206/304 のように全体を返さない応答では呼ばない。
+    """
+    if resp.status_code != 200:
+        return
+    body = resp.response
+
+    def iterate() -> Iterator[bytes]:
+        try:
+            yield from body
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                close()
+        callback()
+
+    resp.response = iterate()
+
+
+class _ClosingBody:
+    """本文の iterable を包み、WSGI サーバーが close() したときに callback を1回だけ呼ぶ。"""
+
+    def __init__(self, body: object, callback: Callable[[], None]) -> None:
+        self._body = body
+        self._callback: Optional[Callable[[], None]] = callback
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self._body)  # type: ignore[call-overload]
+
+    def close(self) -> None:
+        callback, self._callback = self._callback, None
+        try:
+            close = getattr(self._body, "close", None)
+            if close is not None:
+                close()
+        finally:
+            if callback is not None:
+                callback()
+
+
+def call_when_closed(resp: Response, callback: Callable[[], None]) -> None:
+    """
+    送り切ったとき・途中で切れたとき・本文を送らない応答（HEAD/304）のどれでも、応答を閉じた時点で callback を呼ぶ。
+    send_file の応答は Response.close を通らずに本文が直接サーバーへ渡るため、call_on_close ではなく本文を包む。
+    """
+    resp.response = _ClosingBody(resp.response, callback)
+
+
 @app.route("/api/export-session", methods=["POST"])
 def api_export_session():
-    ensure_report_headers()
     data = request.get_json(silent=True) or {}
     group_id = (data.get("groupId") or "").strip()
     session_label = (data.get("session") or "").strip()
@@ -1023,46 +2547,93 @@ def api_export_session():
     start_time_str = format_timestamp(start_time_dt)
     recording_time_str = format_timestamp(recording_time_dt)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    try:
+        delta = parse_delta_request(data)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
     filename = f"{group_id}_{session_label}_take{take_label}.csv"
-    filepath = EXPORTS_DIR / filename
+    timing = {
+        "offsetSeconds": offset_seconds,
+        "offsetSource": offset_source,
+        "recpilotStartTimestamp": start_time_str,
+        "zoomRecordingTimestamp": recording_time_str,
+    }
 
-    csv_bytes, rows_count = generate_session_csv(
-        group_id,
-        session_label,
-        take_label,
-        summary,
-        director,
-        participants,
-        offset_seconds,
-        offset_source,
-        start_time_str,
-        recording_time_str,
-    )
+    def run_delta(job: ExportJob, consumer: str, since: Optional[int]) -> Dict[str, object]:
+        with delta_lock(consumer, group_id, session_label, take_label):
+            return build_delta(job, consumer, since)
 
-    with filepath.open("wb") as export_file:
-        export_file.write(csv_bytes)
+    def build_delta(job: ExportJob, consumer: str, since: Optional[int]) -> Dict[str, object]:
+        if since is None:
+            since = report_store.get_checkpoint(consumer, group_id, session_label, take_label)
+        rows, watermark = report_store.fetch_since(group_id, session_label, take_label, since)
+        csv_bytes, rows_count = generate_session_csv(
+            group_id,
+            session_label,
+            take_label,
+            summary,
+            director,
+            participants,
+            offset_seconds,
+            offset_source,
+            start_time_str,
+            recording_time_str,
+            report_rows=rows,
+            include_summary=since == 0,
+        )
+        delta_filename = f"{group_id}_{session_label}_take{take_label}_delta_{since}-{watermark}.csv"
+        delta_path = job.output_path(delta_filename)
+        write_bytes_atomic(delta_path, csv_bytes)
+        # チェックポイントは取得側が行を受け取ってから進める。生成しただけでは進めない
+        job.attach(
+            delta_path,
+            delta_filename,
+            on_downloaded=lambda: report_store.set_checkpoint(consumer, group_id, session_label, take_label, watermark),
+        )
+        job.progress(1, 1)
+        return {
+            "filename": delta_filename,
+            "savedPath": str(delta_path),
+            "rows": rows_count,
+            "delta": {"consumer": consumer, "since": since, "watermark": watermark},
+            **timing,
+        }
 
-    encoded = base64.b64encode(csv_bytes).decode("ascii")
+    def run(job: ExportJob) -> Dict[str, object]:
+        job.progress(0, 1)
+        if delta is not None:
+            return run_delta(job, *delta)
+        filepath = job.output_path(filename)
+        rows_count, cached = export_session_csv(
+            filepath,
+            group_id,
+            session_label,
+            take_label,
+            summary,
+            director,
+            participants,
+            offset_seconds,
+            offset_source,
+            start_time_str,
+            recording_time_str,
+        )
+        job.attach(filepath, filename)
+        job.progress(1, 1)
 
-    return jsonify(
-        {
-            "success": True,
+        return {
             "filename": filename,
-            "content": encoded,
             "savedPath": str(filepath),
             "rows": rows_count,
-            "offsetSeconds": offset_seconds,
-            "offsetSource": offset_source,
-            "recpilotStartTimestamp": start_time_str,
-            "zoomRecordingTimestamp": recording_time_str,
-        },
-    )
+            "cached": cached,
+            **timing,
+        }
+
+    return submit_export_job("session", _get_room_id(data), run)
 
 
 @app.route("/api/export-summary", methods=["POST"])
 def api_export_summary():
-    ensure_report_headers()
     data = request.get_json(silent=True) or {}
     group_id = (data.get("groupId") or "").strip()
     session_label = (data.get("session") or "").strip()
@@ -1085,117 +2656,143 @@ def api_export_summary():
     recording_time_str = format_timestamp(recording_time_dt)
     offset_str = f"{offset_seconds:+.3f}" if offset_seconds else "0.000"
 
-    report_rows = [
-        row
-        for row in load_report_rows()
-        if row.get("組番号", "").strip() == group_id and row.get("セッション", "").strip() == session_label
-    ]
+    try:
+        delta = parse_delta_request(data)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+
+    def run(job: ExportJob) -> Dict[str, object]:
+        if delta is None:
+            return build(job)
+        with delta_lock(delta[0], group_id, session_label, ""):
+            return build(job)
+
+    def build(job: ExportJob) -> Dict[str, object]:
+        since: Optional[int] = None
+        watermark: Optional[int] = None
+        if delta is None:
+            report_rows = filter_report_rows(group_id, session_label)
+            filename = f"{group_id}_{session_label}_summary.csv"
+        else:
+            consumer, since = delta
+            if since is None:
+                since = report_store.get_checkpoint(consumer, group_id, session_label)
+            report_rows, watermark = report_store.fetch_since(group_id, session_label, None, since)
+            filename = f"{group_id}_{session_label}_summary_delta_{since}-{watermark}.csv"
+        filepath = job.output_path(filename)
+        # テイクのサマリー行はマーカーではないので、差分では初回（since=0）にだけ含める
+        summary_takes = finished_takes if not since else []
+        total = len(summary_takes) + len(report_rows)
+        job.progress(0, total)
+
+        headers = [
+            "Marker Name",
+            "Comment",
+            "Start",
+            "End",
+            "Duration",
+            "Category",
+            "Created At",
+            "Director",
+            "Participants",
+            "Take",
+            "Group",
+            "Session",
+            "RecPilot Start",
+            "Zoom Recording",
+            "Applied Offset (s)",
+        ]
 
-    filename = f"{group_id}_{session_label}_summary.csv"
-    filepath = EXPORTS_DIR / filename
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer, lineterminator="\r\n")
+        writer.writerow(headers)
 
-    headers = [
-        "Marker Name",
-        "Comment",
-        "Start",
-        "End",
-        "Duration",
-        "Category",
-        "Created At",
-        "Director",
-        "Participants",
-        "Take",
-        "Group",
-        "Session",
-        "RecPilot Start",
-        "Zoom Recording",
-        "Applied Offset (s)",
-    ]
+        participants_str = ", ".join([p.strip() for p in participants if p and p.strip()])
+
+        for take in summary_takes:
+            take_label = str(take.get("take") or "").strip() or "-"
+            summary_text = (take.get("summary") or "").strip()
+            exported_at = (take.get("exportedAt") or datetime.now().isoformat())[:19].replace("T", " ")
+            writer.writerow(
+                [
+                    f"Take {take_label} Summary",
+                    build_summary_comment(summary_text, offset_seconds, offset_source),
+                    "00:00:00",
+                    "00:00:00",
+                    "0:00:00",
+                    "SUMMARY",
+                    exported_at,
+                    director,
+                    participants_str,
+                    take_label,
+                    group_id,
+                    session_label,
+                    start_time_str,
+                    recording_time_str,
+                    offset_str,
+                ],
+            )
 
-    buffer = io.StringIO(newline="")
-    writer = csv.writer(buffer, lineterminator="\r\n")
-    writer.writerow(headers)
+        for index, row in enumerate(report_rows, start=1):
+            marker = (row.get("カテゴリ") or "Marker").strip() or "Marker"
+            comment = (row.get("内容") or "").strip()
+            start_tc = normalize_timecode(row.get("タイムコード", ""))
+            adjusted_start = apply_offset_to_timecode(start_tc, offset_seconds)
+            created_at = (row.get("日時") or "").strip()
+            writer.writerow(
+                [
+                    marker,
+                    comment,
+                    adjusted_start,
+                    adjusted_start,
+                    "0:00:00",
+                    marker,
+                    created_at,
+                    director,
+                    participants_str,
+                    "",
+                    group_id,
+                    session_label,
+                    start_time_str,
+                    recording_time_str,
+                    offset_str,
+                ],
+            )
+            job.progress(len(summary_takes) + index, total)
 
-    participants_str = ", ".join([p.strip() for p in participants if p and p.strip()])
+        csv_content = buffer.getvalue()
+        buffer.close()
 
-    for take in finished_takes:
-        take_label = str(take.get("take") or "").strip() or "-"
-        summary_text = (take.get("summary") or "").strip()
-        exported_at = (take.get("exportedAt") or datetime.now().isoformat())[:19].replace("T", " ")
-        writer.writerow(
-            [
-                f"Take {take_label} Summary",
-                build_summary_comment(summary_text, offset_seconds, offset_source),
-                "00:00:00",
-                "00:00:00",
-                "0:00:00",
-                "SUMMARY",
-                exported_at,
-                director,
-                participants_str,
-                take_label,
-                group_id,
-                session_label,
-                start_time_str,
-                recording_time_str,
-                offset_str,
-            ],
-        )
+        csv_bytes = csv_content.encode("utf-8-sig")
 
-    for row in report_rows:
-        marker = (row.get("カテゴリ") or "Marker").strip() or "Marker"
-        comment = (row.get("内容") or "").strip()
-        start_tc = normalize_timecode(row.get("タイムコード", ""))
-        adjusted_start = apply_offset_to_timecode(start_tc, offset_seconds)
-        created_at = (row.get("日時") or "").strip()
-        writer.writerow(
-            [
-                marker,
-                comment,
-                adjusted_start,
-                adjusted_start,
-                "0:00:00",
-                marker,
-                created_at,
-                director,
-                participants_str,
-                "",
-                group_id,
-                session_label,
-                start_time_str,
-                recording_time_str,
-                offset_str,
-            ],
+        write_bytes_atomic(filepath, csv_bytes)
+        job.attach(
+            filepath,
+            filename,
+            on_downloaded=None
+            if delta is None
+            else lambda: report_store.set_checkpoint(delta[0], group_id, session_label, "", watermark),
         )
+        job.progress(total, total)
 
-    csv_content = buffer.getvalue()
-    buffer.close()
-
-    csv_bytes = csv_content.encode("utf-8-sig")
-
-    with filepath.open("wb") as export_file:
-        export_file.write(csv_bytes)
-
-    encoded = base64.b64encode(csv_bytes).decode("ascii")
-
-    return jsonify(
-        {
-            "success": True,
+        result: Dict[str, object] = {
             "filename": filename,
-            "content": encoded,
             "savedPath": str(filepath),
             "rows": len(report_rows),
             "offsetSeconds": offset_seconds,
             "offsetSource": offset_source,
             "recpilotStartTimestamp": start_time_str,
             "zoomRecordingTimestamp": recording_time_str,
-        },
-    )
+        }
+        if delta is not None:
+            result["delta"] = {"consumer": delta[0], "since": since, "watermark": watermark}
+        return result
+
+    return submit_export_job("summary", _get_room_id(data), run)
 
 
 @app.route("/api/final-export", methods=["POST"])
 def api_final_export():
-    ensure_report_headers()
     metadata_raw = request.form.get("metadata")
     if not metadata_raw:
         return jsonify({"error": "metadata is required"}), 400
@@ -1212,9 +2809,7 @@ def api_final_export():
         return jsonify({"error": "組とセッションを入力してください。"}), 400
 
     timestamp_label = datetime.now().strftime("%Y%m%d_%H%M%S")
-    working_dir = EXPORTS_DIR / f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_{timestamp_label}"
-    output_dir = working_dir / "output"
-    output_dir.mkdir(parents=True, exist_ok=True)
+    output_name = f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_{timestamp_label}"
 
     segments_raw = metadata.get("segments") or []
     segments: List[Dict[str, object]] = []
@@ -1245,65 +2840,79 @@ def api_final_export():
     segments.sort(key=lambda item: item["start_dt"] or datetime.min)
 
     takes_map = {str(item.get("take")): item for item in metadata.get("takes") or []}
+    archive_name = f"{output_name}.zip"
+
+    def run(job: ExportJob) -> Dict[str, object]:
+        output_dir = job.output_path(output_name)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        # 版は集計クエリ1回で全テイク分を取る。キャッシュに無いテイクがあったときだけ
+        # セッションのマーカーを1回読み、テイクごとに振り分けて使い回す
+        versions = report_store.take_versions(group_id, session_label)
+        grouped_rows: Optional[Dict[str, List[Dict[str, object]]]] = None
+
+        def load_take_rows(take: str) -> List[Dict[str, object]]:
+            nonlocal grouped_rows
+            if grouped_rows is None:
+                grouped_rows = group_report_rows_by_take(filter_report_rows(group_id, session_label))
+            return grouped_rows.get(take, [])
+
+        processed_segments = []
+        job.progress(0, len(segments))
+        for idx, segment in enumerate(segments):
+            take_label = str(segment.get("take") or idx + 1)
+            rec_start_dt = segment.get("start_dt")
+            offset_seconds = 0.0
+            offset_source = "none"
+            start_time_str = format_timestamp(rec_start_dt)
+            recording_time_str = ""
+            summary_text = segment.get("summary") or takes_map.get(take_label, {}).get("summary", "")
+            note_text = segment.get("note", "")
+
+            take_dir = output_dir / f"take{take_label}"
+            take_dir.mkdir(parents=True, exist_ok=True)
+            csv_filename = f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_take{take_label}.csv"
+            rows_count, cached = export_session_csv(
+                take_dir / csv_filename,
+                group_id,
+                session_label,
+                take_label,
+                summary_text,
+                director,
+                participants,
+                offset_seconds,
+                offset_source,
+                start_time_str,
+                recording_time_str,
+                version=versions.get(take_label.strip(), (0, 0)),
+                load_rows=lambda: load_take_rows(take_label.strip()),
+            )
 
-    processed_segments = []
-    for idx, segment in enumerate(segments):
-        take_label = str(segment.get("take") or idx + 1)
-        rec_start_dt = segment.get("start_dt")
-        offset_seconds = 0.0
-        offset_source = "none"
-        start_time_str = format_timestamp(rec_start_dt)
-        recording_time_str = ""
-        summary_text = segment.get("summary") or takes_map.get(take_label, {}).get("summary", "")
-        note_text = segment.get("note", "")
-
-        csv_bytes, rows_count = generate_session_csv(
-            group_id,
-            session_label,
-            take_label,
-            summary_text,
-            director,
-            participants,
-            offset_seconds,
-            offset_source,
-            start_time_str,
-            recording_time_str,
-        )
-
-        take_dir = output_dir / f"take{take_label}"
-        take_dir.mkdir(parents=True, exist_ok=True)
-        csv_filename = f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_take{take_label}.csv"
-        (take_dir / csv_filename).write_bytes(csv_bytes)
-
-        if note_text:
-            note_filename = f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_take{take_label}_note.txt"
-            (take_dir / note_filename).write_text(note_text, encoding="utf-8")
-
-        processed_segments.append(
-            {
-                "take": take_label,
-                "offsetSeconds": round(offset_seconds, 3),
-                "recpilotStart": start_time_str,
-                "zoomStart": recording_time_str,
-                "rows": rows_count,
-                "files": [],
-            }
-        )
+            if note_text:
+                note_filename = f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_take{take_label}_note.txt"
+                (take_dir / note_filename).write_text(note_text, encoding="utf-8")
 
-    archive_base = output_dir.parent / f"{sanitize_component(group_id)}_{sanitize_component(session_label)}_{timestamp_label}"
-    archive_path = shutil.make_archive(str(archive_base), "zip", root_dir=output_dir)
-    archive_bytes = Path(archive_path).read_bytes()
-    encoded_archive = base64.b64encode(archive_bytes).decode("ascii")
+            processed_segments.append(
+                {
+                    "take": take_label,
+                    "offsetSeconds": round(offset_seconds, 3),
+                    "recpilotStart": start_time_str,
+                    "zoomStart": recording_time_str,
+                    "rows": rows_count,
+                    "cached": cached,
+                    "files": [],
+                }
+            )
+            job.progress(idx + 1, len(segments))
 
-    return jsonify(
-        {
-            "success": True,
-            "archiveName": Path(archive_path).name,
-            "archiveContent": encoded_archive,
-            "savedPath": str(archive_path),
+        # zip はダウンロード時にストリームで組み立てるので、ここでは take ディレクトリを残すだけ
+        job.attach(output_dir, archive_name)
+        return {
+            "archiveName": archive_name,
+            "savedPath": str(output_dir),
             "segments": processed_segments,
         }
-    )
+
+    return submit_export_job("final", _get_room_id(metadata), run)
 
 
 @app.route("/api/status", methods=["GET"])
@@ -1312,7 +2921,7 @@ def api_status():
     return jsonify(
         {
             "themes": len(themes),
-            "reportPath": str(REPORT_CSV),
+            "reportPath": str(report_store.path),
         },
     )
 
@@ -1323,11 +2932,11 @@ def api_reload_themes():
     reset_history = bool(data.get("resetHistory", False))
 
     try:
-        themes = load_talk_themes()
+        snapshot = theme_cache.reload()
         return jsonify(
             {
                 "success": True,
-                "count": len(themes),
+                "count": len(snapshot.themes),
                 "resetHistory": reset_history,
             }
         )
@@ -1008,6 +1008,7 @@
       participants: [appState.participantA, appState.participantB],
       takes: finishedTakes,
       segments,
+      roomId: ensureSocketRoom(),
     };
 
     const formData = new FormData();
@@ -1023,16 +1024,17 @@
     }
 
     try {
-      const response = await fetch("/api/final-export", {
-        method: "POST",
-        body: formData,
-      });
-      const result = await response.json();
-      if (!response.ok || !result.success) {
-        throw new Error(result.error || "収録データの生成に失敗しました");
-      }
-      if (result.archiveContent && result.archiveName) {
-        triggerDownload(result.archiveName, result.archiveContent, "application/zip");
+      const job = await runExportJob(
+        "/api/final-export",
+        { method: "POST", body: formData },
+        (snapshot) => {
+          if (finalExportSubmitBtn && snapshot.progress?.total) {
+            finalExportSubmitBtn.textContent = `生成中... ${snapshot.progress.done}/${snapshot.progress.total}`;
+          }
+        },
+      );
+      if (job.downloadUrl) {
+        triggerUrlDownload(job.downloadUrl, job.result?.archiveName);
       }
       alert("収録データを生成しました。ダウンロードをご確認ください。");
       closeFinalExportModal();
@@ -2643,7 +2645,7 @@
     const takeValue = String(takeNumber);
     try {
       console.info("[RecPilot] exportTake start", { take: takeValue, session: sessionLabelForTake });
-      const response = await fetch("/api/export-session", {
+      const job = await runExportJob("/api/export-session", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -2653,14 +2655,11 @@
           summary: "",
           director: appState.director,
           participants: [appState.participantA, appState.participantB],
+          roomId: ensureSocketRoom(),
         }),
       });
-      const data = await response.json();
-      console.info("[RecPilot] exportTake response", { status: response.status, data });
-      if (!response.ok || !data.success) {
-        throw new Error(data.error || "CSV の生成に失敗しました");
-      }
-      triggerDownload(data.filename || `export_${Date.now()}.csv`, data.content || "");
+      console.info("[RecPilot] exportTake done", { jobId: job.jobId, result: job.result });
+      triggerUrlDownload(job.downloadUrl, job.result?.filename || `export_${Date.now()}.csv`);
       const existingIndex = finishedTakes.findIndex((item) => String(item.take) === takeValue);
       const record = { take: takeValue, summary: "", exportedAt: new Date().toISOString(), exported: true, completed: true };
       if (existingIndex >= 0) {
@@ -2911,6 +2910,177 @@
     }
   }
 
+  function generateClientId() {
+    if (window.crypto?.randomUUID) {
+      return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+  }
+
+  // 送れなかったマーカーは localStorage に溜め、/api/report/batch でまとめて再送する。
+  // サーバーは clientId で重複を弾くので、同じマーカーを何度送っても1件にしかならない
+  const REPORT_QUEUE_KEY = "recpilot-report-queue-v1";
+  const REPORT_QUEUE_BATCH = 200;
+  const REPORT_QUEUE_RETRY_MS = 15000;
+  const sentMarkerIds = new Map(); // 再送で登録できたマーカーの clientId -> 行 ID
+  let reportQueueFlush = null;
+
+  function loadReportQueue() {
+    try {
+      const stored = window.localStorage?.getItem(REPORT_QUEUE_KEY);
+      const parsed = stored ? JSON.parse(stored) : [];
+      return Array.isArray(parsed) ? parsed : [];
+    } catch (error) {
+      console.warn("未送信マーカーの読み込みに失敗しました。", error);
+      return [];
+    }
+  }
+
+  function saveReportQueue(queue) {
+    try {
+      window.localStorage?.setItem(REPORT_QUEUE_KEY, JSON.stringify(queue));
+    } catch (error) {
+      console.warn("未送信マーカーの保存に失敗しました。", error);
+    }
+  }
+
+  function enqueueMarker(payload) {
+    const queue = loadReportQueue().filter((item) => item.clientId !== payload.clientId);
+    queue.push(payload);
+    saveReportQueue(queue);
+  }
+
+  function updateQueuedMarker(clientId, changes) {
+    const queue = loadReportQueue();
+    const item = queue.find((entry) => entry.clientId === clientId);
+    if (!item) {
+      return null;
+    }
+    Object.assign(item, changes);
+    saveReportQueue(queue);
+    return item;
+  }
+
+  // 1件送る。通信できないときとサーバーエラー（5xx）のときは溜めて null を返す。入力の誤り（4xx）は例外
+  async function sendMarker(payload) {
+    let response;
+    try {
+      response = await fetch("/api/report", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(payload),
+      });
+    } catch (error) {
+      enqueueMarker(payload);
+      return null;
+    }
+    if (response.status >= 500) {
+      enqueueMarker(payload);
+      return null;
+    }
+    const data = await response.json();
+    if (!response.ok || !data?.success) {
+      throw new Error(data?.error || "保存に失敗しました");
+    }
+    void flushReportQueue();
+    return data;
+  }
+
+  function flushReportQueue() {
+    if (!reportQueueFlush) {
+      reportQueueFlush = sendQueuedMarkers().finally(() => {
+        reportQueueFlush = null;
+      });
+    }
+    return reportQueueFlush;
+  }
+
+  async function sendQueuedMarkers() {
+    try {
+      for (;;) {
+        const batch = loadReportQueue().slice(0, REPORT_QUEUE_BATCH);
+        if (!batch.length) {
+          return;
+        }
+        const response = await fetch("/api/report/batch", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ markers: batch }),
+        });
+        const data = await response.json().catch(() => null);
+        if (response.status === 400) {
+          // 受け付けられないマーカー（古すぎる createdAt など）は捨てないと後ろが詰まる
+          const match = /^markers\[(\d+)\]/.exec(data?.error || "");
+          const rejected = match ? batch[Number(match[1])] : null;
+          if (!rejected) {
+            throw new Error(data?.error || "再送に失敗しました");
+          }
+          console.warn("受け付けられないマーカーを破棄しました。", data.error, rejected);
+          saveReportQueue(loadReportQueue().filter((item) => item.clientId !== rejected.clientId));
+          continue;
+        }
+        if (!response.ok || !data?.success) {
+          throw new Error(data?.error || "再送に失敗しました");
+        }
+        const sent = new Set(batch.map((item) => item.clientId));
+        saveReportQueue(loadReportQueue().filter((item) => !sent.has(item.clientId)));
+        (data.results || []).forEach((result) => markMarkerSent(result.clientId, result.id));
+      }
+    } catch (error) {
+      console.warn("未送信マーカーの再送に失敗しました。後で再試行します。", error);
+    }
+  }
+
+  function markMarkerSent(clientId, rowId) {
+    sentMarkerIds.set(clientId, rowId);
+    if (currentEditableNote?.clientId === clientId) {
+      currentEditableNote.id = rowId;
+    }
+    const row = Array.from(notesTableBody?.querySelectorAll("tr") || []).find((tr) => tr.dataset.clientId === clientId);
+    if (row) {
+      row.dataset.rowId = String(rowId);
+      row.classList.remove("opacity-60");
+      row.removeAttribute("title");
+    }
+  }
+
+  // 未送信マーカーの内容を書き換える。再送中なら終わるのを待ち、その間に送れていれば { id } を返す。
+  // まだ溜まっていれば溜めた内容と行を書き換えて { queued } を返す
+  async function updateUnsentMarker(clientId, content) {
+    await reportQueueFlush;
+    const id = sentMarkerIds.get(clientId);
+    if (id != null) {
+      return { id };
+    }
+    const queued = updateQueuedMarker(clientId, { content });
+    if (queued) {
+      const queuedRow = Array.from(notesTableBody?.querySelectorAll("tr") || []).find(
+        (tr) => tr.dataset.clientId === clientId
+      );
+      renderQueuedMarker(queued, queuedRow);
+    }
+    return { id: null, queued };
+  }
+
+  function renderQueuedMarker(payload, targetRow) {
+    const row = {
+      id: null,
+      groupId: payload.groupId,
+      session: payload.session,
+      take: payload.take,
+      timecode: payload.timecode,
+      content: payload.content,
+      category: payload.category,
+    };
+    renderNoteRow(row, targetRow);
+    const tr = targetRow || notesTableBody?.firstElementChild;
+    if (tr) {
+      tr.dataset.clientId = payload.clientId;
+      tr.classList.add("opacity-60");
+      tr.title = "未送信（接続が戻ると自動で送信します）";
+    }
+  }
+
   function renderNoteRow(row, targetRow) {
     if (!notesTableBody) {
       return;
@@ -2933,6 +3103,7 @@
       targetRow.dataset.take = row.take || "";
       targetRow.dataset.session = row.session || "";
       targetRow.dataset.group = row.groupId || "";
+      targetRow.dataset.rowId = row.id != null ? String(row.id) : "";
     } else {
       const tr = document.createElement("tr");
       tr.className = "bg-white last:rounded-b-lg";
@@ -2941,6 +3112,7 @@
       tr.dataset.take = row.take || "";
       tr.dataset.session = row.session || "";
       tr.dataset.group = row.groupId || "";
+      tr.dataset.rowId = row.id != null ? String(row.id) : "";
       notesTableBody.prepend(tr);
     }
   }
@@ -3026,19 +3198,15 @@
       category: THEME_CHANGE_CATEGORY,
       content: `テーマ変更: ${content}`,
       timecode: formatTime(durationSeconds - remainingSeconds),
+      clientId: generateClientId(),
+      createdAt: new Date().toISOString(),
     };
 
     try {
-      const response = await fetch("/api/report", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(payload),
-      });
-      const data = await response.json();
-      if (!response.ok || !data?.success) {
-        throw new Error(data?.error || "Failed to log theme change");
-      }
-      if (data.row) {
+      const data = await sendMarker(payload);
+      if (!data) {
+        renderQueuedMarker(payload);
+      } else if (data.row) {
         renderNoteRow(data.row);
       }
     } catch (error) {
@@ -3095,6 +3263,8 @@
       categoryDisplay: categoryLabel,
       rawCategory: categoryValue,
       timecode: formatTime(durationSeconds - remainingSeconds),
+      clientId: generateClientId(),
+      createdAt: new Date().toISOString(),
     };
 
     pendingNote = note;
@@ -3127,26 +3297,26 @@
       category: pendingNote.categoryDisplay,
       content: contentText,
       timecode: pendingNote.timecode,
+      clientId: pendingNote.clientId,
+      createdAt: pendingNote.createdAt,
     };
 
-    const response = await fetch("/api/report", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
-    const data = await response.json();
-    if (!response.ok || !data.success) {
-      throw new Error(data.error || "保存に失敗しました");
-    }
+    const data = await sendMarker(payload);
     const lastCategory = pendingNote.rawCategory;
     const lastCustom = pendingNote.rawCategory === "その他" ? pendingNote.categoryDisplay : "";
-    renderNoteRow(data.row, pendingRow);
-    // 保存後も編集対象として保持
+    if (data) {
+      renderNoteRow(data.row, pendingRow);
+    } else {
+      renderQueuedMarker(payload, pendingRow);
+    }
+    // 保存後も編集対象として保持。未送信の間は id が無く、clientId で溜めた内容を書き換える
     currentEditableNote = {
-      timecode: data.row.timecode,
-      take: data.row.take,
-      groupId: data.row.groupId,
-      session: data.row.session,
+      id: data ? data.row.id : null,
+      clientId: payload.clientId,
+      timecode: payload.timecode,
+      take: payload.take,
+      groupId: payload.groupId,
+      session: payload.session,
     };
     resetPendingState(true, lastCategory, lastCustom);
     if (noteActionBtn) {
@@ -3166,10 +3336,23 @@
       return;
     }
     try {
+      if (target.clientId && target.id == null) {
+        const unsent = await updateUnsentMarker(target.clientId, content);
+        target.id = unsent.id;
+        if (unsent.queued) {
+          inputContent.value = "";
+          if (noteActionBtn) {
+            noteActionBtn.disabled = true;
+          }
+          currentEditableNote = null;
+          return;
+        }
+      }
       const response = await fetch("/api/report/update", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
+          id: target.id,
           groupId: target.groupId,
           session: target.session,
           take: target.take,
@@ -3242,10 +3425,21 @@
     saveBtn?.addEventListener("click", async () => {
       const newContent = textarea?.value.trim() || "";
       try {
+        let id = meta.id;
+        if (meta.clientId && id == null) {
+          // 未送信の行はサーバーにまだ無いので、溜めたマーカーを書き換える
+          const unsent = await updateUnsentMarker(meta.clientId, newContent);
+          if (unsent.queued) {
+            activeContentEditor = null;
+            return;
+          }
+          id = unsent.id;
+        }
         const response = await fetch("/api/report/update", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
+            id,
             groupId: meta.groupId,
             session: meta.session,
             take: meta.take,
@@ -3377,25 +3571,72 @@
     });
   }
 
-  function triggerDownload(filename, base64Content, mimeType = "text/csv;charset=utf-8") {
-    if (!base64Content) {
-      console.warn("triggerDownload called without content");
-      return;
-    }
-    const binary = atob(base64Content);
-    const bytes = new Uint8Array(binary.length);
-    for (let i = 0; i < binary.length; i += 1) {
-      bytes[i] = binary.charCodeAt(i);
+  const EXPORT_JOB_POLL_MS = 2000;
+
+  /**
+   * エクスポートを依頼し、完了するまで待つ。進捗は room 経由の "export_job" で届く。
+   * room に未参加でも取りこぼさないよう、状態 API のポーリングも並行して行う。
+   */
+  async function runExportJob(url, init, onProgress) {
+    const response = await fetch(url, init);
+    const submitted = await response.json();
+    if (!response.ok || !submitted.success) {
+      throw new Error(submitted.error || "エクスポートの受付に失敗しました");
     }
-    const blob = new Blob([bytes], { type: mimeType });
-    const url = URL.createObjectURL(blob);
+    return new Promise((resolve, reject) => {
+      let settled = false;
+      let pollTimer = null;
+      const settle = (snapshot) => {
+        if (settled || !snapshot || snapshot.jobId !== submitted.jobId) {
+          return;
+        }
+        onProgress?.(snapshot);
+        if (snapshot.status !== "done" && snapshot.status !== "failed") {
+          return;
+        }
+        settled = true;
+        socket.off("export_job", settle);
+        clearTimeout(pollTimer);
+        if (snapshot.status === "done") {
+          resolve(snapshot);
+        } else {
+          reject(new Error(snapshot.error || "エクスポートに失敗しました"));
+        }
+      };
+      const poll = async () => {
+        try {
+          const statusResponse = await fetch(submitted.statusUrl);
+          const snapshot = await statusResponse.json();
+          if (statusResponse.status === 404) {
+            settle({ jobId: submitted.jobId, status: "failed", error: snapshot.error });
+          } else if (statusResponse.ok) {
+            settle(snapshot);
+          }
+        } catch (err) {
+          console.warn("エクスポート状態の取得に失敗しました", err);
+        }
+        if (!settled) {
+          pollTimer = setTimeout(poll, EXPORT_JOB_POLL_MS);
+        }
+      };
+      socket.on("export_job", settle);
+      settle(submitted);
+      if (!settled) {
+        pollTimer = setTimeout(poll, EXPORT_JOB_POLL_MS);
+      }
+    });
+  }
+
+  function triggerUrlDownload(url, filename) {
+    // ブラウザがサーバーからのストリームをそのままディスクへ書き出す（メモリに溜めない）
     const anchor = document.createElement("a");
     anchor.href = url;
-    anchor.download = filename;
+    if (filename) {
+      anchor.download = filename;
+    }
     document.body.appendChild(anchor);
     anchor.click();
     document.body.removeChild(anchor);
-    URL.revokeObjectURL(url);
   }
 
   async function handleFinishSubmit(event) {
@@ -3411,7 +3652,7 @@
     const summary = finishSummary ? finishSummary.value.trim() : "";
 
     try {
-      const response = await fetch("/api/export-session", {
+      const job = await runExportJob("/api/export-session", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
@@ -3421,12 +3662,10 @@
           summary,
           director: appState.director,
           participants: [appState.participantA, appState.participantB],
+          roomId: ensureSocketRoom(),
         }),
       });
-      const data = await response.json();
-      if (!response.ok || !data.success) {
-        throw new Error(data.error || "CSV の生成に失敗しました");
-      }
+      const data = job.result || {};
       const takeKey = String(take);
       const mappedSegmentId = segmentByTake[takeKey] || currentSegmentId;
       const targetSegment = ensureSegment(mappedSegmentId);
@@ -3442,7 +3681,7 @@
       } else {
         finishedTakes.push(record);
       }
-      triggerDownload(data.filename || `export_${Date.now()}.csv`, data.content || "");
+      triggerUrlDownload(job.downloadUrl, data.filename || `export_${Date.now()}.csv`);
       hideFinishModal();
       alert(`CSV をダウンロードしました (記録数: ${data.rows ?? 0}件)`);
       void fetchSessionStatus();
@@ -4079,6 +4318,9 @@
         '<div class="col-span-full text-center text-xs text-slate-400">テーマを読み込み中...</div>';
     }
     fetchThemes();
+    void flushReportQueue();
+    window.addEventListener("online", () => void flushReportQueue());
+    window.setInterval(() => void flushReportQueue(), REPORT_QUEUE_RETRY_MS);
     applyAppState();
     fillSetupForm();
     showZoomShareModal(); // 最初にZoom共有確認を表示
@@ -4149,8 +4391,10 @@
       const take = rowEl.dataset.take || cell.dataset.take || getCurrentTakeValue();
       const session = rowEl.dataset.session || cell.dataset.session || appState.session;
       const group = rowEl.dataset.group || cell.dataset.group || appState.groupId;
+      const id = rowEl.dataset.rowId ? Number(rowEl.dataset.rowId) : undefined;
+      const clientId = rowEl.dataset.clientId;
       const currentText = cell.textContent?.trim() === "内容入力待ち..." ? "" : (cell.textContent?.trim() || "");
-      openInlineEditor(rowEl, { timecode, take, session, groupId: group, content: currentText });
+      openInlineEditor(rowEl, { id, clientId, timecode, take, session, groupId: group, content: currentText });
     });
 
     if (categorySelect) {
@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_app_imports_with_eventlet_active(tmp_path):
+    pytest.importorskip("eventlet")
+    env = {**os.environ, "FLASK_SECRET_KEY": "test", "RECPILOT_CONFIG": str(tmp_path / "config.json")}
+    # monkey_patch は取り消せないので、別プロセスで import する
+    result = subprocess.run(
+        [sys.executable, "-c", "import recpilot.app as app; print(app.ASYNC_MODE)"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "eventlet"